@@ -0,0 +1,219 @@
+"""
+Mark throughput under concurrency: the shared mark service against the old
+check-then-insert path, on SQLite and (given a URL) PostgreSQL.
+
+Each run opens a fresh session, seeds --students students and has --threads
+threads mark them all. A --dup share of the marks is sent twice, the way
+a client retrying after a timeout would: in "service" mode the retry
+reuses the Idempotency-Key, in "legacy" mode it is just a second POST.
+"bulk" mode sends each thread's marks through mark_many in --batch-size
+chunks, like POST /api/attendance/bulk (latency is then per batch). The script
+calls the service directly (no HTTP), so the numbers are the DB path: round
+trips, lock waits and the commit. It then checks that every student was
+marked exactly once and that each mark queued exactly one outbox event.
+
+    python bench_marking.py --threads 1 4 16
+    python bench_marking.py --modes service bulk --batch-size 200
+    python bench_marking.py --db postgresql+psycopg://user:pw@localhost/attendance_bench
+
+PostgreSQL needs a driver (psycopg or psycopg2) and a scratch database: the
+tables are created if missing, and the seeded rows are left there.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+os.environ.setdefault("OUTBOX_DRAIN", "0")       # keep the drainer out of the measurement
+os.environ.setdefault("APP_MODE", "web")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError, OperationalError
+from website import create_app
+from website.extensions import db
+from website.models import Attendance, Outbox, Session, User
+from website.services import marking, outbox
+
+
+def legacy_mark(data):
+    """The old views.mark_attendance path: get, lookup, pre-check, insert."""
+    session = db.session.get(Session, data["session_id"])
+    if not session:
+        return "missing"
+    student = User.query.filter_by(student_id=data["student_id"], role="student").first()
+    if not student:
+        return "missing"
+    if Attendance.query.filter_by(session_id=session.id, student_id=student.id).first():
+        return "duplicate"
+    a = Attendance(session_id=session.id, student_id=student.id)
+    db.session.add(a)
+    try:
+        db.session.flush()
+        outbox.enqueue(outbox.MARKED, marking.event(a.id, a.marked_at, _Target(session, student)))
+        db.session.commit()
+    except IntegrityError:          # lost the race between the pre-check and the insert
+        db.session.rollback()
+        return "duplicate"
+    return "ok"
+
+
+class _Target:
+    def __init__(self, session, student):
+        self.session_id, self.class_name = session.id, session.class_name
+        self.student_code, self.student_name = student.student_id, student.name
+
+
+def service_mark(data, key):
+    try:
+        body, status = marking.mark(data, idempotency_key=key)
+    except marking.MarkError as e:
+        return "duplicate" if e.status == 409 else "error"
+    return "replayed" if body.get("replayed") else "ok"
+
+
+def bulk_mark(batch):
+    try:
+        body, _ = marking.mark_many(batch)
+    except marking.MarkError:
+        return {"error": len(batch)}
+    return {k: body[k] for k in ("marked", "duplicate", "rejected") if body[k]}
+
+
+def seed(n_students: int, run: str):
+    teacher = User(role="teacher", name="Bench teacher", email=f"bench-{run}-t@example.com", password_hash="-")
+    db.session.add(teacher)
+    db.session.flush()
+    codes = [f"B{run}-{i:05d}" for i in range(n_students)]
+    db.session.add_all(User(role="student", student_id=c, name=f"Student {i}", email=f"{c}@example.com",
+                            password_hash="-") for i, c in enumerate(codes))
+    db.session.commit()
+    return teacher.id, codes
+
+
+def run_once(app, mode, threads, teacher_id, codes, dup, batch_size=200):
+    now = datetime.now(timezone.utc)
+    with app.app_context():
+        s = Session(teacher_id=teacher_id, class_name=f"bench {mode} x{threads}",
+                    start_ts=now, end_ts=now + timedelta(hours=1))
+        db.session.add(s)
+        db.session.commit()
+        session_id = s.id
+
+    work = [(c, uuid.uuid4().hex) for c in codes]
+    work += random.sample(work, int(len(work) * dup))      # retries reuse the original key
+    random.shuffle(work)
+    shards = [work[i::threads] for i in range(threads)]
+    lat, outcomes, lock = [], {}, threading.Lock()
+    start = threading.Barrier(threads + 1)
+
+    def worker(shard):
+        mine, counts = [], {}
+        with app.app_context():
+            start.wait()
+            step = batch_size if mode == "bulk" else 1
+            for i in range(0, len(shard), step):
+                chunk = shard[i:i + step]
+                items = [{"session_id": session_id, "student_id": code, "speech_ok": True, "face_ok": True}
+                         for code, _ in chunk]
+                t0 = time.perf_counter()
+                try:
+                    if mode == "bulk":
+                        got = bulk_mark(items)
+                    elif mode == "service":
+                        got = {service_mark(items[0], chunk[0][1]): 1}
+                    else:
+                        got = {legacy_mark(items[0]): 1}
+                except OperationalError:      # e.g. SQLite "database is locked" past the busy timeout
+                    db.session.rollback()
+                    got = {"locked": len(items)}
+                mine.append(time.perf_counter() - t0)
+                for k, v in got.items():
+                    counts[k] = counts.get(k, 0) + v
+                db.session.remove()
+        with lock:
+            lat.extend(mine)
+            for k, v in counts.items():
+                outcomes[k] = outcomes.get(k, 0) + v
+
+    ts = [threading.Thread(target=worker, args=(sh,)) for sh in shards]
+    for t in ts:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in ts:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    with app.app_context():
+        rows = db.session.scalar(select(func.count()).select_from(Attendance).where(Attendance.session_id == session_id))
+        events = db.session.scalar(select(func.count()).select_from(Outbox)
+                                   .where(Outbox.payload.like(f'%"session_id": {session_id},%')))
+    lat.sort()
+    pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 2)
+    return {"mode": mode, "threads": threads, "requests": len(work), "wall_s": round(wall, 3),
+            "marks_per_s": round(len(work) / wall, 1), "p50_ms": pct(0.50), "p99_ms": pct(0.99),
+            "outcomes": outcomes, "rows": rows, "outbox_events": events,
+            "consistent": rows == len(codes) and events == rows}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", default=None, help="SQLAlchemy URL (default: a temporary SQLite file)")
+    ap.add_argument("--threads", nargs="+", type=int, default=[1, 4, 16])
+    ap.add_argument("--students", type=int, default=2000)
+    ap.add_argument("--dup", type=float, default=0.1, help="share of marks retried (default 0.1)")
+    ap.add_argument("--modes", nargs="+", default=["service", "legacy"], choices=["service", "legacy", "bulk"])
+    ap.add_argument("--batch-size", type=int, default=200, help="items per bulk request (bulk mode)")
+    ap.add_argument("--out", default=None, help="write results as JSON")
+    args = ap.parse_args(argv)
+
+    tmp = None
+    url = args.db
+    if url is None:
+        tmp = tempfile.mkdtemp(prefix="bench_marking_")
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+
+    class Config:
+        SQLALCHEMY_DATABASE_URI = url
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        SECRET_KEY = "bench"
+        SQLALCHEMY_ENGINE_OPTIONS = ({"connect_args": {"timeout": 30}} if url.startswith("sqlite")
+                                     else {"pool_size": max(args.threads) + 2})
+
+    try:
+        app = create_app(Config)      # creates missing tables
+    except Exception as e:
+        sys.exit(f"Cannot open {url.split('@')[-1]}: {e}")
+
+    with app.app_context():
+        teacher_id, codes = seed(args.students, uuid.uuid4().hex[:8])
+        dialect = db.engine.dialect.name
+
+    results = []
+    for threads in args.threads:
+        for mode in args.modes:
+            r = run_once(app, mode, threads, teacher_id, codes, args.dup, args.batch_size)
+            results.append(r)
+            print(f"{dialect:>10} {mode:>7} x{threads:<3} | {r['marks_per_s']:>8} marks/s | "
+                  f"p50 {r['p50_ms']} ms p99 {r['p99_ms']} ms | {r['outcomes']} | "
+                  f"rows {r['rows']}/{len(codes)} events {r['outbox_events']}"
+                  f"{'' if r['consistent'] else '  INCONSISTENT'}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(), "dialect": dialect,
+                       "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "students": args.students,
+                       "dup": args.dup, "results": results}, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Worker startup cost per APP_MODE: wall time to build the app and RSS after.
+
+Every sample runs in a fresh interpreter, which is what a new gunicorn
+worker pays. In full mode the script then loads the biometric models the
+way MODEL_PRELOAD does (model_registry.preload, no warm-up) and reports
+that separately: it is what the first face / speech request pays when
+nothing was preloaded. Heavy modules found in sys.modules are listed so a
+stray top-level import shows up immediately.
+
+    python bench_startup.py --modes web full --repeat 3 --out startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+HEAVY = ["cv2", "face_recognition", "dlib", "cvzone", "mediapipe", "librosa", "sounddevice",
+         "soundfile", "speech_recognition", "torch", "pyannote.audio", "pandas"]
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, ROOT)
+from website import create_app
+app = create_app()
+t1 = time.perf_counter()
+from website.services import model_registry
+out = {"create_app_ms": (t1 - t0) * 1000.0, "rss_bytes": model_registry.rss_bytes(),
+       "routes": len(app.url_map._rules), "heavy": [m for m in HEAVY if m in sys.modules]}
+if MODELS and app.config["APP_MODE"] == "full":
+    model_registry.preload(MODELS, warm_up=False)
+    out["models_ms"] = (time.perf_counter() - t1) * 1000.0
+    out["models_rss_bytes"] = model_registry.rss_bytes()
+    out["model_errors"] = {k: v["error"] for k, v in model_registry.status()["models"].items() if "error" in v}
+    out["heavy_after_models"] = [m for m in HEAVY if m in sys.modules]
+print(json.dumps(out))
+"""
+
+
+def sample(mode: str, models, create_db: bool) -> dict:
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, APP_MODE=mode, DB_CREATE_ALL="1" if create_db else "0", MODEL_PRELOAD="lazy")
+    code = f"ROOT={root!r}\nHEAVY={HEAVY!r}\nMODELS={list(models)!r}\n" + CHILD
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], env=env, cwd=root, capture_output=True, text=True)
+    wall = (time.perf_counter() - t0) * 1000.0
+    if proc.returncode != 0:
+        raise RuntimeError(f"{mode}: child failed\n{proc.stderr.strip()}")
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    out["process_ms"] = wall
+    return out
+
+
+def summarize(samples):
+    def med(key):
+        vals = sorted(s[key] for s in samples if key in s)
+        return round(vals[len(vals) // 2], 1) if vals else None
+    last = samples[-1]
+    return {"process_ms": med("process_ms"), "create_app_ms": med("create_app_ms"),
+            "rss_mib": round(med("rss_bytes") / 2**20, 1), "routes": last["routes"], "heavy": last["heavy"],
+            "models_ms": med("models_ms"),
+            "models_rss_mib": round(med("models_rss_bytes") / 2**20, 1) if "models_rss_bytes" in last else None,
+            "model_errors": last.get("model_errors"), "heavy_after_models": last.get("heavy_after_models")}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modes", nargs="+", default=["web", "full"], choices=["web", "full"])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--models", nargs="*", default=["face", "mfcc", "speaker"],
+                    help="models to load after startup in full mode (none: skip)")
+    ap.add_argument("--create-db", action="store_true", help="include db.create_all() in startup")
+    ap.add_argument("--out", default=None, help="write results as JSON")
+    args = ap.parse_args(argv)
+
+    results = {}
+    for mode in args.modes:
+        r = summarize([sample(mode, args.models, args.create_db) for _ in range(args.repeat)])
+        results[mode] = r
+        line = (f"{mode:>4} | process {r['process_ms']} ms | create_app {r['create_app_ms']} ms | "
+                f"RSS {r['rss_mib']} MiB | {r['routes']} routes | heavy: {', '.join(r['heavy']) or '-'}")
+        if r["models_ms"] is not None:
+            line += f"\n     + models {r['models_ms']} ms -> RSS {r['models_rss_mib']} MiB"
+            if r["model_errors"]:
+                line += f" (failed: {', '.join(sorted(r['model_errors']))})"
+        print(line)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(),
+                       "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat": args.repeat,
+                       "create_db": args.create_db, "results": results}, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+gunicorn settings (picked up automatically from the working directory).
+
+MODEL_PRELOAD=fork loads the models once in the master and lets the
+workers share them copy-on-write; worker loads them in each worker; lazy
+(default) leaves it to the first request. See website/services/model_registry.py.
+APP_MODE=web skips the models entirely.
+"""
+import os
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = os.getenv("MODEL_PRELOAD", "lazy") == "fork"
+web_only = os.getenv("APP_MODE", "full") == "web"     # web-only nodes never load the models
+
+
+def when_ready(server):
+    if web_only:
+        return
+    from website.services import model_registry
+    model_registry.master_ready()
+
+
+def post_fork(server, worker):
+    # with preload_app the master built the app (create_all included), so its
+    # pooled DB connections were inherited: drop them without closing the
+    # parent's sockets and let this worker open its own
+    if not preload_app:
+        return
+    from main import app
+    from website.extensions import db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    if web_only:
+        return
+    from website.services import model_registry
+    model_registry.worker_start()
@@ -0,0 +1,64 @@
+import os, sys
+from datetime import datetime, timedelta, timezone
+import pytest
+from flask import g
+
+# same import root as main.py: the app package is `website`
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# tests drive the outbox by hand (outbox.drain_once)
+os.environ.setdefault("OUTBOX_DRAIN", "0")
+
+from werkzeug.security import generate_password_hash
+from website import create_app
+from website.extensions import db
+from website.models import Session, User
+
+
+@pytest.fixture
+def app_mode():
+    """APP_MODE for the app under test; modules testing biometric routes override it with "full"."""
+    return "web"
+
+
+@pytest.fixture
+def app(app_mode):
+    class TestConfig:
+        SQLALCHEMY_DATABASE_URI = "sqlite://"
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        SECRET_KEY = "test"
+        TESTING = True
+
+    app = create_app(TestConfig, mode=app_mode)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def make_user(role="student", student_id=None, name=None):
+    u = User(role=role, student_id=student_id, name=name or student_id or role,
+             email=f"{student_id or name or role}@example.com", password_hash=generate_password_hash("pw", method="pbkdf2:sha256:1"))
+    db.session.add(u)
+    db.session.commit()
+    return u
+
+
+def make_session(teacher, minutes_ago=10, minutes_left=50, **kwargs):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    s = Session(teacher_id=teacher.id, class_name=kwargs.pop("class_name", "CS101"),
+                start_ts=now - timedelta(minutes=minutes_ago), end_ts=now + timedelta(minutes=minutes_left), **kwargs)
+    db.session.add(s)
+    db.session.commit()
+    return s
+
+
+def login(client, user):
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user.id)
+        sess["_fresh"] = True
+    # requests reuse the fixture's app context, where Flask-Login caches the user
+    g.pop("_login_user", None)
@@ -0,0 +1,100 @@
+import csv
+import gzip
+import io
+from datetime import datetime, timedelta
+import pytest
+from website.extensions import db
+from website.models import Attendance
+from website.services import attendance_export
+from conftest import login, make_session, make_user
+
+
+@pytest.fixture
+def world(app):
+    t1, t2 = make_user(role="teacher", name="t1"), make_user(role="teacher", name="t2")
+    alice, bob = make_user(student_id="21001", name="alice"), make_user(student_id="21002", name="bob")
+    s1, s2 = make_session(t1, class_name="CS101"), make_session(t2, class_name="CS102")
+    day = datetime(2026, 3, 1, 9, 0)
+    for i, (s, u) in enumerate([(s1, alice), (s1, bob), (s2, alice)]):
+        db.session.add(Attendance(session_id=s.id, student_id=u.id, marked_at=day + timedelta(days=i)))
+    db.session.commit()
+    return {"t1": t1, "t2": t2, "alice": alice, "s1": s1, "s2": s2}
+
+
+def _rows(r):
+    body = gzip.decompress(r.data) if r.mimetype == "application/gzip" else r.data
+    return list(csv.DictReader(io.StringIO(body.decode("utf-8"))))
+
+
+def test_teacher_gets_own_sessions_only(client, world):
+    login(client, world["t1"])
+    r = client.get("/api/attendance/export")
+    assert r.status_code == 200 and r.mimetype == "text/csv"
+    rows = _rows(r)
+    assert [(x["class_name"], x["student_name"]) for x in rows] == [("CS101", "alice"), ("CS101", "bob")]
+    assert list(rows[0]) == attendance_export.COLUMNS
+    assert rows[0]["marked_at"] == "2026-03-01T09:00:00"
+
+
+def test_student_gets_own_rows_only(client, world):
+    login(client, world["alice"])
+    rows = _rows(client.get("/api/attendance/export?student_id=21002"))    # filter cannot widen it
+    assert [x["class_name"] for x in rows] == ["CS101", "CS102"]
+    assert {x["student_id"] for x in rows} == {"21001"}
+
+
+def test_filters_and_date_range(client, world):
+    login(client, world["t1"])
+    assert [x["student_name"] for x in _rows(client.get("/api/attendance/export?student_id=21002"))] == ["bob"]
+    rows = _rows(client.get("/api/attendance/export?from=2026-03-02T00:00:00Z&to=2026-03-03T00:00:00Z"))
+    assert [x["student_name"] for x in rows] == ["bob"]
+    rows = _rows(client.get("/api/attendance/export?from=1772409600000"))     # 2026-03-02T00:00Z in ms
+    assert [x["student_name"] for x in rows] == ["bob"]
+
+
+def test_student_without_roll_number_sees_nothing_else(client, world):
+    carol = make_user(student_id=None, name="carol")
+    login(client, carol)
+    r = client.get("/api/attendance/export")
+    assert r.status_code == 200 and _rows(r) == []
+    db.session.add(Attendance(session_id=world["s2"].id, student_id=carol.id, marked_at=datetime(2026, 3, 5)))
+    db.session.commit()
+    assert [x["student_name"] for x in _rows(client.get("/api/attendance/export"))] == ["carol"]
+
+
+@pytest.mark.parametrize("query", ["from=yesterday", "to=2026-13-01", "format=pdf",
+                                   "from=99999999999999999999", "to=99999999999999999999999"])
+def test_bad_requests_are_400(client, world, query):
+    login(client, world["t1"])
+    r = client.get(f"/api/attendance/export?{query}")
+    assert r.status_code == 400 and "error" in r.get_json()
+
+
+def test_gzip_and_filename(client, world):
+    login(client, world["t1"])
+    r = client.get("/api/attendance/export?gzip=1&class_name=CS101")
+    assert r.mimetype == "application/gzip"
+    assert 'filename="attendance_class_name-CS101.csv.gz"' in r.headers["Content-Disposition"]
+    assert len(_rows(r)) == 2
+
+
+def test_csv_streams_one_partition_at_a_time(app, world):
+    chunks = list(attendance_export.stream("csv", attendance_export.build_query(), chunk=1))
+    assert len(chunks) == 3                                # header rides with the first row
+    assert b"".join(chunks).decode().count("\n") == 4
+
+
+def test_xlsx(client, world):
+    from openpyxl import load_workbook
+    login(client, world["t1"])
+    r = client.get("/api/attendance/export?format=xlsx")
+    ws = load_workbook(io.BytesIO(r.data), read_only=True)["Attendance"]
+    rows = list(ws.iter_rows(values_only=True))
+    assert list(rows[0]) == attendance_export.COLUMNS and len(rows) == 3
+
+
+def test_parquet_needs_pyarrow(client, world):
+    if attendance_export.pq is not None:
+        pytest.skip("pyarrow is installed")
+    login(client, world["t1"])
+    assert client.get("/api/attendance/export?format=parquet").status_code == 400
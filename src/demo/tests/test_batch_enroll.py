@@ -0,0 +1,54 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+pytest.importorskip("face_recognition")
+cv2 = pytest.importorskip("cv2")
+
+# batch_enroll is a script: it imports its siblings as top-level modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "website", "services",
+                                                "authentication", "face_verification")))
+import batch_enroll
+
+
+def _photo(tmp_path, h, w):
+    path = str(tmp_path / "id.png")
+    img = np.full((h, w, 3), 200, dtype=np.uint8)
+    cv2.circle(img, (w // 2, h // 2), min(h, w) // 4, (90, 120, 160), -1)
+    cv2.imwrite(path, img)
+    return path
+
+
+@pytest.mark.parametrize("h, w", [(3000, 2000), (1500, 4100), (600, 400)])
+def test_photos_of_any_size_reach_the_detector(tmp_path, h, w):
+    out = batch_enroll.encode_photo(("s1", _photo(tmp_path, h, w), "hog", 1024, 1))
+    # no face in the picture, but it must be looked at rather than fail in dlib
+    assert out["status"] == "no_face", out.get("message")
+
+
+def test_oversized_photo_is_encoded(tmp_path, monkeypatch):
+    seen = []
+
+    def one_face(img, model="hog"):
+        seen.append(img.shape)
+        h, w = img.shape[:2]
+        return [(h // 4, 3 * w // 4, 3 * h // 4, w // 4)]
+
+    # the synthetic photo has no real face, so pin the box; the encoder is dlib's own
+    monkeypatch.setattr(batch_enroll.face_recognition, "face_locations", one_face)
+    out = batch_enroll.encode_photo(("s1", _photo(tmp_path, 3000, 2000), "hog", 1024, 1))
+    assert out["status"] == "ok", out.get("message")
+    assert len(out["encoding"]) == 128 and seen == [(1024, 683, 3)]
+
+
+def test_manifest_skips_only_this_inputs_photos(tmp_path):
+    src = tmp_path / "photos"
+    (src / "s1").mkdir(parents=True)
+    path = _photo(src / "s1", 300, 200)
+    manifest = tmp_path / "m.jsonl"
+    manifest.write_text('{"student_id": "s1", "path": "%s", "status": "no_face"}\n'
+                        '{"student_id": "old", "path": "/gone.jpg", "status": "ok"}\n' % path)
+    out = batch_enroll.enroll(str(src), batch_enroll.FaceStore(str(tmp_path / "store")), str(manifest),
+                              workers=1, log=lambda *_: None)
+    assert (out["ok"], out["rejected"], out["skipped"]) == (0, 0, 1)
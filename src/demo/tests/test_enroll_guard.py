@@ -0,0 +1,35 @@
+import pytest
+from flask_login import login_user
+from website.biometrics import _enroll_denied
+from conftest import make_user
+
+
+def _status(app, student_id, enrolled=False, user=None):
+    with app.test_request_context():
+        if user is not None:
+            login_user(user)
+        denied = _enroll_denied(student_id, lambda sid: enrolled)
+        return None if denied is None else denied[1]
+
+
+@pytest.mark.parametrize("student_id", [None, "", "../etc", "a b", "x" * 65])
+def test_missing_or_malformed_id_is_400(app, student_id):
+    assert _status(app, student_id) == 400
+
+
+def test_first_enrollment_needs_no_login(app):
+    assert _status(app, "21001") is None
+
+
+def test_enrolled_id_needs_the_owner_or_a_teacher(app):
+    owner, other = make_user(student_id="21001"), make_user(student_id="21002")
+    teacher = make_user(role="teacher", name="t")
+    assert _status(app, "21003", enrolled=True) == 403
+    assert _status(app, "21003", enrolled=True, user=other) == 403
+    assert _status(app, "21001", enrolled=True, user=owner) is None
+    assert _status(app, "21003", enrolled=True, user=teacher) is None
+
+
+def test_account_without_template_is_guarded_too(app):
+    make_user(student_id="21001")
+    assert _status(app, "21001") == 403
@@ -0,0 +1,78 @@
+import threading
+import numpy as np
+from website.services.authentication.face_verification.face_ann import IVFIndex
+from website.services.authentication.face_verification.face_index import FaceIndex, SharedFaceIndex
+from website.services.authentication.face_verification.face_store import FaceStore
+
+
+def _gallery(students=200, per=3, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((students, 128)).astype(np.float32)
+    encs = np.repeat(centers, per, axis=0) + 0.05 * rng.standard_normal((students * per, 128)).astype(np.float32)
+    names = [f"s{i}" for i in range(students) for _ in range(per)]
+    return centers, FaceIndex.from_arrays(encs, names)
+
+
+def _assigned(ann):
+    return np.sort(np.concatenate(ann._lists))
+
+
+def test_untrained_index_falls_back_to_a_full_scan():
+    centers, base = _gallery(students=20)
+    ann = IVFIndex(base)
+    assert not ann.trained
+    assert ann.search(centers[7], k=3) == base.search(centers[7], k=3)
+
+
+def test_recall_against_full_scan():
+    centers, base = _gallery()
+    ann = IVFIndex(base).train(nlist=16, seed=1)
+    hits = sum(ann.nearest(c, nprobe=4)[0] == base.nearest(c)[0] for c in centers)
+    assert hits / len(centers) >= 0.95
+    # probing every cell is exact
+    assert all(ann.nearest(c, nprobe=ann.nlist)[0] == f"s{i}" for i, c in enumerate(centers))
+
+
+def test_rows_enrolled_after_training_are_assigned(tmp_path):
+    base = SharedFaceIndex(FaceStore(str(tmp_path)))
+    centers, seed_gallery = _gallery(students=50)
+    for name in seed_gallery.students():
+        base.add(name, seed_gallery.vectors_of(name))
+    ann = IVFIndex(base).train(nlist=8)
+    path = str(tmp_path / "ivf.npz")
+    ann.save(path)
+
+    probe = np.random.default_rng(9).standard_normal(128).astype(np.float32)
+    base.add("late", [probe])
+    assert ann.nearest(probe, nprobe=ann.nlist)[0] == "late"
+    assert _assigned(ann).tolist() == list(range(base._size))
+
+    base.remove("s3")
+    base.compact()                                   # renumbers rows: reassigned on next query
+    reloaded = IVFIndex.load(base, path)
+    assert reloaded.nearest(probe, nprobe=reloaded.nlist)[0] == "late"
+    assert _assigned(reloaded).tolist() == list(range(base._size))
+
+
+def test_concurrent_searches_assign_new_rows_once(tmp_path):
+    base = SharedFaceIndex(FaceStore(str(tmp_path)))
+    centers, seed_gallery = _gallery(students=30)
+    for name in seed_gallery.students():
+        base.add(name, seed_gallery.vectors_of(name))
+    ann = IVFIndex(base).train(nlist=4)
+    rng = np.random.default_rng(3)
+
+    for step in range(10):
+        base.add(f"new{step}", rng.standard_normal((20, 128)).astype(np.float32))
+        start = threading.Barrier(8)
+
+        def run():
+            start.wait()
+            ann.search(centers[0], k=2)
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert _assigned(ann).tolist() == list(range(base._size))
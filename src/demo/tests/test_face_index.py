@@ -0,0 +1,95 @@
+import threading
+import numpy as np
+import pytest
+from website.services.authentication.face_verification.face_index import SharedFaceIndex
+from website.services.authentication.face_verification.face_store import FaceStore
+
+
+def _encs(n, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, 128)).astype(np.float32)
+
+
+def _assert_consistent(index):
+    n = index._size
+    assert len(index._sq) == len(index._labels) == len(index._live) == len(index._vecs) == n
+    assert sorted(r for rows in index._rows.values() for r in rows) == np.flatnonzero(index._live).tolist()
+    for name, rows in index._rows.items():
+        assert all(index._labels[r] == name for r in rows)
+    np.testing.assert_allclose(index._sq, np.einsum("ij,ij->i", index._vecs, index._vecs), rtol=1e-5)
+
+
+@pytest.fixture
+def root(tmp_path):
+    return str(tmp_path / "store")
+
+
+def test_sync_picks_up_other_workers_writes(root):
+    index = SharedFaceIndex(FaceStore(root))
+    other = FaceStore(root)                       # another worker mapping the same files
+
+    assert index.sync() is False
+    other.append("s1", _encs(2, 1))
+    other.append("s2", _encs(2, 2))
+    assert index.sync() is True
+    assert sorted(index.students()) == ["s1", "s2"]
+    assert index.nearest(_encs(2, 2)[1])[0] == "s2"
+
+    other.delete("s1")
+    assert index.sync() is True
+    assert index.students() == ["s2"] and len(index) == 2
+    _assert_consistent(index)
+
+
+def test_compaction_elsewhere_rebuilds(root):
+    index = SharedFaceIndex(FaceStore(root))
+    other = FaceStore(root)
+    other.append("s1", _encs(3, 1))
+    other.append("s2", _encs(1, 2))
+    index.sync()
+    other.delete("s1")
+    other.compact()
+
+    assert index.sync() is True
+    assert index.epoch == other.version()[1]
+    assert index.rows_of("s2") == [0] and len(index) == 1
+    _assert_consistent(index)
+
+
+def test_replace_through_the_index(root):
+    index = SharedFaceIndex(FaceStore(root))
+    index.add("s1", _encs(2, 1))
+    index.replace("s1", _encs(3, 3))
+    np.testing.assert_array_equal(index.vectors_of("s1"), _encs(3, 3))
+    _assert_consistent(index)
+
+
+@pytest.mark.parametrize("quantize", [None, "int8"])
+def test_concurrent_syncs_apply_each_write_once(root, quantize):
+    index = SharedFaceIndex(FaceStore(root), quantize=quantize)
+    other = FaceStore(root)
+    errors = []
+
+    for step in range(20):
+        other.append_many([f"s{step}"] * 2 + ["s0"], _encs(3, step))
+        if step % 5 == 4:
+            other.delete(f"s{step - 1}")
+        start = threading.Barrier(8)
+
+        def run():
+            try:
+                start.wait()
+                index.sync()
+            except Exception as e:          # surfaced below, threads swallow them
+                errors.append(e)
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    assert not errors
+    assert len(index) == other.live_count()
+    _assert_consistent(index)
+    if quantize:
+        assert len(index._codes) == len(index._scale) == index._size
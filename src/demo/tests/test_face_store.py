@@ -0,0 +1,65 @@
+import os
+import numpy as np
+import pytest
+from website.services.authentication.face_verification.face_store import RECORD, FaceStore
+
+
+def _encs(n, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, 128)).astype(np.float32)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FaceStore(str(tmp_path / "store"))
+
+
+def test_append_and_reopen(store):
+    a, b = _encs(3, 1), _encs(2, 2)
+    assert store.append("s1", a) == [0, 1, 2]
+    assert store.append_many(["s2", "s1"], b) == [3, 4]
+
+    again = FaceStore(store.root)
+    assert len(again) == 5
+    assert again.student_ids().tolist() == ["s1", "s1", "s1", "s2", "s1"]
+    assert again.records["sample"].tolist() == [0, 1, 2, 0, 3]
+    np.testing.assert_array_equal(again.vectors[:3], a)
+    np.testing.assert_array_equal(again.vectors[3:], b)
+
+
+def test_every_write_bumps_generation(store):
+    g0, e0 = store.version()
+    store.append("s1", _encs(1))
+    store.delete("s1")
+    assert store.version() == (g0 + 2, e0)
+    store.compact()
+    assert store.version() == (g0 + 3, e0 + 1)
+
+
+def test_delete_tombstones_and_compact_drops(store):
+    store.append("s1", _encs(2, 1))
+    store.append("s2", _encs(2, 2))
+    assert store.delete("s1") == 2
+    assert store.rows_of("s1").tolist() == []
+    assert store.live_count() == 2 and len(store) == 4
+
+    assert store.compact() == 2
+    assert len(store) == 2
+    assert store.student_ids().tolist() == ["s2", "s2"]
+    np.testing.assert_array_equal(store.vectors, _encs(2, 2))
+
+
+def test_append_drops_torn_tail_of_a_crashed_write(store):
+    store.append("s1", _encs(2, 1))
+    # a crash mid-append leaves half a vector and half a record behind
+    with open(store.vec_path, "ab") as f:
+        f.write(b"\x01" * 200)
+    with open(store.idx_path, "ab") as f:
+        f.write(b"\x02" * (RECORD.itemsize // 2))
+
+    assert store.append("s2", _encs(1, 2)) == [2]
+    again = FaceStore(store.root)
+    assert len(again) == 3
+    assert again.student_ids().tolist() == ["s1", "s1", "s2"]
+    assert again.live.all()
+    np.testing.assert_array_equal(again.vectors[2], _encs(1, 2)[0])
+    assert len(again.records) * RECORD.itemsize == os.path.getsize(store.idx_path)
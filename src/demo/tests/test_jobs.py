@@ -0,0 +1,61 @@
+import threading
+import time
+import pytest
+from website.services import jobs
+from website.services.jobs import JobManager, JobQueueFull
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return JobManager(str(tmp_path), cpu_workers=0, io_workers=8, max_pending=3)
+
+
+def test_pending_limit_holds_under_concurrent_submits(manager, monkeypatch):
+    write = jobs._write
+
+    def slow_write(root, job):
+        time.sleep(0.02)              # widen the gap between the check and the future
+        write(root, job)
+
+    monkeypatch.setattr(jobs, "_write", slow_write)
+    release = threading.Event()
+    accepted, rejected = [], []
+
+    def submit():
+        try:
+            accepted.append(manager.submit("t", release.wait, 5, cpu=False))
+        except JobQueueFull:
+            rejected.append(1)
+
+    threads = [threading.Thread(target=submit) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(accepted) == 3 and len(rejected) == 7
+    assert manager.stats()["pending"] == 3
+
+    release.set()
+    for job in accepted:
+        assert manager.wait(job["id"], timeout=5)["state"] == "done"
+    deadline = time.monotonic() + 5       # the done-callback frees the slot after publishing
+    while manager.stats()["pending"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert manager.stats()["pending"] == 0
+
+
+def test_owner_scoped(manager):
+    job = manager.submit("t", lambda: {"ok": True}, owner="7", cpu=False)
+    assert manager.wait(job["id"], owner="7", timeout=5)["result"] == {"ok": True}
+    assert manager.get(job["id"], owner="8") is None
+    assert manager.get(job["id"]) is None
+
+
+def test_failed_submit_frees_the_slot(manager, monkeypatch):
+    def broken(root, job):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(jobs, "_write", broken)
+    with pytest.raises(OSError):
+        manager.submit("t", lambda: None, cpu=False)
+    assert manager.stats()["pending"] == 0
@@ -0,0 +1,19 @@
+import pytest
+from conftest import login, make_user
+
+
+@pytest.fixture
+def app_mode():
+    return "full"
+
+
+@pytest.mark.parametrize("path", ["/kiosk/start?camera=1", "/kiosk/stop"])
+def test_students_cannot_run_the_terminal_camera(client, path):
+    login(client, make_user(student_id="21001"))
+    r = client.post(path)
+    assert r.status_code == 403 and not r.get_json()["ok"]
+
+
+@pytest.mark.parametrize("path", ["/kiosk/start", "/kiosk/stop"])
+def test_kiosk_needs_a_login(client, path):
+    assert client.post(path).status_code == 302
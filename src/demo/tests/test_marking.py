@@ -0,0 +1,103 @@
+import pytest
+from website.extensions import db
+from website.models import Attendance, Outbox
+from website.services import marking
+from conftest import login, make_session, make_user
+
+
+@pytest.fixture
+def world(app):
+    teacher = make_user(role="teacher", name="t")
+    return {"teacher": teacher, "alice": make_user(student_id="21001"), "bob": make_user(student_id="21002"),
+            "session": make_session(teacher)}
+
+
+def _mark(client, session, student_id, key=None, **extra):
+    headers = {"Idempotency-Key": key} if key else {}
+    return client.post("/api/attendance", json={"session_id": session.id, "student_id": student_id, **extra},
+                       headers=headers)
+
+
+def test_mark_once_then_409(client, world):
+    login(client, world["alice"])
+    r = _mark(client, world["session"], "21001", face_ok=True)
+    assert r.status_code == 201 and r.get_json()["ok"]
+    assert _mark(client, world["session"], "21001").status_code == 409
+
+    rows = Attendance.query.all()
+    assert len(rows) == 1 and rows[0].face_ok
+    assert Outbox.query.count() == 1                  # the event rides in the same commit
+
+
+def test_keyed_retry_replays_the_first_response(client, world):
+    login(client, world["alice"])
+    first = _mark(client, world["session"], "21001", key="k1")
+    again = _mark(client, world["session"], "21001", key="k1")
+    assert (first.status_code, again.status_code) == (201, 201)
+    assert again.get_json()["id"] == first.get_json()["id"] and again.get_json()["replayed"]
+    # a fresh key for the same mark is a real duplicate
+    assert _mark(client, world["session"], "21001", key="k2").status_code == 409
+
+
+def test_key_reused_for_another_mark_is_422(client, world):
+    other = make_session(world["teacher"], class_name="CS102")
+    login(client, world["alice"])
+    assert _mark(client, world["session"], "21001", key="k1").status_code == 201
+    assert _mark(client, other, "21001").status_code == 201
+    r = _mark(client, other, "21001", key="k1")
+    assert r.status_code == 422
+
+
+def test_students_only_mark_themselves(client, world):
+    login(client, world["alice"])
+    assert _mark(client, world["session"], "21002").status_code == 403
+
+
+def test_teacher_only_in_own_sessions(client, world):
+    other_teacher = make_user(role="teacher", name="t2")
+    login(client, other_teacher)
+    assert _mark(client, world["session"], "21001").status_code == 403
+    login(client, world["teacher"])
+    assert _mark(client, world["session"], "21001").status_code == 201
+
+
+@pytest.mark.parametrize("body, status", [
+    ({"student_id": "21001"}, 400),
+    ({"session_id": "x", "student_id": "21001"}, 400),
+    ({"session_id": 999, "student_id": "21001"}, 404),
+    ({"session_id": None, "student_id": "99999"}, 404),
+])
+def test_bad_requests(client, world, body, status):
+    login(client, world["teacher"])
+    if body.get("session_id", "") is None:
+        body["session_id"] = world["session"].id
+    assert client.post("/api/attendance", json=body).status_code == status
+
+
+@pytest.mark.parametrize("minutes_ago, minutes_left", [(120, -60), (-60, 120)])
+def test_mark_outside_the_session_window_is_rejected(client, world, minutes_ago, minutes_left):
+    s = make_session(world["teacher"], minutes_ago=minutes_ago, minutes_left=minutes_left)
+    login(client, world["alice"])
+    r = _mark(client, s, "21001")
+    assert r.status_code == 400 and r.get_json()["error"] == "outside_session_window"
+    assert Attendance.query.count() == 0
+
+
+def test_geofence(client, world):
+    s = make_session(world["teacher"], lat=12.97, lng=77.59, radius_m=100)
+    login(client, world["alice"])
+    assert _mark(client, s, "21001").get_json()["error"] == "geolocation required for this session"
+    assert _mark(client, s, "21001", lat=13.5, lng=77.59).get_json()["error"].startswith("outside_radius:")
+    assert _mark(client, s, "21001", lat=12.9701, lng=77.5901).status_code == 201
+
+
+def test_mark_without_on_conflict_support(app, world, monkeypatch):
+    # other dialects take the savepoint path
+    monkeypatch.setattr(marking, "_dialect_insert", lambda model: None)
+    body, status = marking.mark({"session_id": world["session"].id, "student_id": "21001"})
+    assert status == 201
+    with pytest.raises(marking.MarkError) as e:
+        marking.mark({"session_id": world["session"].id, "student_id": "21001"})
+    assert e.value.status == 409
+    db.session.rollback()
+    assert Attendance.query.count() == 1
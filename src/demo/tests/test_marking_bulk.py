@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from website.models import Attendance, Outbox
+from website.services import marking
+from conftest import login, make_session, make_user
+
+
+@pytest.fixture
+def world(app):
+    teacher = make_user(role="teacher", name="t")
+    students = [make_user(student_id=f"2100{i}") for i in range(1, 4)]
+    return {"teacher": teacher, "students": students, "session": make_session(teacher)}
+
+
+def _bulk(client, items, key=None):
+    headers = {"Idempotency-Key": key} if key else {}
+    return client.post("/api/attendance/bulk", json={"items": items}, headers=headers)
+
+
+def _ms(dt):
+    return int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def test_per_item_statuses_in_order(client, world):
+    s = world["session"]
+    other = make_session(make_user(role="teacher", name="t2"))
+    login(client, world["teacher"])
+    assert _bulk(client, [{"session_id": s.id, "student_id": "21003"}]).status_code == 200
+
+    r = _bulk(client, [
+        {"session_id": s.id, "student_id": "21001", "face_ok": True},
+        {"session_id": s.id, "student_id": "21001"},                 # repeated in the batch
+        {"session_id": s.id, "student_id": "21003"},                 # marked earlier
+        {"session_id": s.id, "student_id": "99999"},
+        {"session_id": 999, "student_id": "21002"},
+        {"session_id": other.id, "student_id": "21002"},             # not this teacher's session
+        {"student_id": "21002"},
+        {"session_id": s.id, "student_id": "21002", "marked_at": "yesterday"},
+        {"session_id": s.id, "student_id": "21002"},
+    ])
+    assert r.status_code == 200
+    body = r.get_json()
+    assert [x["status"] for x in body["results"]] == \
+        ["marked", "duplicate", "duplicate"] + ["rejected"] * 5 + ["marked"]
+    assert [x.get("error") for x in body["results"][3:8]] == [
+        "Student not found", "Session not found", "Not your session", "missing field: session_id",
+        "marked_at must be ms since the epoch or an ISO 8601 string"]
+    assert (body["marked"], body["duplicate"], body["rejected"]) == (2, 2, 5)
+    assert Attendance.query.filter_by(session_id=s.id).count() == 3
+    assert Outbox.query.count() == 3                                # one event per new mark
+
+
+def test_client_time_must_fall_in_the_session(client, world):
+    s = world["session"]
+    login(client, world["teacher"])
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    r = _bulk(client, [
+        {"session_id": s.id, "student_id": "21001", "marked_at": _ms(s.start_ts - timedelta(hours=1))},
+        {"session_id": s.id, "student_id": "21002", "marked_at": _ms(now + timedelta(hours=1))},
+        {"session_id": s.id, "student_id": "21003", "marked_at": (s.start_ts + timedelta(minutes=1)).isoformat() + "Z"},
+    ])
+    assert [x.get("error") for x in r.get_json()["results"]] == \
+        ["outside_session_window", "marked_at is in the future", None]
+    a = Attendance.query.one()
+    assert a.marked_at == s.start_ts + timedelta(minutes=1)          # the client's time is kept
+
+
+def test_keyed_batch_replays(client, world):
+    s = world["session"]
+    login(client, world["teacher"])
+    items = [{"session_id": s.id, "student_id": "21001"}, {"session_id": s.id, "student_id": "21002"}]
+    first = _bulk(client, items, key="b1").get_json()
+    again = _bulk(client, items, key="b1").get_json()
+    assert again["replayed"] and again["results"] == first["results"]
+    assert [x["status"] for x in first["results"]] == ["marked", "marked"]
+    assert _bulk(client, items[:1], key="b1").status_code == 422
+
+
+@pytest.mark.parametrize("items, status", [([], 400), ("x", 400), (None, 400)])
+def test_unusable_batches(client, world, items, status):
+    login(client, world["teacher"])
+    assert client.post("/api/attendance/bulk", json={"items": items}).status_code == status
+
+
+def test_batch_size_cap(client, world, monkeypatch):
+    monkeypatch.setattr(marking, "BULK_MAX_ITEMS", 2)
+    login(client, world["teacher"])
+    assert _bulk(client, [{"session_id": world["session"].id, "student_id": "21001"}] * 3).status_code == 413
+
+
+def test_expired_session_redirects_to_login(client, world):
+    # the offline queue keeps its batch on anything but a JSON answer (static/js/student.js)
+    r = _bulk(client, [{"session_id": world["session"].id, "student_id": "21001"}])
+    assert r.status_code == 302 and "/student/login" in r.headers["Location"]
+    assert Attendance.query.count() == 0
+
+
+def test_students_cannot_sync_backdated_marks_late(client, world, monkeypatch):
+    monkeypatch.setattr(marking, "BULK_OFFLINE_GRACE_SEC", 3600)
+    ended = make_session(world["teacher"], minutes_ago=3 * 24 * 60, minutes_left=-3 * 24 * 60 + 60)
+    recent = make_session(world["teacher"], minutes_ago=90, minutes_left=-30)
+    item = lambda s: {"session_id": s.id, "student_id": "21001",
+                      "marked_at": _ms(s.start_ts + timedelta(minutes=5))}
+
+    login(client, world["students"][0])
+    r = _bulk(client, [item(ended), item(recent)])
+    assert [x.get("error") for x in r.get_json()["results"]] == ["offline_sync_too_late", None]
+
+    # a teacher may still sync the roster late
+    login(client, world["teacher"])
+    r = _bulk(client, [dict(item(ended), student_id="21002")])
+    assert r.get_json()["results"][0]["status"] == "marked"
@@ -0,0 +1,43 @@
+import threading
+import time
+import pytest
+from website.services import model_registry
+
+
+@pytest.fixture
+def slow_model():
+    release, started, calls = threading.Event(), threading.Event(), []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "weights"
+
+    model_registry.register("test-slow", loader, lambda m: None)
+    yield release, started, calls
+    release.set()
+    with model_registry._LOCK:
+        for d in (model_registry._SPECS, model_registry._MODELS, model_registry._STATUS, model_registry._LOAD_LOCKS):
+            d.pop("test-slow", None)
+
+
+def test_status_answers_while_a_model_loads(slow_model):
+    release, started, calls = slow_model
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(model_registry.get("test-slow"))) for _ in range(3)]
+    for t in threads:
+        t.start()
+    assert started.wait(5)
+
+    t0 = time.perf_counter()
+    st = model_registry.status()
+    assert time.perf_counter() - t0 < 1.0
+    assert st["models"]["test-slow"]["loaded"] is False
+
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert results == ["weights"] * 3 and calls == [1]        # loaded once
+    model_registry.warm("test-slow")
+    assert model_registry.status()["models"]["test-slow"]["warm"]
@@ -0,0 +1,116 @@
+import pytest
+from website.extensions import db
+from website.models import AttendanceRollup, Outbox
+from website.services import attendance_excel, marking, outbox
+from conftest import make_session, make_user
+
+
+class Recorder(outbox.Sink):
+    def __init__(self, name, fail=0):
+        self.name, self.fail, self.batches = name, fail, []
+
+    def deliver(self, events):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError(f"{self.name} down")
+        self.batches.append([e["payload"]["student_id"] for e in events])
+
+
+@pytest.fixture
+def sinks(monkeypatch):
+    monkeypatch.setattr(outbox, "_sinks", None)      # restored after the test
+
+    def use(*sinks):
+        outbox.set_sinks(sinks)
+        return sinks
+    return use
+
+
+@pytest.fixture
+def session(app):
+    teacher = make_user(role="teacher", name="t")
+    for i in range(1, 4):
+        make_user(student_id=f"2100{i}", name=f"s{i}")
+    return make_session(teacher)
+
+
+def _mark(session, *codes):
+    for code in codes:
+        marking.mark({"session_id": session.id, "student_id": code})
+
+
+def test_nothing_is_delivered_before_a_drain(session, sinks):
+    a, = sinks(Recorder("a"))
+    _mark(session, "21001")
+    assert a.batches == [] and Outbox.query.one().state == "pending"
+
+
+def test_rolled_back_mark_leaves_no_event(session, sinks):
+    outbox.enqueue(outbox.MARKED, {"student_id": "21001"})
+    db.session.rollback()
+    assert Outbox.query.count() == 0
+
+
+def test_drain_delivers_a_batch_to_every_sink(session, sinks):
+    a, b = sinks(Recorder("a"), Recorder("b"))
+    _mark(session, "21001", "21002")
+    assert outbox.drain_once() == 2
+    assert a.batches == b.batches == [["21001", "21002"]]
+    assert {r.state for r in Outbox.query} == {"sent"}
+    assert outbox.drain_once() == 0                      # nothing redelivered
+
+
+def test_failed_sink_is_retried_alone(session, sinks, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_RETRY_BASE_SEC", 0)
+    a, b = sinks(Recorder("a"), Recorder("b", fail=1))
+    _mark(session, "21001")
+
+    outbox.drain_once()
+    row = Outbox.query.one()
+    assert (row.state, row.attempts, row.done_sinks) == ("pending", 1, "a")
+    assert row.last_error == "b: b down"
+
+    outbox.drain_once()
+    db.session.refresh(row)
+    assert (row.state, row.done_sinks) == ("sent", "a,b")
+    assert a.batches == [["21001"]] and b.batches == [["21001"]]   # "a" was not delivered twice
+
+
+def test_retry_waits_for_its_backoff(session, sinks):
+    sinks(Recorder("a", fail=1))
+    _mark(session, "21001")
+    outbox.drain_once()
+    assert outbox.drain_once() == 0
+    row = Outbox.query.one()
+    assert row.next_attempt_at > row.created_at
+
+
+def test_row_dies_after_max_attempts(session, sinks, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_RETRY_BASE_SEC", 0)
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 3)
+    sinks(Recorder("a", fail=10))
+    _mark(session, "21001")
+    for _ in range(5):
+        outbox.drain_once()
+    row = Outbox.query.one()
+    assert (row.state, row.attempts) == ("dead", 3)
+
+
+def test_claimed_rows_are_skipped_until_the_lease_ends(session, sinks):
+    sinks(Recorder("a"))
+    _mark(session, "21001")
+    assert len(outbox._claim(10)) == 1
+    assert outbox.drain_once() == 0                      # leased to the first claim
+
+
+def test_builtin_sinks(session, sinks, tmp_path, monkeypatch):
+    monkeypatch.setattr(attendance_excel, "EXPORT_FILE", str(tmp_path / "none.xlsx"))   # nothing to seed from
+    monkeypatch.setattr(attendance_excel, "journal", attendance_excel.Journal(str(tmp_path / "j.jsonl"), 0))
+    webhook = tmp_path / "hook.jsonl"
+    sinks(outbox.JournalSink(), outbox.RollupSink(), outbox.WebhookSink(f"file://{webhook}"))
+    _mark(session, "21001", "21002")
+    outbox.drain_once()
+
+    assert [r["student_id"] for r in attendance_excel.journal] == ["21001", "21002"]
+    assert db.session.get(AttendanceRollup, session.id).marks == 2
+    assert len(webhook.read_text().splitlines()) == 2
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("face_recognition")
+from website.services.authentication.face_verification import pipeline
+
+
+class SquareDetector:
+    """Stands in for HOG: the "face" is the white square; records the image sizes it scanned."""
+
+    def __init__(self):
+        self.scanned = []
+
+    def __call__(self, img, number_of_times_to_upsample=1, model="hog"):
+        self.scanned.append(img.shape[:2])
+        ys, xs = np.nonzero(img[..., 0] == 255)
+        if not len(ys):
+            return []
+        return [(int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1, int(xs.min()))]
+
+
+def _frame(top, left, size=100):
+    bgr = np.zeros((480, 640, 3), dtype=np.uint8)
+    bgr[top:top + size, left:left + size] = 255
+    return bgr
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    det = SquareDetector()
+    monkeypatch.setattr(pipeline.fr, "face_locations", det)
+    # the "encoding" is where the box is, so a stale box shows up in the result
+    monkeypatch.setattr(pipeline.fr, "face_encodings",
+                        lambda rgb, boxes, **kw: [np.array(boxes[0], dtype=float)])
+    return det
+
+
+def _covers(box, top, left, size=100, slack=4):
+    t, r, b, l = box
+    return abs(t - top) <= slack and abs(l - left) <= slack and abs(b - top - size) <= slack \
+        and abs(r - left - size) <= slack
+
+
+def test_moving_face_is_followed_between_detections(detector):
+    pipe = pipeline.FramePipeline(scale=0.5, detect_every=5)
+    path = [(100, 100), (120, 140), (140, 180), (150, 220), (160, 260)]
+    sources = []
+    for top, left in path:
+        enc = pipe.process(_frame(top, left))
+        sources.append(pipe.last_timings["source"])
+        assert _covers(enc, top, left), (top, left, enc)
+    assert sources == ["detect", "track", "track", "track", "track"]
+    # tracking scans a crop around the face, not the whole (downscaled) frame
+    assert all(h * w < 240 * 320 for h, w in detector.scanned[1:])
+
+
+def test_face_that_jumps_away_is_detected_again(detector):
+    pipe = pipeline.FramePipeline(scale=0.5, detect_every=5)
+    pipe.process(_frame(50, 50))
+    enc = pipe.process(_frame(350, 500))
+    assert pipe.last_timings["source"] == "detect" and _covers(enc, 350, 500)
+
+
+def test_no_face_resets_tracking(detector):
+    pipe = pipeline.FramePipeline(detect_every=5)
+    pipe.process(_frame(50, 50))
+    assert pipe.process(np.zeros((480, 640, 3), dtype=np.uint8)) is None
+    pipe.process(_frame(60, 60))
+    assert pipe.last_timings["source"] == "detect"
+
+
+def test_full_detect_every_n_frames(detector):
+    pipe = pipeline.FramePipeline(detect_every=3)
+    for _ in range(6):
+        pipe.process(_frame(100, 100))
+    assert pipe.last_timings["source"] == "track"
+    pipe.process(_frame(100, 100))
+    assert pipe.last_timings["source"] == "detect"
@@ -0,0 +1,83 @@
+import os
+import numpy as np
+import pytest
+from website.services.authentication.speech_verification import speaker_store
+from website.services.authentication.speech_verification.speaker_store import SpeakerStore, accept
+
+
+def _vecs(n, seed=0, dim=16):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SpeakerStore(str(tmp_path), "embedding")
+
+
+def _rewrite(path, vec):
+    # what another worker's enroll() does: write aside, then rename over
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, vec)
+    os.replace(tmp, path)
+
+
+def test_enroll_replaces_unless_append(store):
+    a, b, c = _vecs(3, 1)
+    assert store.enroll("s1", a) == 1
+    assert store.enroll("s1", b, append=True) == 2
+    assert np.load(store.path_of("s1")).shape == (2, 16)
+    # the best of the samples wins
+    assert store.score("s1", b)["score"] == pytest.approx(1.0, abs=1e-5)
+    assert store.score("s1", a)["score"] == pytest.approx(1.0, abs=1e-5)
+    assert store.enroll("s1", c) == 1
+    assert store.samples("s1") == 1
+    assert np.load(store.path_of("s1")).shape == (16,)
+
+
+def test_single_vector_file_loads_as_one_row(tmp_path):
+    np.save(tmp_path / "old_embedding.npy", _vecs(1, 2)[0])
+    store = SpeakerStore(str(tmp_path), "embedding")
+    store.refresh()
+    assert "old" in store and store.samples("old") == 1
+
+
+def test_files_changed_elsewhere_are_picked_up(store):
+    a, b = _vecs(2, 3)
+    store.enroll("s1", a)
+    assert store.score("s1", a)["score"] == pytest.approx(1.0, abs=1e-5)
+
+    _rewrite(store.path_of("s1"), np.vstack([a, b]))
+    assert store.refresh()
+    assert store.samples("s1") == 2
+    assert store.score("s1", b)["score"] == pytest.approx(1.0, abs=1e-5)
+
+    os.remove(store.path_of("s1"))
+    assert "s1" not in store
+    assert store.score("s1", a) is None
+
+
+def test_snorm_needs_min_cohort(store, monkeypatch):
+    monkeypatch.setattr(speaker_store, "MIN_COHORT", 3)
+    vecs = _vecs(4, 4)
+    for i, v in enumerate(vecs[:3]):
+        store.enroll(f"s{i}", v)
+
+    scored = store.score("s0", vecs[0])
+    assert scored["cohort"] == 2 and scored["snorm"] is None
+    # raw cosine decides below MIN_COHORT
+    assert accept(scored, threshold=0.9)
+    assert not accept(scored, threshold=1.1)
+
+    store.enroll("s3", vecs[3])
+    scored = store.score("s0", vecs[0])
+    assert scored["cohort"] == 3 and scored["snorm"] is not None
+    # now S-norm decides and the cosine threshold is ignored
+    assert accept(scored, threshold=1.1, snorm_threshold=scored["snorm"] - 0.1)
+    assert not accept(scored, threshold=0.0, snorm_threshold=scored["snorm"] + 0.1)
+
+
+def test_probe_dims_must_match(store):
+    store.enroll("s1", _vecs(1, 5)[0])
+    with pytest.raises(ValueError):
+        store.score("s1", _vecs(1, 5, dim=8)[0])
@@ -1,8 +1,13 @@
+import os
 from flask import Flask
 from .extensions import db, migrate, login_manager
 from pathlib import Path
 
-def create_app(config_class=None):
+# full: every route; web: dashboards, auth and /api only (no face / speech
+# stack is imported), for nodes scaled separately from biometric ones
+APP_MODES = ("full", "web")
+
+def create_app(config_class=None, mode=None):
     app = Flask(
         __name__,
         static_folder="static",
@@ -36,14 +41,33 @@ def create_app(config_class=None):
 
     from . import models
 
+    mode = mode or os.getenv("APP_MODE", "full")
+    if mode not in APP_MODES:
+        raise ValueError(f"APP_MODE must be one of {APP_MODES}, got {mode!r}")
+    app.config["APP_MODE"] = mode
+
     # register blueprints
     from .views import web_bp
     from .api import api_bp
 
     app.register_blueprint(web_bp)
     app.register_blueprint(api_bp, url_prefix="/api")
+    if mode == "full":
+        from .biometrics import bio_bp
+        app.register_blueprint(bio_bp)
 
-    with app.app_context():
+    from .services import outbox
+    outbox.init_app(app)
+
+    # creating tables on every boot costs each worker a round of DDL checks;
+    # set DB_CREATE_ALL=0 in production and run `flask create-db` once instead
+    @app.cli.command("create-db")
+    def create_db():
+        """Create any missing tables."""
         db.create_all()
 
+    if os.getenv("DB_CREATE_ALL", "1") != "0":
+        with app.app_context():
+            db.create_all()
+
     return app
@@ -1,12 +1,10 @@
-import math
 import os
 from datetime import datetime, timezone as dt_timezone   # datetime's timezone
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify, send_file, stream_with_context
 from .extensions import db
-from .models import Session, Attendance, User
-from sqlalchemy.exc import IntegrityError
+from .models import Session, Attendance
 import requests
-from .services import attendance_excel
+from .services import attendance_excel, attendance_export, jobs, marking, metrics, model_registry
 from pytz import timezone as pytz_timezone   # pytz timezone
 
 api_bp = Blueprint("api", __name__)
@@ -178,80 +176,129 @@ def list_attendance():
     return jsonify(out)
 
 @api_bp.post("/attendance")
+@login_required
 def mark_attendance():
-    data = request.get_json(silent=True) or {}
-    for f in ("session_id", "student_id"):
-        if data.get(f) in (None, "", []):
-            return jsonify({"error": f"missing field: {f}"}), 400
-
-    try:
-        session_id = int(data["session_id"])
-        student_id = int(data["student_id"])
-    except Exception:
-        return jsonify({"error": "session_id and student_id must be integers"}), 400
-
-    s = Session.query.get_or_404(session_id)
-    student = User.query.filter_by(student_id=student_id, role="student").first()
-    if not student:
-        return jsonify({"error": "Student not found"}), 404
-
-    # geofence check
-    if s.lat is not None and s.lng is not None and s.radius_m is not None:
-        lat = data.get("lat")
-        lng = data.get("lng")
-        if lat is None or lng is None:
-            return jsonify({"error": "geolocation required for this session"}), 400
-        try:
-            dist = haversine_m(float(s.lat), float(s.lng), float(lat), float(lng))
-        except Exception:
-            return jsonify({"error": "bad_coordinates"}), 400
-        if dist > float(s.radius_m):
-            return jsonify({"error": f"outside_radius:{round(dist)}"}), 400
-
-    a = Attendance(
-        session_id = session_id,
-        student_id = student.id,
-        speech_ok  = bool(data.get("speech_ok", False)),
-        face_ok    = bool(data.get("face_ok", False)),
-        geo_ok     = True,
-    )
-    db.session.add(a)
+    """
+    Mark one student (services/marking.py). Send an Idempotency-Key header to
+    make retries safe: a repeated key replays the first response.
+    """
     try:
-        db.session.commit()
-    except IntegrityError:
-        db.session.rollback()
-        return jsonify({"error": "Already marked or invalid"}), 400
-
-    # Update Excel
-    attendance_excel.save_attendance_to_excel(
-        session_id=s.id,
-        class_name=s.class_name,
-        student_name=student.name,
-        student_id=student.student_id
-    )
+        body, status = marking.mark(request.get_json(silent=True) or {}, actor=current_user,
+                                    idempotency_key=request.headers.get("Idempotency-Key"))
+    except marking.MarkError as e:
+        return jsonify(e.body()), e.status
+    return jsonify(body), status
 
-    return jsonify({"ok": True, "id": a.id, "message": "Attendance marked & Excel updated"}), 201
+@api_bp.post("/attendance/bulk")
+@login_required
+def mark_attendance_bulk():
+    """
+    Mark a roster or sync marks queued offline: {"items": [{session_id,
+    student_id, speech_ok, face_ok, lat, lng, marked_at}, ...]}. One
+    transaction; the answer has one result per item, in order.
+    Idempotency-Key works as for single marks.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get("items") if isinstance(data, dict) else data
+    try:
+        body, status = marking.mark_many(items, actor=current_user,
+                                         idempotency_key=request.headers.get("Idempotency-Key"))
+    except marking.MarkError as e:
+        return jsonify(e.body()), e.status
+    return jsonify(body), status
 
 # -----------------------------
 # Attendance Export
 # -----------------------------
 @api_bp.get("/export_attendance")
 def export_attendance():
-    if not os.path.exists(attendance_excel.EXPORT_FILE):
-        return jsonify({"error": "No attendance file found"}), 404
-    return send_file(attendance_excel.EXPORT_FILE, as_attachment=True)
+    """Workbook built from the attendance journal (?group_by=session|class)."""
+    group_by = request.args.get("group_by", "session")
+    if group_by not in attendance_excel.GROUP_BY:
+        return jsonify({"error": f"group_by must be one of {attendance_excel.GROUP_BY}"}), 400
+    path = attendance_excel.export_file(group_by)
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path))
+
+@api_bp.get("/attendance/export")
+@login_required
+def export_attendance_stream():
+    """
+    Stream attendance rows from the DB as ?format=csv|xlsx|parquet (&gzip=1).
+    Filters: session_id, class_name, student_id, from, to (ISO or ms, UTC;
+    `to` exclusive). Teachers get their own sessions, students their own rows.
+    """
+    fmt = request.args.get("format", "csv")
+    gzip = request.args.get("gzip", 0, type=int) == 1
+    filters = {
+        "session_id": request.args.get("session_id", type=int),
+        "class_name": request.args.get("class_name") or None,
+        "student_id": request.args.get("student_id") or None,
+    }
+    # scope by user row id: a student account with an empty student_id must not match everything
+    if current_user.role == "teacher":
+        scope = {"teacher_id": current_user.id}
+    else:
+        scope = {"student_user_id": current_user.id}
+        filters["student_id"] = current_user.student_id or None
+
+    dates = {}
+    for arg, key in (("from", "date_from"), ("to", "date_to")):
+        raw = request.args.get(arg)
+        if raw:
+            try:
+                dates[key] = parse_ts(int(raw) if raw.isdigit() else raw)
+            except (ValueError, OverflowError, OSError):     # out-of-range ms too
+                return jsonify({"error": f"bad {arg} (use ISO or ms)"}), 400
+
+    try:
+        chunks = attendance_export.stream(fmt, attendance_export.build_query(**filters, **scope, **dates), gzip=gzip)
+    except attendance_export.ExportError as e:
+        return jsonify({"error": str(e)}), 400
+
+    name = attendance_export.filename(fmt, gzip, **filters,
+                                      **{k: request.args.get(k) for k in ("from", "to")})
+    mimetype = "application/gzip" if gzip else attendance_export.FORMATS[fmt][0]
+    metrics.incr(f"export.{fmt}")
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="{name}"'})
 
 # -----------------------------
-# Utils
+# Metrics
+# -----------------------------
+@api_bp.get("/metrics")
+def get_metrics():
+    """Per-worker counters and latency percentiles."""
+    return jsonify(metrics.snapshot())
+
+# -----------------------------
+# Background jobs (face / speech)
 # -----------------------------
-def haversine_m(lat1, lon1, lat2, lon2):
-    R = 6371000.0
-    to_rad = math.pi / 180.0
-    dlat = (lat2 - lat1) * to_rad
-    dlon = (lon2 - lon1) * to_rad
-    a = math.sin(dlat/2)**2 + math.cos(lat1*to_rad) * math.cos(lat2*to_rad) * math.sin(dlon/2)**2
-    return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+@api_bp.get("/jobs/<job_id>")
+def job_status(job_id):
+    """State of a biometric job; ?wait=<sec> long-polls until it finishes (capped)."""
+    owner = current_user.get_id() if current_user.is_authenticated else None
+    job = jobs.manager.wait(job_id, owner, timeout=request.args.get("wait", 0.0, type=float))
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
 
+# -----------------------------
+# Health
+# -----------------------------
+@api_bp.get("/health")
+def health():
+    """Liveness: the worker answers. Reports model state without loading anything."""
+    return jsonify(model_registry.status())
+
+@api_bp.get("/ready")
+def ready():
+    """Readiness: 503 until this worker's preloaded models are loaded and warm."""
+    st = model_registry.status()
+    return jsonify(st), (200 if st["ready"] else 503)
+
+# -----------------------------
+# Utils
+# -----------------------------
 def get_public_ip():
     r = requests.get("http://api.ipify.org", timeout=2)
     r.raise_for_status()
@@ -0,0 +1,238 @@
+"""
+Face / speech routes, in their own blueprint.
+
+The heavy stacks (cv2, dlib/face_recognition, cvzone/mediapipe, librosa,
+sounddevice, torch) are imported inside the handlers, so a worker only
+pays for them on its first biometric request, or at startup when
+MODEL_PRELOAD asks for it. With APP_MODE=web the blueprint is not
+registered at all and dashboard / API nodes never load them; route these
+paths to biometric nodes instead.
+"""
+import re
+from flask import Blueprint, request, jsonify, url_for
+from flask_login import login_required, current_user
+from .models import User
+from .services import jobs
+
+bio_bp = Blueprint("bio", __name__)
+
+# ------------------ Verification APIs ------------------ #
+# Face / speech work runs as a background job (services/jobs.py): these
+# routes validate the upload, queue it and answer 202 with the job's status
+# URL, which the client polls (static/js/jobs.js) for the result.
+def _submit(name, fn, *args, **kwargs):
+    """Queue a biometric job; 202 with its status URL, or 503 when the pool is full."""
+    try:
+        job = jobs.manager.submit(name, fn, *args, **kwargs)
+    except jobs.JobQueueFull as e:
+        return jsonify({"ok": False, "message": str(e)}), 503, {"Retry-After": "2"}
+    return jsonify({"job_id": job["id"], "state": job["state"], "message": "Queued",
+                    "status_url": url_for("api.job_status", job_id=job["id"])}), 202
+
+def _owner():
+    return current_user.get_id() if current_user.is_authenticated else None
+
+# ------------------ Enrollment guard ------------------ #
+# student ids become file names (voice samples, liveness recordings) and the
+# face store's 64-byte key; anything else cannot be a student id
+_STUDENT_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+def _enroll_denied(student_id, is_enrolled):
+    """
+    Error response if this request may not (re-)enroll `student_id`, else None.
+    The first enrollment happens on the registration page, before the account
+    exists. Once the id has a template (`is_enrolled(student_id)`) or an
+    account, only that student (logged in) or a teacher may replace it.
+    """
+    if not student_id:
+        return jsonify({"ok": False, "message": "No student ID"}), 400
+    if not _STUDENT_ID.fullmatch(student_id):
+        return jsonify({"ok": False, "message": "Unknown student ID"}), 400
+    if current_user.is_authenticated and (current_user.role == "teacher"
+                                          or current_user.student_id == student_id):
+        return None
+    if is_enrolled(student_id) or User.query.filter_by(student_id=student_id).first() is not None:
+        return jsonify({"ok": False, "message": "This student is already enrolled; "
+                                                "log in as the student or a teacher to re-enroll."}), 403
+    return None
+
+def _face_enrolled(student_id) -> bool:
+    from .services.authentication.face_verification import face_recog
+    face_recog.face_index.sync()
+    return student_id in face_recog.face_index
+
+@bio_bp.get("/face_register_blink")
+def face_register_blink():
+    """Enroll using the server's own camera (local/dev setups only)"""
+    from .services.authentication.face_verification import face_recg_blink
+    student_id = request.args.get("id")
+    denied = _enroll_denied(student_id, _face_enrolled)
+    if denied:
+        return denied
+    return _submit("face_register", face_recg_blink.register_face_with_blink, student_id, cpu=False,
+                   owner=_owner())
+
+@bio_bp.post("/face_register_blink")
+def face_register_blink_frames():
+    """Enroll from a burst of browser frames (multipart `frames`)"""
+    from .services.authentication.face_verification import face_recg_blink, frames
+    student_id = request.args.get("id") or request.form.get("id")
+    denied = _enroll_denied(student_id, _face_enrolled)
+    if denied:
+        return denied
+    limits = frames.frame_limits(request.form)
+    try:
+        data = frames.read_frames(request.files.getlist("frames"), **limits)
+    except frames.FrameError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    return _submit("face_register", face_recg_blink.register_face_with_blink_frames, student_id, data,
+                   owner=_owner(), **limits)
+
+@bio_bp.get("/speech_phrase")
+def speech_phrase():
+    """Generate phrase for speech *enrollment*"""
+    from .services.authentication.speech_verification import register_voice
+    phrase = register_voice.get_random_phrase()
+    return jsonify({"phrase": phrase})
+
+def _uploaded_audio():
+    """Decoded multipart `audio` upload, or None to record on the server microphone."""
+    from .services.authentication.speech_verification import audio
+    if "audio" not in request.files:
+        return None
+    return audio.read_upload(request.files["audio"])
+
+@bio_bp.post("/speech_register")
+def speech_register():
+    """Enroll student speech (browser upload in `audio`, else the server microphone)"""
+    from .services.authentication.speech_verification import audio, register_voice
+    student_id = request.args.get("id") or request.form.get("id")
+    phrase = request.args.get("phrase") or request.form.get("phrase")
+
+    denied = _enroll_denied(student_id, lambda sid: sid in register_voice.templates)
+    if denied:
+        return denied
+    if not phrase:
+        return jsonify({"ok": False, "message": "Missing phrase"})
+
+    try:
+        y = _uploaded_audio()
+    except audio.AudioError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    append = bool(request.values.get("append", 0, type=int))   # extra sample instead of re-registering
+    return _submit("speech_register", register_voice.register_student, student_id, phrase,
+                   y=y, append=append, owner=_owner(), cpu=y is not None)
+
+@bio_bp.get("/face_verif")
+@login_required
+def face_verif():
+    """1:1 - verify the logged-in student's face against their own gallery"""
+    from .services.authentication.face_verification import face_recog
+    return _submit("face_verify", face_recog.verify_face, current_user.student_id, threshold=0.5,
+                   owner=_owner(), cpu=False)
+
+@bio_bp.post("/face_verif")
+@login_required
+def face_verif_frames():
+    """1:1 - verify a burst of browser frames (multipart `frames`)"""
+    from .services.authentication.face_verification import frames
+    limits = frames.frame_limits(request.form)
+    try:
+        data = frames.read_frames(request.files.getlist("frames"), **limits)
+    except frames.FrameError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    return _submit("face_verify", frames.verify_frames, current_user.student_id, data,
+                   threshold=0.5, owner=_owner(), **limits)
+
+@bio_bp.get("/face_identify")
+@login_required
+def face_identify():
+    """1:N - identify whoever is in front of the camera (metered separately)"""
+    from .services.authentication.face_verification import face_recog
+    result = face_recog.identify_face(threshold=0.5)
+    return jsonify(result)
+
+@bio_bp.post("/face_identify")
+@login_required
+def face_identify_frames():
+    """1:N over a burst of browser frames"""
+    from .services.authentication.face_verification import frames
+    try:
+        result = frames.identify_frames(request.files.getlist("frames"),
+                                        threshold=0.5, **frames.frame_limits(request.form))
+    except frames.FrameError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    return jsonify(result)
+
+# ------------------ Kiosk (shared check-in terminal) ------------------ #
+def _not_teacher():
+    """403 unless a teacher is logged in (the terminal camera is theirs to run)."""
+    if current_user.role != "teacher":
+        return jsonify({"ok": False, "message": "Only teachers can start or stop the kiosk."}), 403
+    return None
+
+@bio_bp.post("/kiosk/start")
+@login_required
+def kiosk_start():
+    """Open the terminal camera once and keep it streaming into the frame buffer"""
+    denied = _not_teacher()
+    if denied:
+        return denied
+    from .services.authentication.face_verification import kiosk
+    camera_index = request.args.get("camera", 0, type=int)
+    return jsonify(kiosk.start_kiosk(camera_index).stats())
+
+@bio_bp.post("/kiosk/stop")
+@login_required
+def kiosk_stop():
+    denied = _not_teacher()
+    if denied:
+        return denied
+    from .services.authentication.face_verification import kiosk
+    kiosk.stop_kiosk()
+    return jsonify({"ok": True})
+
+@bio_bp.post("/kiosk/checkin")
+@login_required
+def kiosk_checkin():
+    """Identify the next student at the door from buffered frames"""
+    from .services.authentication.face_verification import kiosk
+    k = kiosk.get_kiosk()
+    if k is None:
+        return jsonify({"ok": False, "message": "Kiosk is not running."}), 409
+    result = k.check_in(timeout_sec=request.args.get("timeout", 5.0, type=float))
+    return jsonify(result)
+
+@bio_bp.get("/kiosk/stats")
+@login_required
+def kiosk_stats():
+    from .services.authentication.face_verification import kiosk
+    k = kiosk.get_kiosk()
+    return jsonify(k.stats() if k else {"running": False})
+
+@bio_bp.get("/speech_verif_phrase")
+def speech_verif_phrase():
+    """Get phrase for speech *verification*"""
+    from .services.authentication.speech_verification import register_voice
+    phrase = register_voice.get_random_phrase()
+    return jsonify({"phrase": phrase})
+
+@bio_bp.post("/speech_verif")
+def speech_verif():
+    """Verify student's speech (browser upload in `audio`, else a server-microphone recording)"""
+    from .services.authentication.speech_verification import audio, register_voice
+    student_id = request.args.get("id") or (current_user.student_id if current_user.is_authenticated else None)
+    phrase = request.args.get("phrase") or request.form.get("phrase")
+
+    if not student_id:
+        return jsonify({"ok": False, "message": "No student ID"})
+    if not phrase:
+        return jsonify({"ok": False, "message": "Missing phrase"})
+
+    try:
+        y = _uploaded_audio()
+    except audio.AudioError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    # np.bool_ / numpy scalars in the result are converted when the job stores it
+    return _submit("speech_verify", register_voice.verify_student, student_id, phrase, y=y,
+                   owner=_owner(), cpu=y is not None)
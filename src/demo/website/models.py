@@ -79,3 +79,44 @@ class Attendance(db.Model):
     __table_args__ = (
         db.UniqueConstraint("session_id", "student_id", name="uq_mark_once"),
     )
+
+# ---------- Outbox (side effects of a mark, see services/outbox.py) ----------
+class Outbox(db.Model):
+    __tablename__ = "outbox"
+    id = db.Column(db.Integer, primary_key=True)
+
+    topic = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False)          # JSON
+
+    state = db.Column(db.String(16), nullable=False, default="pending")
+    # "pending" -> "sent", or "dead" after too many failed attempts
+    done_sinks = db.Column(db.Text, nullable=False, default="")   # comma list, so retries skip them
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+    claimed_by = db.Column(db.String(32))
+    claimed_until = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_outbox_due", "state", "next_attempt_at"),
+    )
+
+# ---------- per-session rollup, maintained by the outbox "rollup" sink ----------
+class AttendanceRollup(db.Model):
+    __tablename__ = "attendance_rollups"
+    session_id = db.Column(db.Integer, db.ForeignKey("sessions.id", ondelete="CASCADE"), primary_key=True)
+    marks = db.Column(db.Integer, nullable=False, default=0)
+    last_marked_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+# ---------- client idempotency keys for POST /api/attendance (services/marking.py) ----------
+class IdempotencyKey(db.Model):
+    __tablename__ = "idempotency_keys"
+    key = db.Column(db.String(255), primary_key=True)      # "<user id>:<client key>"
+    fingerprint = db.Column(db.String(255), nullable=False)   # what the key was first used for
+    status = db.Column(db.Integer, nullable=False)
+    response = db.Column(db.Text, nullable=False)          # JSON body to replay
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
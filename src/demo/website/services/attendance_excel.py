@@ -1,27 +1,243 @@
+"""
+Attendance export: an append-only journal plus a workbook built from it.
+
+Every successful mark appends one JSON line to attendance.jsonl with a
+single O_APPEND write, so the request path costs the same on the first
+mark of the semester as on the last, and concurrent workers never
+overwrite each other. fsync is batched: a background thread syncs the
+journal at most every JOURNAL_FSYNC_SEC (0 = fsync on every mark).
+
+attendance.xlsx is derived data. `export_file()` rebuilds it when the
+journal is newer, streaming the journal through an openpyxl write-only
+workbook with one sheet per session (or per class), so memory stays flat
+however long the journal gets. It can also be built from cron:
+
+    python attendance_excel.py build [--group-by class]
+
+When there is no journal yet, the rows of an existing attendance.xlsx
+(the old single-sheet export, or a workbook built from a lost journal) are
+copied into it once.
+"""
+import argparse
+import json
 import os
-import pandas as pd
+import re
+import threading
+import time
+from datetime import datetime
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../.."))
 EXPORT_DIR = os.path.join(BASE_DIR, "attendance_exports")
 os.makedirs(EXPORT_DIR, exist_ok=True)
 
 EXPORT_FILE = os.path.join(EXPORT_DIR, "attendance.xlsx")
+JOURNAL_FILE = os.path.join(EXPORT_DIR, "attendance.jsonl")
+JOURNAL_FSYNC_SEC = float(os.getenv("ATTENDANCE_JOURNAL_FSYNC_SEC", "1.0"))
+
+COLUMNS = ["Session ID", "Class Name", "Student ID", "Student Name", "Marked At"]
+GROUP_BY = ("session", "class")
+
+
+class Journal:
+    """Append-only JSONL file shared by every worker."""
+
+    def __init__(self, path: str = JOURNAL_FILE, fsync_sec: float = JOURNAL_FSYNC_SEC):
+        self.path = path
+        self.fsync_sec = fsync_sec
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+        self._dirty = threading.Event()
+        self._flusher = None
+
+    def _open(self):
+        if self._fd is None or self._pid != os.getpid():      # fds are not shared across a fork
+            if not os.path.exists(self.path):
+                _seed_from_legacy(self.path)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+            if self.fsync_sec > 0:
+                self._flusher = threading.Thread(target=self._flush_loop, name="attendance-journal",
+                                                 daemon=True)
+                self._flusher.start()
+        return self._fd
+
+    def append(self, record: dict):
+        """One line, one write(); the record is visible to readers at once."""
+        self.append_many([record])
 
-def save_attendance_to_excel(session_id, class_name, student_name, student_id):
-    """Append or create attendance Excel file"""
-    record = {
-        "Session ID": session_id,
-        "Class Name": class_name,
-        "Student ID": student_id,
-        "Student Name": student_name,
-        "Marked At": pd.Timestamp.now()
+    def append_many(self, records: list):
+        """Several lines with a single write()."""
+        if not records:
+            return
+        data = "".join(json.dumps(r, default=str, separators=(",", ":")) + "\n" for r in records).encode("utf-8")
+        with self._lock:
+            fd = self._open()
+            os.write(fd, data)
+            if self.fsync_sec > 0:
+                self._dirty.set()
+            else:
+                os.fsync(fd)
+
+    def flush(self):
+        with self._lock:
+            if self._fd is not None and self._pid == os.getpid():
+                self._dirty.clear()
+                os.fsync(self._fd)
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            self._dirty.wait()
+            time.sleep(self.fsync_sec)      # marks arriving meanwhile share this fsync
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def __iter__(self):
+        """Records in append order; a torn last line (crash mid-write) is skipped."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+journal = Journal()
+
+
+def _seed_from_legacy(path: str):
+    """Create the journal from the rows of an existing attendance.xlsx (every sheet)."""
+    if not os.path.exists(EXPORT_FILE):
+        return
+    from openpyxl import load_workbook
+    try:
+        wb = load_workbook(EXPORT_FILE, read_only=True)
+    except Exception:
+        return
+    tmp = f"{path}.{os.getpid()}.seed"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            for ws in wb.worksheets:
+                rows = ws.iter_rows(values_only=True)
+                if list(next(rows, [])) != COLUMNS:
+                    continue
+                for row in rows:
+                    rec = dict(zip(("session_id", "class_name", "student_id", "student_name", "marked_at"), row))
+                    if isinstance(rec["marked_at"], datetime):
+                        rec["marked_at"] = rec["marked_at"].isoformat()
+                    f.write(json.dumps(rec, default=str) + "\n")
+        try:
+            os.link(tmp, path)          # create-if-absent: another worker may have won
+        except FileExistsError:
+            pass
+    finally:
+        wb.close()
+        os.remove(tmp)
+
+
+def _record(session_id, class_name, student_name, student_id, marked_at=None):
+    return {
+        "session_id": session_id,
+        "class_name": class_name,
+        "student_id": student_id,
+        "student_name": student_name,
+        "marked_at": (marked_at or datetime.now()).isoformat(),
     }
 
-    # If file exists → append, else create
-    if os.path.exists(EXPORT_FILE):
-        df = pd.read_excel(EXPORT_FILE)
-        df = pd.concat([df, pd.DataFrame([record])], ignore_index=True)
-    else:
-        df = pd.DataFrame([record])
 
-    df.to_excel(EXPORT_FILE, index=False)
+def save_attendance_to_excel(session_id, class_name, student_name, student_id, marked_at=None):
+    """Record a mark for the export (O(1): one journal append)."""
+    journal.append(_record(session_id, class_name, student_name, student_id, marked_at))
+
+
+def save_many(marks):
+    """Record a batch of marks (dicts of the arguments above) with one journal write."""
+    journal.append_many([_record(**m) for m in marks])
+
+
+# ---------- workbook ----------
+_SHEET_BAD = re.compile(r"[\[\]:*?/\\]")
+
+
+def _sheet_title(key, class_name, group_by, used):
+    title = f"S{key} {class_name or ''}" if group_by == "session" else str(key or "No class")
+    title = _SHEET_BAD.sub("_", title).strip()[:31] or "Sheet"
+    base, n = title, 2
+    while title.lower() in used:
+        suffix = f" ({n})"
+        title, n = base[:31 - len(suffix)] + suffix, n + 1
+    used.add(title.lower())
+    return title
+
+
+def _parse_time(v):
+    try:
+        return datetime.fromisoformat(v) if isinstance(v, str) else v
+    except ValueError:
+        return v
+
+
+def build_workbook(path: str = EXPORT_FILE, group_by: str = "session") -> int:
+    """
+    Stream the journal into `path`, one sheet per session (or class).
+    Returns the number of rows written. The file is replaced atomically.
+    """
+    if group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of {GROUP_BY}")
+    from openpyxl import Workbook
+
+    journal.flush()
+    wb = Workbook(write_only=True)
+    sheets, used, n = {}, set(), 0
+    for rec in journal:
+        key = rec.get("session_id") if group_by == "session" else rec.get("class_name")
+        ws = sheets.get(key)
+        if ws is None:
+            ws = sheets[key] = wb.create_sheet(_sheet_title(key, rec.get("class_name"), group_by, used))
+            ws.append(COLUMNS)
+        ws.append([rec.get("session_id"), rec.get("class_name"), rec.get("student_id"),
+                   rec.get("student_name"), _parse_time(rec.get("marked_at"))])
+        n += 1
+    if not sheets:
+        wb.create_sheet("Attendance").append(COLUMNS)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    wb.save(tmp)
+    os.replace(tmp, path)
+    return n
+
+
+_build_lock = threading.Lock()
+
+
+def export_file(group_by: str = "session") -> str:
+    """Path of an up-to-date workbook, rebuilding it only if the journal changed since."""
+    path = EXPORT_FILE if group_by == "session" else os.path.join(EXPORT_DIR, f"attendance_by_{group_by}.xlsx")
+    with _build_lock:
+        if not os.path.exists(JOURNAL_FILE):
+            _seed_from_legacy(JOURNAL_FILE)
+        if (os.path.exists(path) and os.path.exists(JOURNAL_FILE)
+                and os.stat(JOURNAL_FILE).st_mtime_ns < os.stat(path).st_mtime_ns):
+            return path
+        build_workbook(path, group_by)
+        return path
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Build the attendance workbook from the journal.")
+    ap.add_argument("cmd", choices=["build"])
+    ap.add_argument("--group-by", default="session", choices=GROUP_BY)
+    ap.add_argument("--out", default=EXPORT_FILE)
+    args = ap.parse_args(argv)
+    t0 = time.perf_counter()
+    n = build_workbook(args.out, args.group_by)
+    print(f"Wrote {n} rows to {args.out} in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Attendance export streamed straight from the database.
+
+One Attendance ⨝ Session ⨝ User (student) ⨝ User (teacher) query, run with
+yield_per so rows arrive in EXPORT_CHUNK-row partitions and only one
+partition is in memory at a time. Each partition is encoded and handed to
+the response as soon as it is fetched:
+
+    csv       first bytes leave after the first partition
+    parquet   one row group per partition (needs pyarrow)
+    xlsx      openpyxl write-only workbook spooled to a temp file, then
+              streamed (the zip directory is only known at the end)
+
+gzip=True wraps any of them in a gzip stream, compressed chunk by chunk.
+The export reads the DB, not the attendance journal, so it always matches
+what was committed.
+"""
+import csv
+import io
+import os
+import re
+import tempfile
+import zlib
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from ..extensions import db
+from ..models import Attendance, Session, User
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:          # optional: only needed for format=parquet
+    pa = pq = None
+
+EXPORT_CHUNK = int(os.getenv("ATTENDANCE_EXPORT_CHUNK", "5000"))
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+COLUMNS = ["attendance_id", "session_id", "class_name", "teacher_id", "teacher_name",
+           "student_id", "student_name", "marked_at", "speech_ok", "face_ok", "geo_ok"]
+
+
+class ExportError(ValueError):
+    """Bad export request (unknown format, missing optional dependency)."""
+
+
+def build_query(session_id=None, class_name=None, teacher_id=None, student_id=None,
+                student_user_id=None, date_from: datetime = None, date_to: datetime = None):
+    """
+    The export select; dates are UTC and filter on marked_at (from inclusive,
+    to exclusive). student_id is the roll number, student_user_id the users.id.
+    """
+    student = aliased(User)
+    teacher = aliased(User)
+    stmt = (select(Attendance.id, Session.id, Session.class_name, teacher.id, teacher.name,
+                   student.student_id, student.name, Attendance.marked_at,
+                   Attendance.speech_ok, Attendance.face_ok, Attendance.geo_ok)
+            .join(Session, Attendance.session_id == Session.id)
+            .join(student, Attendance.student_id == student.id)
+            .join(teacher, Session.teacher_id == teacher.id)
+            .order_by(Attendance.id))
+    if session_id is not None:
+        stmt = stmt.where(Session.id == session_id)
+    if class_name:
+        stmt = stmt.where(Session.class_name == class_name)
+    if teacher_id is not None:
+        stmt = stmt.where(Session.teacher_id == teacher_id)
+    if student_id:
+        stmt = stmt.where(student.student_id == student_id)
+    if student_user_id is not None:
+        stmt = stmt.where(Attendance.student_id == student_user_id)
+    # marked_at is stored as naive UTC
+    if date_from is not None:
+        stmt = stmt.where(Attendance.marked_at >= date_from.replace(tzinfo=None))
+    if date_to is not None:
+        stmt = stmt.where(Attendance.marked_at < date_to.replace(tzinfo=None))
+    return stmt
+
+
+def partitions(stmt, chunk: int = EXPORT_CHUNK):
+    """Lists of row tuples, `chunk` at a time, never the whole result."""
+    result = db.session.execute(stmt.execution_options(yield_per=chunk))
+    try:
+        for part in result.partitions():
+            yield part
+    finally:
+        result.close()
+
+
+def _iso(v):
+    return v.isoformat() if isinstance(v, datetime) else v
+
+
+# ---------- encoders: partitions -> bytes chunks ----------
+def _csv(parts):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(COLUMNS)
+    for part in parts:
+        w.writerows([r[:7] + (_iso(r[7]),) + tuple(r[8:]) for r in part])
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink whose bytes are taken out after every row group."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def take(self) -> bytes:
+        out, self.chunks = b"".join(self.chunks), []
+        return out
+
+
+def _parquet(parts):
+    if pq is None:
+        raise ExportError("Parquet export needs pyarrow (pip install pyarrow).")
+    schema = pa.schema([("attendance_id", pa.int64()), ("session_id", pa.int64()), ("class_name", pa.string()),
+                        ("teacher_id", pa.int64()), ("teacher_name", pa.string()),
+                        ("student_id", pa.string()), ("student_name", pa.string()),
+                        ("marked_at", pa.timestamp("us")), ("speech_ok", pa.bool_()),
+                        ("face_ok", pa.bool_()), ("geo_ok", pa.bool_())])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for part in parts:
+            cols = list(zip(*part))
+            writer.write_table(pa.table(dict(zip(COLUMNS, cols)), schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def _xlsx(parts):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Attendance")
+    ws.append(COLUMNS)
+    for part in parts:
+        for r in part:
+            ws.append(list(r))
+    with tempfile.TemporaryFile() as f:
+        wb.save(f)
+        f.seek(0)
+        while True:
+            block = f.read(256 * 1024)
+            if not block:
+                break
+            yield block
+
+
+ENCODERS = {"csv": _csv, "xlsx": _xlsx, "parquet": _parquet}
+
+
+def gzipped(chunks, level: int = 6):
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)      # wbits 31: gzip container
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def stream(fmt: str, stmt, gzip: bool = False, chunk: int = EXPORT_CHUNK):
+    """Bytes chunks of the export in `fmt`; raises ExportError before any query runs."""
+    if fmt not in ENCODERS:
+        raise ExportError(f"format must be one of {sorted(ENCODERS)}")
+    if fmt == "parquet" and pq is None:
+        raise ExportError("Parquet export needs pyarrow (pip install pyarrow).")
+    out = ENCODERS[fmt](partitions(stmt, chunk))
+    return gzipped(out) if gzip else out
+
+
+def filename(fmt: str, gzip: bool = False, **filters) -> str:
+    parts = ["attendance"] + [f"{k}-{v}" for k, v in filters.items() if v not in (None, "")]
+    name = re.sub(r"[^A-Za-z0-9._-]+", "-", "_".join(parts))
+    return f"{name}.{FORMATS[fmt][1]}" + (".gz" if gzip else "")
@@ -0,0 +1,156 @@
+"""
+Batch face enrollment from ID-card photos, no webcam needed.
+
+Input is either a directory laid out as
+    photos/<student_id>/*.jpg      (several photos per student), or
+    photos/<student_id>.jpg        (one photo per student)
+or a CSV with `student_id,path` columns (paths relative to the CSV).
+
+Photos are encoded in a process pool. A photo is rejected unless exactly one
+face is found. Accepted encodings go to the face store in bulk, one
+append per chunk. Every processed photo is logged to a JSONL manifest after
+its chunk is stored, so an interrupted run picks up where it left off.
+
+Usage:
+    python batch_enroll.py photos/ [--workers 8] [--chunk 256] [--model hog]
+    python batch_enroll.py intake.csv --manifest intake.manifest.jsonl
+"""
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import face_recognition
+from face_store import FaceStore, STORE_DIR
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+# ---------- input discovery ----------
+def discover(source: str):
+    """Yield (student_id, image_path) pairs from a directory or CSV."""
+    if os.path.isfile(source) and source.lower().endswith(".csv"):
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                sid, path = row["student_id"].strip(), row["path"].strip()
+                if sid and path:
+                    yield sid, path if os.path.isabs(path) else os.path.join(base, path)
+        return
+
+    for entry in sorted(os.listdir(source)):
+        full = os.path.join(source, entry)
+        if os.path.isdir(full):
+            for file in sorted(os.listdir(full)):
+                if os.path.splitext(file)[1].lower() in IMAGE_EXTS:
+                    yield entry, os.path.join(full, file)
+        elif os.path.splitext(entry)[1].lower() in IMAGE_EXTS:
+            yield os.path.splitext(entry)[0], full
+
+
+# ---------- worker (runs in the pool) ----------
+def encode_photo(job):
+    """(student_id, path, model, max_side, jitters) -> result dict (encoding as list or None)."""
+    student_id, path, model, max_side, jitters = job
+    out = {"student_id": student_id, "path": path, "encoding": None}
+    try:
+        img = face_recognition.load_image_file(path)
+        h, w = img.shape[:2]
+        if max(h, w) > max_side:
+            # a resized copy, not a strided view: dlib only takes contiguous arrays
+            scale = max_side / max(h, w)
+            img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        boxes = face_recognition.face_locations(img, model=model)
+        if len(boxes) != 1:
+            out.update(status="no_face" if not boxes else "multiple_faces", faces=len(boxes))
+            return out
+        encs = face_recognition.face_encodings(img, boxes, num_jitters=jitters)
+        if not encs:
+            out["status"] = "encode_failed"
+            return out
+        out.update(status="ok", encoding=encs[0].tolist())
+    except Exception as e:
+        out.update(status="error", message=str(e))
+    return out
+
+
+# ---------- manifest ----------
+def load_manifest(path: str) -> set:
+    done = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    done.add((entry["student_id"], entry["path"]))
+                except (ValueError, KeyError):
+                    pass  # torn last line from a crash
+    return done
+
+
+def _flush(store: FaceStore, results, manifest):
+    ok = [r for r in results if r["status"] == "ok"]
+    if ok:
+        store.append_many([r["student_id"] for r in ok], [r["encoding"] for r in ok])
+    for r in results:
+        r = {k: v for k, v in r.items() if k != "encoding"}
+        manifest.write(json.dumps(r) + "\n")
+    manifest.flush()
+    os.fsync(manifest.fileno())
+    return len(ok)
+
+
+# ---------- driver ----------
+def enroll(source: str, store: FaceStore = None, manifest_path: str = None, workers: int = None,
+           chunk: int = 256, model: str = "hog", max_side: int = 1024, jitters: int = 1,
+           log=print) -> dict:
+    if store is None:
+        store = FaceStore()
+    manifest_path = manifest_path or os.path.join(store.root, "enroll_manifest.jsonl")
+    done = load_manifest(manifest_path)
+    photos = list(discover(source))
+    jobs = [(sid, path, model, max_side, jitters) for sid, path in photos if (sid, path) not in done]
+
+    # only photos of this input count as skipped, not the whole manifest
+    totals = {"ok": 0, "rejected": 0, "skipped": len(photos) - len(jobs), "seconds": 0.0}
+    t0 = time.time()
+    log(f"{len(jobs)} photos to process ({totals['skipped']} already in manifest)")
+
+    with open(manifest_path, "a", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for result in pool.map(encode_photo, jobs, chunksize=8):
+            pending.append(result)
+            if result["status"] != "ok":
+                totals["rejected"] += 1
+                log(f"[Rejected] {result['path']}: {result['status']}")
+            if len(pending) >= chunk:
+                totals["ok"] += _flush(store, pending, manifest)
+                pending = []
+                log(f"[Stored] {totals['ok']} embeddings so far ({time.time() - t0:.1f}s)")
+        if pending:
+            totals["ok"] += _flush(store, pending, manifest)
+
+    totals["seconds"] = round(time.time() - t0, 2)
+    return totals
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("source", help="photo directory or CSV (student_id,path)")
+    ap.add_argument("--store-dir", default=STORE_DIR)
+    ap.add_argument("--manifest", default=None, help="progress manifest (default: <store>/enroll_manifest.jsonl)")
+    ap.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    ap.add_argument("--chunk", type=int, default=256, help="photos per bulk store write")
+    ap.add_argument("--model", choices=["hog", "cnn"], default="hog")
+    ap.add_argument("--max-side", type=int, default=1024)
+    ap.add_argument("--jitters", type=int, default=1)
+    args = ap.parse_args()
+
+    out = enroll(args.source, FaceStore(args.store_dir), args.manifest, args.workers,
+                 args.chunk, args.model, args.max_side, args.jitters)
+    print(f"Enrolled {out['ok']} photos, rejected {out['rejected']}, "
+          f"skipped {out['skipped']} already done, in {out['seconds']}s")
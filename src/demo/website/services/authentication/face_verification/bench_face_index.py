@@ -0,0 +1,94 @@
+"""
+Benchmark: FaceIndex vs. the old list-of-arrays lookup.
+
+Usage:  python bench_face_index.py [--sizes 1000 10000 100000] [--queries 200]
+                                  [--quantize float16 int8] [--rerank 16]
+
+The "legacy" path mirrors what verify_face used to do per call:
+np.asarray(list) inside face_recognition.face_distance, then argmin.
+
+Each --quantize mode is compared with the float32 index on the same queries:
+top-1 agreement, accept/reject agreement at THRESHOLD, largest distance
+difference and bytes scanned per search.
+"""
+import argparse
+import time
+import numpy as np
+from face_index import FaceIndex
+
+SAMPLES_PER_STUDENT = 5
+THRESHOLD = 0.5
+
+
+def _legacy_nearest(known_encodings, known_names, enc):
+    dists = np.linalg.norm(np.asarray(known_encodings) - enc, axis=1)   # == fr.face_distance
+    j = int(np.argmin(dists))
+    return known_names[j], float(dists[j])
+
+
+def _time_per_query(fn, queries):
+    t0 = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - t0) / len(queries) * 1000.0
+
+
+def run(size: int, n_queries: int, rng, quantize=(), rerank: int = 16):
+    students = max(size // SAMPLES_PER_STUDENT, 1)
+    encs = rng.normal(0.0, 0.1, size=(size, 128))
+    names = [f"s{i % students}" for i in range(size)]
+    queries = encs[rng.integers(0, size, n_queries)] + rng.normal(0.0, 0.01, size=(n_queries, 128))
+
+    known_encodings = list(encs)   # one array per .npy file, as loaded today
+
+    t0 = time.perf_counter()
+    index = FaceIndex.from_arrays(encs, names)
+    build_ms = (time.perf_counter() - t0) * 1000.0
+    centroid_index = FaceIndex.from_arrays(encs, names, use_centroids=True)
+
+    legacy_ms = _time_per_query(lambda q: _legacy_nearest(known_encodings, names, q), queries)
+    index_ms = _time_per_query(index.nearest, queries)
+    top5_ms = _time_per_query(lambda q: index.search(q, k=5), queries)
+    centroid_ms = _time_per_query(centroid_index.nearest, queries)
+
+    agree = sum(_legacy_nearest(known_encodings, names, q)[0] == index.nearest(q)[0] for q in queries)
+
+    t0 = time.perf_counter()
+    index.replace("s0", encs[:SAMPLES_PER_STUDENT])
+    replace_ms = (time.perf_counter() - t0) * 1000.0
+
+    print(f"{size:>7} vectors | build {build_ms:8.1f} ms | "
+          f"legacy {legacy_ms:7.3f} ms/q | index {index_ms:7.3f} ms/q "
+          f"({legacy_ms / index_ms:5.1f}x) | top-5 {top5_ms:7.3f} ms/q | "
+          f"centroids {centroid_ms:7.3f} ms/q | replace {replace_ms:6.3f} ms | "
+          f"agree {agree}/{n_queries} | {index.nbytes / 2**20:6.1f} MiB")
+
+    # impostor-ish probes too, so decisions near the threshold get exercised
+    probes = np.concatenate([queries, rng.normal(0.0, 0.1, size=(n_queries, 128))])
+    index = FaceIndex.from_arrays(encs, names)     # undo the replace above
+    exact = [index.nearest(q) for q in probes]
+    for mode in quantize:
+        qindex = FaceIndex.from_arrays(encs, names, quantize=mode, rerank=rerank)
+        q_ms = _time_per_query(qindex.nearest, queries)
+        approx = [qindex.nearest(q) for q in probes]
+        same = sum(a[0] == e[0] for a, e in zip(approx, exact))
+        decisions = sum((a[1] <= THRESHOLD) == (e[1] <= THRESHOLD) for a, e in zip(approx, exact))
+        delta = max(abs(a[1] - e[1]) for a, e in zip(approx, exact))
+        print(f"{'':>7} {mode:>7} | {q_ms:7.3f} ms/q | top-1 {same}/{len(probes)} | "
+              f"decisions {decisions}/{len(probes)} | max dist delta {delta:.2e} | "
+              f"scan {qindex.scan_nbytes / 2**20:6.1f} MiB vs {index.scan_nbytes / 2**20:6.1f} MiB "
+              f"({index.scan_nbytes / qindex.scan_nbytes:.1f}x less)")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--quantize", nargs="*", default=["float16", "int8"], choices=["float16", "int8"])
+    ap.add_argument("--rerank", type=int, default=16)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for size in args.sizes:
+        run(size, args.queries, rng, args.quantize, args.rerank)
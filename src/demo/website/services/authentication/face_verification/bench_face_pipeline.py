@@ -0,0 +1,170 @@
+"""
+Accuracy / latency benchmark for the face pipeline over a local labeled image set.
+
+Dataset layout (one folder per person, any number of images):
+    faces/<person>/*.jpg
+
+Per person, the first --enroll images build the gallery; the rest are probes.
+Each probe is scored 1:1 against its own gallery (genuine) and against every
+other person's gallery (impostor) by the raw min euclidean distance to
+that gallery's samples, under one global threshold. This is the pipeline's
+baseline, not face_recog.match_student's decision: the per-student
+threshold from _profile (ADAPT_SCALE) and the EARLY_ACCEPT centroid
+shortcut are not applied, so accept rates in production can differ.
+
+Every combination of --models / --jitters / --landmarks / --scales is run and
+reported with FAR/FRR at each --thresholds value, the EER, detection and
+encoding latency percentiles and throughput. --out writes the same numbers
+as JSON so runs can be diffed across releases.
+
+Run from src/:
+    python -m demo.website.services.authentication.face_verification.bench_face_pipeline \
+        faces/ --models hog cnn --jitters 1 --landmarks small large --out bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import time
+import cv2
+import numpy as np
+from .face_index import FaceIndex
+from .pipeline import FramePipeline
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def load_dataset(root: str, enroll: int):
+    """{person: (enroll_paths, probe_paths)} for people with at least one probe."""
+    out = {}
+    for person in sorted(os.listdir(root)):
+        d = os.path.join(root, person)
+        if not os.path.isdir(d):
+            continue
+        files = sorted(os.path.join(d, f) for f in os.listdir(d)
+                       if os.path.splitext(f)[1].lower() in IMAGE_EXTS)
+        if len(files) > enroll:
+            out[person] = (files[:enroll], files[enroll:])
+    return out
+
+
+def percentiles(samples_ms):
+    if not samples_ms:
+        return None
+    a = np.asarray(samples_ms)
+    return {"p50": round(float(np.percentile(a, 50)), 3), "p90": round(float(np.percentile(a, 90)), 3),
+            "p99": round(float(np.percentile(a, 99)), 3), "mean": round(float(a.mean()), 3)}
+
+
+def error_rates(genuine, impostor, thresholds):
+    """FAR/FRR at each threshold plus the EER over a full sweep. Accept means distance <= t."""
+    g, i = np.sort(np.asarray(genuine)), np.sort(np.asarray(impostor))
+    at = {}
+    for t in thresholds:
+        far = float(np.searchsorted(i, t, side="right") / len(i)) if len(i) else None
+        frr = float(1.0 - np.searchsorted(g, t, side="right") / len(g)) if len(g) else None
+        at[str(t)] = {"far": far, "frr": frr}
+
+    eer = eer_t = None
+    if len(g) and len(i):
+        sweep = np.unique(np.concatenate([g, i]))
+        far = np.searchsorted(i, sweep, side="right") / len(i)
+        frr = 1.0 - np.searchsorted(g, sweep, side="right") / len(g)
+        k = int(np.argmin(np.abs(far - frr)))
+        eer, eer_t = float((far[k] + frr[k]) / 2.0), float(sweep[k])
+    return {"at": at, "eer": eer, "eer_threshold": eer_t}
+
+
+def run_config(data, model, jitters, landmarks, scale, thresholds):
+    pipe = FramePipeline(scale=scale, detect_every=1, model=model,
+                         num_jitters=jitters, landmark_model=landmarks)
+    detect_ms, encode_ms = [], []
+    failed = 0
+
+    def encode(path):
+        nonlocal failed
+        img = cv2.imread(path)
+        enc = pipe.process(img) if img is not None else None
+        if "detect" in pipe.last_timings:
+            detect_ms.append(pipe.last_timings["detect"])
+        if "encode" in pipe.last_timings:
+            encode_ms.append(pipe.last_timings["encode"])
+        if enc is None:
+            failed += 1
+        return enc
+
+    t0 = time.perf_counter()
+    index, probes, images = FaceIndex(), [], 0
+    for person, (enroll_paths, probe_paths) in data.items():
+        encs = [e for e in map(encode, enroll_paths) if e is not None]
+        index.add(person, encs)
+        images += len(enroll_paths)
+        for path in probe_paths:
+            probes.append((person, encode(path)))
+            images += 1
+    wall = time.perf_counter() - t0
+
+    genuine, impostor = [], []
+    enrolled = index.students()
+    for person, enc in probes:
+        if enc is None:
+            continue
+        for claimed in enrolled:
+            d = float(index.distances_to(claimed, enc).min())
+            (genuine if claimed == person else impostor).append(d)
+
+    return {
+        "config": {"model": model, "num_jitters": jitters, "landmark_model": landmarks, "detect_scale": scale},
+        "images": images,
+        "failed_to_encode": failed,
+        "people_enrolled": len(enrolled),
+        "genuine_pairs": len(genuine),
+        "impostor_pairs": len(impostor),
+        **error_rates(genuine, impostor, thresholds),
+        "detect_ms": percentiles(detect_ms),
+        "encode_ms": percentiles(encode_ms),
+        "images_per_sec": round(images / wall, 2) if wall else None,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("dataset")
+    ap.add_argument("--enroll", type=int, default=3, help="images per person used for the gallery")
+    ap.add_argument("--models", nargs="+", default=["hog"], choices=["hog", "cnn"])
+    ap.add_argument("--jitters", nargs="+", type=int, default=[1])
+    ap.add_argument("--landmarks", nargs="+", default=["small"], choices=["small", "large"])
+    ap.add_argument("--scales", nargs="+", type=float, default=[1.0, 0.5])
+    ap.add_argument("--thresholds", nargs="+", type=float, default=[0.4, 0.5, 0.6])
+    ap.add_argument("--out", default=None, help="write results as JSON")
+    args = ap.parse_args(argv)
+
+    data = load_dataset(args.dataset, args.enroll)
+    if not data:
+        ap.error("no person folder has more than --enroll images")
+
+    results = []
+    for model in args.models:
+        for jitters in args.jitters:
+            for landmarks in args.landmarks:
+                for scale in args.scales:
+                    r = run_config(data, model, jitters, landmarks, scale, args.thresholds)
+                    results.append(r)
+                    c, at = r["config"], r["at"].get("0.5") or next(iter(r["at"].values()))
+                    eer = f"{r['eer']:.4f}@{r['eer_threshold']:.3f}" if r["eer"] is not None else "n/a"
+                    print(f"{c['model']:>3} jit={c['num_jitters']} lm={c['landmark_model']:<5} "
+                          f"scale={c['detect_scale']:<4} | EER {eer} | FAR {at['far']} FRR {at['frr']} | "
+                          f"detect p50 {(r['detect_ms'] or {}).get('p50')} ms | "
+                          f"encode p50 {(r['encode_ms'] or {}).get('p50')} ms | "
+                          f"{r['images_per_sec']} img/s | failed {r['failed_to_encode']}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"dataset": os.path.abspath(args.dataset), "enroll": args.enroll,
+                       "machine": platform.platform(), "python": platform.python_version(),
+                       "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,150 @@
-def is_blinking(face, detector, ratio_list, counter, threshold=32, cooldown=10):
-    leftUp = face[159]
-    leftDown = face[23]
-    leftLeft = face[130]
-    leftRight = face[243]
-    
-    vertical_len, _ = detector.findDistance(leftUp, leftDown)
-    horizontal_len, _ = detector.findDistance(leftLeft, leftRight)
-
-    if horizontal_len == 0:
-        return False, ratio_list, counter
-
-    ratio = (vertical_len / horizontal_len) * 100
-    ratio_list.append(ratio)
-    if len(ratio_list) > 5:
-        ratio_list.pop(0)
-    ratio_avg = sum(ratio_list) / len(ratio_list)
-
-    blink_detected = False
-    if ratio_avg < threshold and counter == 0:
-        blink_detected = True
-        counter = 1
-    if counter != 0:
-        counter += 1
-        if counter > cooldown:
-            counter = 0
-
-    return blink_detected, ratio_list, counter
\ No newline at end of file
+"""
+Blink-based liveness from MediaPipe face-mesh landmarks.
+
+LivenessDetector keeps its smoothing window in a fixed-size NumPy ring
+buffer and uses the mean aspect ratio of both eyes. The same rule runs
+three ways:
+  - update(face)         one live frame at a time,
+  - score(frames)        a whole (T, 468, 2) landmark array at once,
+  - replay from the CLI  recorded sequences, for tuning without a camera:
+
+    python blink_detection.py replay rec1.npy rec2.npy \
+        --threshold 28 32 36 --cooldown 8 10 [--expect 2]
+
+A recording is a (T, 468, 2) .npy saved by LivenessDetector(record=True).
+"""
+import time
+import numpy as np
+
+# face-mesh indices: (upper lid, lower lid, outer corner, inner corner)
+LEFT_EYE = (159, 23, 130, 243)
+RIGHT_EYE = (386, 253, 359, 463)   # mirror points of LEFT_EYE
+
+
+def eye_ratio(landmarks) -> np.ndarray:
+    """
+    Vertical / horizontal eye opening (x100), averaged over both eyes.
+    Works on one face (468, 2) or a stack (T, 468, 2); frames where both
+    eyes have zero width come back as NaN.
+    """
+    pts = np.asarray(landmarks, dtype=np.float64)
+    eyes = pts[..., LEFT_EYE + RIGHT_EYE, :].reshape(pts.shape[:-2] + (2, 4, 2))
+    vertical = np.linalg.norm(eyes[..., 0, :] - eyes[..., 1, :], axis=-1)
+    horizontal = np.linalg.norm(eyes[..., 2, :] - eyes[..., 3, :], axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = np.where(horizontal > 0, vertical / horizontal * 100.0, np.nan)
+    valid = ~np.isnan(ratios)
+    count = valid.sum(axis=-1)
+    total = np.where(valid, ratios, 0.0).sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+
+class LivenessDetector:
+    def __init__(self, threshold: float = 32.0, cooldown: int = 10, window: int = 5,
+                 record: bool = False):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.window = window
+        self._buf = np.zeros(window, dtype=np.float64)
+        self.recording = [] if record else None
+        self.reset()
+
+    def reset(self):
+        self._filled = 0
+        self._pos = 0
+        self._since_blink = None     # frames since the last blink, None = never
+        self.ratio = None
+
+    # ---------- live, one frame at a time ----------
+    def update(self, face) -> bool:
+        """Feed one frame's landmarks; True on the frame a blink is detected."""
+        if self.recording is not None:
+            self.recording.append(np.asarray(face, dtype=np.float32)[:, :2])
+
+        ratio = float(eye_ratio(face))
+        if np.isnan(ratio):
+            return False
+
+        self._buf[self._pos] = ratio
+        self._pos = (self._pos + 1) % self.window
+        self._filled = min(self._filled + 1, self.window)
+        self.ratio = float(self._buf[:self._filled].mean())
+
+        if self._since_blink is not None:
+            self._since_blink += 1
+        ready = self._since_blink is None or self._since_blink >= self.cooldown
+        if self.ratio < self.threshold and ready:
+            self._since_blink = 0
+            return True
+        return False
+
+    def save_recording(self, path: str):
+        np.save(path, np.stack(self.recording) if self.recording else np.zeros((0, 468, 2), np.float32))
+
+    # ---------- offline, whole sequence at once ----------
+    def smoothed(self, frames) -> np.ndarray:
+        """Ring-buffer mean for every valid frame of a (T, 468, 2) array (NaN where invalid)."""
+        ratios = eye_ratio(frames)
+        valid = np.flatnonzero(~np.isnan(ratios))
+        r = ratios[valid]
+        csum = np.concatenate([[0.0], np.cumsum(r)])
+        end = np.arange(1, len(r) + 1)
+        start = np.maximum(0, end - self.window)
+        out = np.full(len(ratios), np.nan)
+        out[valid] = (csum[end] - csum[start]) / (end - start)
+        return out
+
+    def score(self, frames) -> np.ndarray:
+        """Frame indices at which a blink is detected, same rule as update()."""
+        avg = self.smoothed(frames)
+        valid = np.flatnonzero(~np.isnan(avg))
+        below = np.flatnonzero(avg[valid] < self.threshold)   # positions among valid frames
+
+        blinks, next_ok = [], 0
+        for k in below:                                       # refractory period, only over candidates
+            if k >= next_ok:
+                blinks.append(valid[k])
+                next_ok = k + self.cooldown
+        return np.asarray(blinks, dtype=np.int64)
+
+
+# ---------- replay / tuning ----------
+def replay(recordings, thresholds, cooldowns, window: int = 5, expect: int = None):
+    """Score every recording under every (threshold, cooldown); returns a list of result rows."""
+    seqs = [(str(p), np.load(p)) if isinstance(p, str) else (f"seq{i}", np.asarray(p))
+            for i, p in enumerate(recordings)]
+    rows = []
+    for thr in thresholds:
+        for cd in cooldowns:
+            det = LivenessDetector(threshold=thr, cooldown=cd, window=window)
+            frames, hits, t0 = 0, 0, time.perf_counter()
+            counts = {}
+            for name, seq in seqs:
+                counts[name] = len(det.score(seq))
+                frames += len(seq)
+                hits += expect is not None and counts[name] == expect
+            dt = time.perf_counter() - t0
+            rows.append({"threshold": thr, "cooldown": cd, "blinks": counts,
+                         "matched": hits if expect is not None else None,
+                         "frames_per_sec": round(frames / dt) if dt else None})
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="command", required=True)
+    rp = sub.add_parser("replay", help="score recorded landmark sequences")
+    rp.add_argument("recordings", nargs="+")
+    rp.add_argument("--threshold", type=float, nargs="+", default=[32.0])
+    rp.add_argument("--cooldown", type=int, nargs="+", default=[10])
+    rp.add_argument("--window", type=int, default=5)
+    rp.add_argument("--expect", type=int, default=None, help="expected blinks per recording")
+    args = ap.parse_args()
+
+    for row in replay(args.recordings, args.threshold, args.cooldown, args.window, args.expect):
+        matched = f" | matched {row['matched']}/{len(args.recordings)}" if row["matched"] is not None else ""
+        print(f"threshold {row['threshold']:5.1f} | cooldown {row['cooldown']:3d}{matched} | "
+              f"{row['frames_per_sec']} frames/s | {row['blinks']}")
@@ -0,0 +1,248 @@
+"""
+Inverted-file (IVF) index for 1:N identification over large galleries.
+
+k-means splits the gallery into `nlist` cells. A query ranks the cell
+centroids and computes exact distances only for rows in its `nprobe`
+closest cells, so it costs roughly nprobe / nlist of a full scan. nprobe is
+the recall / latency knob and can be changed per query.
+
+The index sits on top of a FaceIndex (or SharedFaceIndex) and reuses its
+vectors, norms, labels and alive mask; it only owns the centroids and the
+cell lists. Rows enrolled after training are assigned to their nearest cell
+on the next query. A gallery compaction renumbers rows, so then every row
+is reassigned with the existing centroids. Retrain offline once the gallery
+has grown well past what it was trained on.
+
+Searches run from several threads at once; catching up takes a lock and
+publishes new cell lists in one assignment, so a search never sees a row
+twice or a half-filled list.
+
+Usage:
+    python face_ann.py build [--store-dir face_store] [--nlist 1024] [--iters 20]
+    python face_ann.py stats [--store-dir face_store]
+"""
+import os
+import threading
+import time
+import numpy as np
+
+ANN_FILE = "ivf.npz"          # saved next to the face store files
+_BLOCK = 8192                 # rows per block when assigning to cells
+
+
+def nearest_centroid(x, centroids) -> np.ndarray:
+    """Cell id of every row of `x`, computed in blocks."""
+    csq = np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(len(x), dtype=np.int32)
+    for s in range(0, len(x), _BLOCK):
+        block = np.asarray(x[s:s + _BLOCK], dtype=np.float32)
+        out[s:s + len(block)] = np.argmin(csq - 2.0 * (block @ centroids.T), axis=1)
+    return out
+
+
+def kmeans(x, k: int, iters: int = 20, seed: int = 0, sample: int = None) -> np.ndarray:
+    """Plain Lloyd k-means; returns (k, dim) float32 centroids."""
+    rng = np.random.default_rng(seed)
+    x = np.asarray(x, dtype=np.float32)
+    if sample and len(x) > sample:
+        x = x[np.sort(rng.choice(len(x), sample, replace=False))]
+    k = max(1, min(k, len(x)))
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+
+    assign = None
+    for _ in range(iters):
+        new = nearest_centroid(x, centroids)
+        if assign is not None and np.array_equal(new, assign):
+            break
+        assign = new
+        counts = np.bincount(assign, minlength=k)
+        for j in range(x.shape[1]):
+            centroids[:, j] = np.bincount(assign, weights=x[:, j], minlength=k)
+        filled = counts > 0
+        centroids[filled] /= counts[filled, None]
+        empty = np.flatnonzero(~filled)
+        if len(empty):                       # reseed empty cells from random rows
+            centroids[empty] = x[rng.choice(len(x), len(empty), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, base, centroids=None, nprobe: int = 8):
+        self.base = base
+        self.nprobe = nprobe
+        self.centroids = None
+        self._lists = []          # cell -> int32 row ids of the base index
+        self._n = 0               # base rows assigned so far
+        self._epoch = None        # base.epoch the rows were assigned under
+        self._lock = threading.RLock()
+        if centroids is not None:
+            self._set_centroids(centroids)
+            self._assign_all()
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def nlist(self) -> int:
+        return 0 if self.centroids is None else len(self.centroids)
+
+    @property
+    def nbytes(self) -> int:
+        if self.centroids is None:
+            return 0
+        return self.centroids.nbytes + self._csq.nbytes + sum(l.nbytes for l in self._lists)
+
+    def _set_centroids(self, centroids):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self._csq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+    # ---------- build ----------
+    def train(self, nlist: int = None, iters: int = 20, seed: int = 0, sample: int = 256):
+        """
+        k-means over the live rows, then assign every row. `nlist` defaults to
+        ~4*sqrt(rows); k-means sees at most `sample` rows per cell.
+        """
+        live = np.flatnonzero(self.base._live[:self.base._size])
+        if not len(live):
+            raise ValueError("cannot train an ANN index on an empty gallery")
+        nlist = nlist or int(np.clip(4 * np.sqrt(len(live)), 1, 4096))
+        x = self.base._vecs[live]
+        self._set_centroids(kmeans(x, nlist, iters=iters, seed=seed, sample=sample * nlist))
+        self._assign_all()
+        return self
+
+    def _empty_lists(self):
+        return [np.zeros(0, dtype=np.int32) for _ in range(self.nlist)]
+
+    def _assign_all(self):
+        with self._lock:
+            epoch, n = self.base.epoch, self.base._size
+            cells = nearest_centroid(self.base._vecs[:n], self.centroids)
+            self._lists = self._extended(self._empty_lists(), np.arange(n, dtype=np.int32), cells)
+            self._n, self._epoch = n, epoch
+
+    def _catch_up(self):
+        """Assign rows enrolled since the last call (all rows after a compaction)."""
+        if self.base.epoch == self._epoch and self.base._size <= self._n:
+            return
+        with self._lock:
+            # re-check: another search may have caught up while we waited
+            if self.base.epoch != self._epoch:
+                self._assign_all()
+                return
+            n = self.base._size
+            if n <= self._n:
+                return
+            cells = nearest_centroid(self.base._vecs[self._n:n], self.centroids)
+            self._lists = self._extended(self._lists, np.arange(self._n, n, dtype=np.int32), cells)
+            self._n = n
+
+    @staticmethod
+    def _extended(lists, rows, cells):
+        """Copy of `lists` with `rows` appended to their `cells`."""
+        lists = list(lists)
+        order = np.argsort(cells, kind="stable")
+        rows, cells = rows[order], cells[order]
+        bounds = np.flatnonzero(np.diff(cells)) + 1
+        for group in np.split(np.arange(len(rows)), bounds):
+            if len(group):
+                c = cells[group[0]]
+                lists[c] = np.concatenate([lists[c], rows[group]])
+        return lists
+
+    # ---------- persistence ----------
+    def save(self, path: str):
+        assign = np.full(self._n, -1, dtype=np.int32)
+        for c, rows in enumerate(self._lists):
+            assign[rows] = c
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, centroids=self.centroids, assign=assign, epoch=np.int64(self._epoch))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, base, path: str, nprobe: int = 8):
+        """Load saved centroids; saved cell lists are reused if the gallery was not renumbered since."""
+        with np.load(path) as data:
+            centroids, assign, epoch = data["centroids"], data["assign"], int(data["epoch"])
+        if centroids.shape[1] != base.dim:
+            raise ValueError(f"ANN index dim {centroids.shape[1]} != gallery dim {base.dim}")
+        index = cls(base, nprobe=nprobe)
+        index._set_centroids(centroids)
+        if epoch != base.epoch or len(assign) > base._size:
+            index._assign_all()
+            return index
+        rows = np.flatnonzero(assign >= 0).astype(np.int32)
+        index._lists = index._extended(index._empty_lists(), rows, assign[rows])
+        index._n, index._epoch = len(assign), epoch
+        index._catch_up()
+        return index
+
+    # ---------- queries ----------
+    def search(self, probe, k: int = 1, nprobe: int = None):
+        """Top-k students among the rows of the `nprobe` closest cells, best first."""
+        if not self.trained:
+            return self.base.search(probe, k)
+        self._catch_up()
+        lists, base = self._lists, self.base
+        p = np.asarray(probe, dtype=np.float32).reshape(base.dim)
+        pp = float(p @ p)
+
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        cd = self._csq - 2.0 * (self.centroids @ p)
+        cells = np.argpartition(cd, nprobe - 1)[:nprobe] if nprobe < self.nlist else range(self.nlist)
+        rows = np.concatenate([lists[c] for c in cells])
+        rows = np.sort(rows[base._live[rows]])          # ascending rows: sequential mmap reads
+        if not len(rows):
+            return []
+
+        vecs = np.asarray(base._vecs[rows], dtype=np.float32)
+        d = np.sqrt(np.maximum(base._sq[rows] - 2.0 * (vecs @ p) + pp, 0.0))
+        out, seen = [], set()
+        for j in np.argsort(d, kind="stable"):
+            name = base._labels[rows[j]]
+            if name is None or name in seen:
+                continue
+            seen.add(name)
+            out.append((name, float(d[j])))
+            if len(out) == k:
+                break
+        return out
+
+    def nearest(self, probe, nprobe: int = None):
+        hits = self.search(probe, k=1, nprobe=nprobe)
+        return hits[0] if hits else (None, float("inf"))
+
+    def stats(self) -> dict:
+        sizes = np.array([len(l) for l in self._lists]) if self._lists else np.zeros(1)
+        return {"nlist": self.nlist, "nprobe": self.nprobe, "rows": int(self._n),
+                "cell_min": int(sizes.min()), "cell_mean": round(float(sizes.mean()), 1),
+                "cell_max": int(sizes.max()), "nbytes": self.nbytes}
+
+
+if __name__ == "__main__":
+    import argparse
+    from face_store import FaceStore, STORE_DIR
+    from face_index import SharedFaceIndex
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=["build", "stats"])
+    ap.add_argument("--store-dir", default=STORE_DIR)
+    ap.add_argument("--nlist", type=int, default=None, help="cells (default ~4*sqrt(rows))")
+    ap.add_argument("--iters", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    gallery = SharedFaceIndex(FaceStore(args.store_dir))
+    path = os.path.join(args.store_dir, ANN_FILE)
+    if args.command == "build":
+        t0 = time.time()
+        ann = IVFIndex(gallery).train(args.nlist, iters=args.iters, seed=args.seed)
+        ann.save(path)
+        print(f"Trained {ann.nlist} cells over {len(gallery)} rows in {time.time() - t0:.1f}s -> {path}")
+    else:
+        ann = IVFIndex.load(gallery, path)
+    print(ann.stats())
@@ -0,0 +1,404 @@
+import threading
+import numpy as np
+
+QUANTIZE_MODES = ("float16", "int8")
+_SCAN_BLOCK = 8192        # rows dequantized per step of a coarse scan
+
+
+# ---------- in-memory face gallery ----------
+class FaceIndex:
+    """
+    Gallery of enrolled face encodings kept as one contiguous float32 matrix.
+
+    Squared norms are precomputed per row so a query is a single matrix-vector
+    product: ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b. Distances are euclidean,
+    same scale as face_recognition.face_distance, so existing thresholds hold.
+
+    Removing a student tombstones their rows; the matrix is compacted once
+    more than half of it is dead.
+
+    With `quantize="float16"` or `"int8"` (per-row scale) 1:N searches scan a
+    compressed copy of the gallery and re-rank the best `rerank` rows against
+    the float32 vectors, so only those rows of the full matrix are touched.
+    1:1 lookups and centroids always use the float32 vectors.
+    """
+
+    def __init__(self, dim: int = 128, capacity: int = 1024, use_centroids: bool = False,
+                 quantize: str = None, rerank: int = 16):
+        if quantize not in (None,) + QUANTIZE_MODES:
+            raise ValueError(f"quantize must be one of {QUANTIZE_MODES} or None, got {quantize!r}")
+        self.dim = dim
+        self.use_centroids = use_centroids
+        self.quantize = quantize
+        self.rerank = max(1, rerank)
+        self._vecs = np.zeros((capacity, dim), dtype=np.float32)
+        self._sq = np.zeros(capacity, dtype=np.float32)     # squared norms
+        self._live = np.zeros(capacity, dtype=bool)
+        self._labels = np.empty(capacity, dtype=object)     # row -> student id
+        self._rows = {}                                     # student id -> [row, ...]
+        self._size = 0                                      # rows in use (live + dead)
+        self._dead = 0
+        self._centroids = None                              # (ids, matrix, sq) cache
+        self.epoch = 0                                      # bumped whenever rows are renumbered
+        if quantize:
+            self._codes = np.zeros((capacity, dim), dtype=np.int8 if quantize == "int8" else np.float16)
+            self._scale = np.ones(capacity, dtype=np.float32)  # int8: row = codes * scale
+
+    @classmethod
+    def from_arrays(cls, encodings, names, **kwargs):
+        """Build an index from parallel lists of encodings and student ids."""
+        index = cls(capacity=max(len(encodings), 1024), **kwargs)
+        groups = {}
+        for enc, name in zip(encodings, names):
+            groups.setdefault(name, []).append(enc)
+        for name, encs in groups.items():
+            index.add(name, encs)
+        return index
+
+    # ---------- introspection ----------
+    def __len__(self):
+        return self._size - self._dead
+
+    def __contains__(self, student_id):
+        return student_id in self._rows
+
+    def students(self):
+        return list(self._rows)
+
+    def rows_of(self, student_id):
+        return list(self._rows.get(student_id, ()))
+
+    def vectors_of(self, student_id) -> np.ndarray:
+        """Enrolled encodings of one student as an (n, dim) float32 array."""
+        return self._vecs[self._rows.get(student_id, [])]
+
+    @property
+    def nbytes(self) -> int:
+        n = self._vecs.nbytes + self._sq.nbytes + self._live.nbytes
+        return n + (self._codes.nbytes + self._scale.nbytes if self.quantize else 0)
+
+    @property
+    def scan_nbytes(self) -> int:
+        """Bytes a 1:N search reads end to end (the re-rank rows come on top)."""
+        n = self._size
+        per_row = self._codes.itemsize * self.dim + 4 if self.quantize else 4 * self.dim
+        return n * (per_row + self._sq.itemsize + self._live.itemsize)
+
+    # ---------- mutation ----------
+    def add(self, student_id, encodings):
+        """Append one or more encodings for a student. Returns the new row ids."""
+        encs = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        n = len(encs)
+        if n == 0:
+            return []
+        self._reserve(self._size + n)
+
+        start, stop = self._size, self._size + n
+        self._vecs[start:stop] = encs
+        self._sq[start:stop] = np.einsum("ij,ij->i", encs, encs)
+        self._live[start:stop] = True
+        self._labels[start:stop] = student_id
+        if self.quantize:
+            self._codes[start:stop], self._scale[start:stop] = self._quantize(encs)
+        self._size = stop
+
+        rows = list(range(start, stop))
+        self._rows.setdefault(student_id, []).extend(rows)
+        self._centroids = None
+        return rows
+
+    def remove(self, student_id) -> int:
+        """Tombstone every row of a student. Returns how many rows were removed."""
+        rows = self._rows.pop(student_id, None)
+        if not rows:
+            return 0
+        self._live[rows] = False
+        self._labels[rows] = None
+        self._dead += len(rows)
+        self._centroids = None
+        if self._dead > 64 and self._dead * 2 > self._size:
+            self.compact()
+        return len(rows)
+
+    def replace(self, student_id, encodings):
+        """Re-enrollment: drop a student's old rows and add the new encodings."""
+        self.remove(student_id)
+        return self.add(student_id, encodings)
+
+    def compact(self):
+        """Drop tombstoned rows and renumber the survivors."""
+        keep = np.flatnonzero(self._live[:self._size])
+        n = len(keep)
+        self._vecs[:n] = self._vecs[keep]
+        self._sq[:n] = self._sq[keep]
+        self._labels[:n] = self._labels[keep]
+        if self.quantize:
+            self._codes[:n] = self._codes[keep]
+            self._scale[:n] = self._scale[keep]
+        self._live[:n] = True
+        self._live[n:] = False
+        self._labels[n:] = None
+        self._size, self._dead = n, 0
+        self.epoch += 1
+
+        self._rows = {}
+        for row, name in enumerate(self._labels[:n]):
+            self._rows.setdefault(name, []).append(row)
+        self._centroids = None
+
+    def _reserve(self, needed: int):
+        cap = len(self._vecs)
+        if needed <= cap:
+            return
+        while cap < needed:
+            cap *= 2
+        attrs = ("_vecs", "_sq", "_live", "_labels") + (("_codes", "_scale") if self.quantize else ())
+        for attr in attrs:
+            old = getattr(self, attr)
+            new = np.zeros((cap,) + old.shape[1:], dtype=old.dtype) if old.dtype != object \
+                else np.empty(cap, dtype=object)
+            new[:self._size] = old[:self._size]
+            setattr(self, attr, new)
+
+    # ---------- quantization ----------
+    def _quantize(self, encs):
+        """float32 rows -> (codes, per-row scale)."""
+        if self.quantize == "float16":
+            return encs.astype(np.float16), np.ones(len(encs), dtype=np.float32)
+        scale = np.abs(encs).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        codes = np.clip(np.rint(encs / scale[:, None]), -127, 127).astype(np.int8)
+        return codes, scale.astype(np.float32)
+
+    def _coarse_dots(self, p) -> np.ndarray:
+        """Approximate `rows @ p` from the compressed copy, in bounded blocks."""
+        n = self._size
+        out = np.empty(n, dtype=np.float32)
+        for s in range(0, n, _SCAN_BLOCK):
+            e = min(s + _SCAN_BLOCK, n)
+            out[s:e] = self._codes[s:e].astype(np.float32) @ p
+        if self.quantize == "int8":
+            out *= self._scale[:n]
+        return out
+
+    def _reranked(self, probe, m: int):
+        """
+        (rows, exact distances) for the `m` rows closest by the compressed
+        scan, re-scored against the float32 vectors. Dead rows are dropped.
+        """
+        p = np.asarray(probe, dtype=np.float32).reshape(self.dim)
+        n, pp = self._size, float(p @ p)
+        d2 = self._sq[:n] - 2.0 * self._coarse_dots(p) + pp
+        if self._dead:
+            d2[~self._live[:n]] = np.inf
+        m = min(m, n)
+        cand = np.argpartition(d2, m - 1)[:m] if m < n else np.arange(n)
+        cand = np.sort(cand[np.isfinite(d2[cand])])    # ascending rows: sequential reads from the mmap
+        vecs = np.asarray(self._vecs[cand], dtype=np.float32)
+        d = np.sqrt(np.maximum(self._sq[cand] - 2.0 * (vecs @ p) + pp, 0.0))
+        return cand, d
+
+    # ---------- centroids ----------
+    def centroid(self, student_id) -> np.ndarray:
+        vecs = self.vectors_of(student_id)
+        return vecs.mean(axis=0) if len(vecs) else None
+
+    def _centroid_table(self):
+        if self._centroids is None:
+            ids = list(self._rows)
+            mat = np.stack([self.centroid(s) for s in ids]) if ids \
+                else np.zeros((0, self.dim), dtype=np.float32)
+            self._centroids = (np.array(ids, dtype=object), mat, np.einsum("ij,ij->i", mat, mat))
+        return self._centroids
+
+    # ---------- queries ----------
+    def distances(self, probe) -> np.ndarray:
+        """Euclidean distance from `probe` to every row (dead rows are +inf)."""
+        p = np.asarray(probe, dtype=np.float32).reshape(self.dim)
+        vecs, sq = self._vecs[:self._size], self._sq[:self._size]
+        d2 = sq - 2.0 * (vecs @ p) + float(p @ p)
+        d = np.sqrt(np.maximum(d2, 0.0, out=d2), out=d2)
+        if self._dead:
+            d[~self._live[:self._size]] = np.inf
+        return d
+
+    def distances_to(self, student_id, probe) -> np.ndarray:
+        """1:1 — distances from `probe` to one student's rows only."""
+        rows = self._rows.get(student_id)
+        if not rows:
+            return np.zeros(0, dtype=np.float32)
+        p = np.asarray(probe, dtype=np.float32).reshape(self.dim)
+        d2 = self._sq[rows] - 2.0 * (self._vecs[rows] @ p) + float(p @ p)
+        return np.sqrt(np.maximum(d2, 0.0))
+
+    def search(self, probe, k: int = 1):
+        """
+        Top-k closest *students* to `probe`, best first.
+        Returns a list of (student_id, distance) pairs.
+        """
+        if not len(self) or k <= 0:
+            return []
+
+        if self.use_centroids:
+            ids, mat, sq = self._centroid_table()
+            p = np.asarray(probe, dtype=np.float32).reshape(self.dim)
+            d = np.sqrt(np.maximum(sq - 2.0 * (mat @ p) + float(p @ p), 0.0))
+            labels = ids
+        elif self.quantize:
+            per = max(len(r) for r in self._rows.values())
+            rows, d = self._reranked(probe, max(self.rerank, k * per))
+            if not len(rows):
+                return []
+            labels = self._labels[rows]
+        else:
+            d = self.distances(probe)
+            labels = self._labels[:self._size]
+
+        if k == 1:
+            j = int(np.argmin(d))
+            return [(labels[j], float(d[j]))]
+
+        # every student owns at most `per` rows, so the best k*per (+ dead) rows
+        # are guaranteed to contain the best k distinct students
+        per = 1 if self.use_centroids else max(len(r) for r in self._rows.values())
+        m = min(len(d), k * per + (0 if self.use_centroids or self.quantize else self._dead))
+        cand = np.argpartition(d, m - 1)[:m] if m < len(d) else np.arange(len(d))
+        cand = cand[np.argsort(d[cand], kind="stable")]
+
+        out, seen = [], set()
+        for j in cand:
+            name = labels[j]
+            if name is None or name in seen or not np.isfinite(d[j]):
+                continue
+            seen.add(name)
+            out.append((name, float(d[j])))
+            if len(out) == k:
+                break
+        return out
+
+    def nearest(self, probe):
+        """Closest student and distance, or (None, inf) for an empty index."""
+        hits = self.search(probe, k=1)
+        return hits[0] if hits else (None, float("inf"))
+
+
+# ---------- gallery shared across worker processes ----------
+class SharedFaceIndex(FaceIndex):
+    """
+    FaceIndex whose vectors are the face store's memory map, so every gunicorn
+    worker reads the same page-cache copy instead of holding its own.
+
+    Only the small per-row bits (squared norms, labels, alive mask) are
+    private. `sync()` compares the store's generation counter with the last
+    one seen and folds in new rows and tombstones incrementally; a full
+    rebuild happens only after the store was compacted (epoch change).
+    Writes go through the store, so other workers see them on their next sync.
+    Request threads, the job pool and the kiosk thread share one instance, so
+    sync and every mutation run under a lock.
+
+    With `quantize` set, each worker keeps only the compressed copy hot and
+    re-ranks against the on-disk float32 rows, so a search faults in `rerank`
+    rows of the map instead of all of it.
+    """
+
+    def __init__(self, store, use_centroids: bool = False, quantize: str = None, rerank: int = 16):
+        super().__init__(dim=store.dim, capacity=0, use_centroids=use_centroids,
+                         quantize=quantize, rerank=rerank)
+        self.store = store
+        self._lock = threading.RLock()
+        self._version = (None, None)
+        self.sync()
+
+    @property
+    def nbytes(self) -> int:
+        # vectors are shared, only count what this process owns
+        n = self._sq.nbytes + self._live.nbytes
+        return n + (self._codes.nbytes + self._scale.nbytes if self.quantize else 0)
+
+    def sync(self) -> bool:
+        """Pick up enrollments written by any process. Returns True if anything changed."""
+        if self.store.version() == self._version:
+            return False
+        with self._lock:
+            # another thread may have synced while we waited for the lock
+            return self._sync_locked()
+
+    def _sync_locked(self) -> bool:
+        # read the counters before mapping: writers bump them after writing,
+        # so everything up to this version is in the files mapped below
+        generation, epoch = self.store.version()
+        if (generation, epoch) == self._version:
+            return False
+        if epoch != self._version[1]:
+            self._size, self._dead, self._rows = 0, 0, {}
+            self._sq = np.zeros(0, dtype=np.float32)
+            self._live = np.zeros(0, dtype=bool)
+            self._labels = np.empty(0, dtype=object)
+            if self.quantize:
+                self._codes = self._codes[:0]
+                self._scale = self._scale[:0]
+            self.epoch = epoch
+
+        old = self._size
+        n = self.store.refresh()
+        alive = self.store.records["alive"].astype(bool)
+
+        # tombstones written since the last sync
+        for row in np.flatnonzero(self._live[:old] & ~alive[:old]):
+            rows = self._rows.get(self._labels[row])
+            if rows is not None:
+                rows.remove(row)
+                if not rows:
+                    del self._rows[self._labels[row]]
+            self._labels[row] = None
+
+        # rows appended since the last sync
+        if n > old:
+            new = self.store.vectors[old:n]
+            labels = self.store.student_ids()[old:n].tolist()
+            added = np.empty(n - old, dtype=object)
+            added[:] = labels
+            self._sq = np.concatenate([self._sq, np.einsum("ij,ij->i", new, new)])
+            self._labels = np.concatenate([self._labels, added])
+            if self.quantize:
+                codes, scale = self._quantize(np.asarray(new, dtype=np.float32))
+                self._codes = np.concatenate([self._codes, codes])
+                self._scale = np.concatenate([self._scale, scale])
+            for row, name in enumerate(labels, start=old):
+                if alive[row]:
+                    self._rows.setdefault(name, []).append(row)
+                else:
+                    self._labels[row] = None
+
+        self._vecs = self.store.vectors
+        self._live = alive
+        self._size = n
+        self._dead = n - int(np.count_nonzero(alive))
+        self._centroids = None
+        self._version = (generation, epoch)
+        return True
+
+    # ---------- mutation goes through the store ----------
+    def add(self, student_id, encodings):
+        with self._lock:
+            rows = self.store.append(student_id, encodings)
+            self._sync_locked()
+        return rows
+
+    def remove(self, student_id) -> int:
+        with self._lock:
+            removed = self.store.delete(student_id)
+            self._sync_locked()
+        return removed
+
+    def replace(self, student_id, encodings):
+        with self._lock:
+            self.store.delete(student_id)
+            rows = self.store.append(student_id, encodings)
+            self._sync_locked()
+        return rows
+
+    def compact(self):
+        with self._lock:
+            self.store.compact()
+            self._sync_locked()
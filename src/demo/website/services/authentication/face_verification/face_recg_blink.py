@@ -1,52 +1,37 @@
 import os
+import time
 import cv2
-import numpy as np
-import face_recognition
 from cvzone.FaceMeshModule import FaceMeshDetector
+from . import face_recog, frames
+from .blink_detection import LivenessDetector
+from .pipeline import FramePipeline, landmark_box
 
 
-# --- Blink function (yours, unchanged) ---
-def is_blinking(face, detector, ratio_list, counter, threshold=32, cooldown=10):
-    leftUp = face[159]
-    leftDown = face[23]
-    leftLeft = face[130]
-    leftRight = face[243]
+# set to a directory to keep landmark recordings for offline liveness tuning
+# (python blink_detection.py replay <dir>/*.npy ...)
+RECORD_DIR = os.getenv("FACE_LIVENESS_RECORD_DIR")
 
-    vertical_len, _ = detector.findDistance(leftUp, leftDown)
-    horizontal_len, _ = detector.findDistance(leftLeft, leftRight)
 
-    if horizontal_len == 0:
-        return False, ratio_list, counter
+def _save_recording(liveness: LivenessDetector, student_id: str):
+    if RECORD_DIR and liveness.recording:
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        liveness.save_recording(os.path.join(RECORD_DIR, f"{student_id}_{int(time.time())}.npy"))
 
-    ratio = (vertical_len / horizontal_len) * 100
-    ratio_list.append(ratio)
-    if len(ratio_list) > 5:
-        ratio_list.pop(0)
-    ratio_avg = sum(ratio_list) / len(ratio_list)
 
-    blink_detected = False
-    if ratio_avg < threshold and counter == 0:
-        blink_detected = True
-        counter = 1
-    if counter != 0:
-        counter += 1
-        if counter > cooldown:
-            counter = 0
-
-    return blink_detected, ratio_list, counter
+# --- Registration with blink verification ---
+def _enroll(student_id: str, encodings):
+    """Re-enrollment replaces the student's rows in the shared gallery."""
+    face_recog.face_index.replace(student_id, encodings)
 
 
-# --- Registration with blink verification ---
 def register_face_with_blink(student_id: str, max_embeddings: int = 5, camera_index: int = 0):
-    save_dir = os.path.join(os.path.dirname(__file__), f"face_data/{student_id}")
-    os.makedirs(save_dir, exist_ok=True)
-
     cap = cv2.VideoCapture(camera_index)
     detector = FaceMeshDetector(maxFaces=1)
+    pipe = FramePipeline()
+    liveness = LivenessDetector(record=bool(RECORD_DIR))
 
     count = 0
-    ratio_list = []
-    blink_counter = 0
+    collected = []
     capture_ready = False
 
     print("Blink once, then open eyes to capture embedding... (ESC to quit)")
@@ -61,28 +46,24 @@ def register_face_with_blink(student_id: str, max_embeddings: int = 5, camera_in
 
             if faces:
                 face = faces[0]
-                blink, ratio_list, blink_counter = is_blinking(face, detector, ratio_list, blink_counter)
-
-                if blink:
+                if liveness.update(face):
                     capture_ready = True
                 elif capture_ready:
-                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    boxes = face_recognition.face_locations(rgb_frame)
-
-                    if boxes:
-                        encodings = face_recognition.face_encodings(rgb_frame, boxes)
-                        for encoding in encodings:
-                            npy_path = os.path.join(save_dir, f"face_{count}.npy")
-                            np.save(npy_path, encoding)
-                            print(f"[Saved] {npy_path}")
-                            count += 1
-                            capture_ready = False
-
-                            if count >= max_embeddings:
-                                cap.release()
-                                cv2.destroyAllWindows()
-                                return {"ok": True, "message": f"Collected {max_embeddings} embeddings.",
-                                        "path": save_dir}
+                    # the face mesh already located the face: encode that region, no HOG pass
+                    encoding = pipe.process(frame, roi=landmark_box(face, frame.shape))
+
+                    if encoding is not None:
+                        collected.append(encoding)
+                        count += 1
+                        print(f"[Captured] embedding {count}/{max_embeddings}")
+                        capture_ready = False
+
+                        if count >= max_embeddings:
+                            cap.release()
+                            cv2.destroyAllWindows()
+                            _enroll(student_id, collected)
+                            return {"ok": True, "message": f"Collected {max_embeddings} embeddings.",
+                                    "path": face_recog.face_store.root, "timings_ms": pipe.timings_ms()}
                     else:
                         print("Face not detected clearly.")
 
@@ -93,5 +74,49 @@ def register_face_with_blink(student_id: str, max_embeddings: int = 5, camera_in
     finally:
         cap.release()
         cv2.destroyAllWindows()
+        _save_recording(liveness, student_id)
+
+    if collected:
+        _enroll(student_id, collected)
+    return {"ok": True, "message": f"Collected {count} embeddings.", "path": face_recog.face_store.root,
+            "timings_ms": pipe.timings_ms()}
+
+
+# --- Registration from frames uploaded by the browser ---
+def register_face_with_blink_frames(student_id: str, files, max_embeddings: int = 5, **limits):
+    """
+    Same blink gate as register_face_with_blink, but over a burst of
+    JPEG/WebP frames posted by the client: at least one blink must be seen,
+    then open-eye frames after it are encoded until max_embeddings.
+    """
+    detector = FaceMeshDetector(maxFaces=1)
+    pipe = FramePipeline()
+    liveness = LivenessDetector(record=bool(RECORD_DIR))
+    blinked = False
+    collected = []
+
+    for frame in frames.iter_frames(files, **limits):
+        frame, faces = detector.findFaceMesh(frame, draw=False)
+        if not faces:
+            continue
+        if liveness.update(faces[0]):
+            blinked = True
+            continue
+        if not blinked:
+            continue
+
+        encoding = pipe.process(frame, roi=landmark_box(faces[0], frame.shape))
+        if encoding is not None:
+            collected.append(encoding)
+            if len(collected) >= max_embeddings:
+                break
+
+    _save_recording(liveness, student_id)
+    if not blinked:
+        return {"ok": False, "message": "No blink detected. Blink once while the camera is recording."}
+    if not collected:
+        return {"ok": False, "message": "Face not detected clearly."}
 
-    return {"ok": True, "message": f"Collected {count} embeddings.", "path": save_dir}
+    _enroll(student_id, collected)
+    return {"ok": True, "message": f"Collected {len(collected)} embeddings.", "path": face_recog.face_store.root,
+            "timings_ms": pipe.timings_ms()}
@@ -2,130 +2,178 @@ import os
 import time
 import cv2
 import numpy as np
-import face_recognition as fr
+from .face_ann import ANN_FILE, IVFIndex
+from .face_index import SharedFaceIndex
+from .face_store import FaceStore
+from .pipeline import FramePipeline
+from ... import metrics, model_registry
 
 # ---------- paths ----------
 BASE_DIR = os.path.dirname(__file__)
-DATA_DIR = os.path.join(BASE_DIR, "face_data")
-os.makedirs(DATA_DIR, exist_ok=True)
-
-# ---------- load encodings once ----------
-known_encodings, known_names = [], []
-if os.path.isdir(DATA_DIR):
-    for person in os.listdir(DATA_DIR):
-        person_dir = os.path.join(DATA_DIR, person)
-        if not os.path.isdir(person_dir):
-            continue
-        for file in os.listdir(person_dir):
-            if file.endswith(".npy"):
-                try:
-                    enc = np.load(os.path.join(person_dir, file))
-                    known_encodings.append(enc)
-                    known_names.append(person)
-                except Exception:
-                    pass  # skip corrupt files
+STORE_DIR = os.path.join(BASE_DIR, "face_store")
+
+# ---------- shared gallery ----------
+# vectors are the store's mmap (shared by all workers); sync() before each
+# verify picks up enrollments made by other workers via the generation counter.
+# FACE_INDEX_QUANTIZE=float16|int8 searches a compressed copy and re-ranks the
+# best FACE_INDEX_RERANK rows against the float32 store.
+INDEX_QUANTIZE = os.getenv("FACE_INDEX_QUANTIZE") or None
+INDEX_RERANK = int(os.getenv("FACE_INDEX_RERANK", "16"))
+
+face_store = FaceStore(STORE_DIR)
+face_index = SharedFaceIndex(face_store, quantize=INDEX_QUANTIZE, rerank=INDEX_RERANK)
+
+# 1:N over large galleries goes through the IVF index built offline with
+# `python face_ann.py build`; below ANN_MIN_ROWS a full scan is just as fast
+ANN_PATH = os.path.join(STORE_DIR, ANN_FILE)
+ANN_NPROBE = int(os.getenv("FACE_ANN_NPROBE", "8"))
+ANN_MIN_ROWS = int(os.getenv("FACE_ANN_MIN_ROWS", "20000"))
+face_ann = IVFIndex.load(face_index, ANN_PATH, nprobe=ANN_NPROBE) if os.path.exists(ANN_PATH) else None
+
+# dlib's detector and ResNet encoder are loaded with face_recognition; one
+# detect + encode on a blank frame warms their buffers before traffic
+def _warmup(_):
+    FramePipeline(detect_every=1).process(np.zeros((240, 320, 3), dtype=np.uint8), roi=(40, 200, 200, 40))
+
+model_registry.register("face", None, _warmup)
+
+# ---------- per-student adaptive threshold (1:1) ----------
+ADAPT_MIN_SAMPLES = 3     # fewer samples than this -> use the base threshold
+ADAPT_SCALE = 2.0         # genuine probe can sit up to ~2 spreads from a sample
+MAX_TIGHTEN, MAX_LOOSEN = 0.10, 0.05
+EARLY_ACCEPT = 0.8        # centroid this close -> accept without touching samples
+
+_profiles = {"version": None, "by_student": {}}
+
+def _profile(student_id: str, base: float):
+    """(threshold, centroid) for a student, cached until the gallery changes."""
+    version = face_store.version()
+    if _profiles["version"] != version:
+        _profiles["version"], _profiles["by_student"] = version, {}
+    key = (student_id, base)
+    if key not in _profiles["by_student"]:
+        vecs = face_index.vectors_of(student_id)
+        centroid = vecs.mean(axis=0) if len(vecs) else None
+        thr = base
+        if len(vecs) >= ADAPT_MIN_SAMPLES:
+            spread = float(np.linalg.norm(vecs - centroid, axis=1).mean())
+            thr = float(np.clip(ADAPT_SCALE * spread, base - MAX_TIGHTEN, base + MAX_LOOSEN))
+        _profiles["by_student"][key] = (thr, centroid)
+    return _profiles["by_student"][key]
 
 def _face_confidence(face_distance: float, threshold: float) -> float:
     rng = (1.0 - threshold)
     return round(((1.0 - face_distance) / (rng * 2.0)) * 100, 2)
 
-# ---------- main API (returns dict) ----------
-def verify_face(threshold: float = 0.5, camera_index: int = 0, timeout_sec: int = 10):
-    """
-    Opens the camera, looks for a single face, compares to known encodings,
-    returns a JSON-serializable dict. Captures until a face is seen or timeout.
-    """
-    if not known_encodings:
+# ---------- decisions on an encoding ----------
+def match_student(student_id: str, enc, threshold: float = 0.5) -> dict:
+    """1:1 — compare an encoding only against `student_id`'s own gallery."""
+    face_index.sync()
+    if student_id not in face_index:
+        return {"ok": False, "name": "Unknown", "confidence": 0.0,
+                "message": "No registered face for this student. Please register first."}
+
+    thr, centroid = _profile(student_id, threshold)
+    dist = float(np.linalg.norm(np.asarray(enc, dtype=np.float32) - centroid))
+    if dist > thr * EARLY_ACCEPT:
+        dist = float(face_index.distances_to(student_id, enc).min())
+
+    ok = dist <= thr
+    return {"ok": ok, "name": student_id if ok else "Unknown",
+            "confidence": _face_confidence(dist, thr), "distance": round(dist, 4),
+            "threshold": round(thr, 4),
+            "message": "Face Verified." if ok else "Face Mismatch."}
+
+def identify_encoding(enc, threshold: float = 0.5) -> dict:
+    """1:N — nearest enrolled student over the whole gallery."""
+    face_index.sync()
+    if not len(face_index):
         return {"ok": False, "name": "Unknown", "confidence": 0.0,
                 "message": "No registered faces found. Please register first."}
-
+    searcher = face_ann if face_ann is not None and len(face_index) >= ANN_MIN_ROWS else face_index
+    best, dist = searcher.nearest(enc)
+    ok = dist <= threshold
+    return {"ok": ok, "name": best if ok else "Unknown",
+            "confidence": _face_confidence(dist, threshold), "distance": round(dist, 4),
+            "message": "Face Identified." if ok else "Face Mismatch."}
+
+# ---------- camera capture ----------
+def _capture_encoding(camera_index: int = 0, timeout_sec: int = 10):
+    """
+    Opens the camera and returns (encoding, message, stage timings in ms) for
+    the biggest face seen before timeout; encoding is None when no usable
+    face was found.
+    """
     cap = cv2.VideoCapture(camera_index)
     if not cap.isOpened():
-        return {"ok": False, "name": "Unknown", "confidence": 0.0,
-                "message": "Cannot access camera."}
+        return None, "Cannot access camera.", {}
 
+    pipe = FramePipeline()
     t0 = time.time()
-    name, conf, msg = "Unknown", 0.0, "No face detected."
-    ok = False
-
     try:
         while time.time() - t0 < timeout_sec:
             ret, frame = cap.read()
             if not ret:
-                msg = "Failed to read frame."
-                break
+                return None, "Failed to read frame.", pipe.timings_ms()
 
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            boxes = fr.face_locations(rgb)
-
-            if not boxes:
+            enc = pipe.process(frame)
+            if enc is None:
                 cv2.waitKey(1)
                 continue
+            return enc, "Face captured.", pipe.timings_ms()
 
-            # use the biggest face in frame
-            box = max(boxes, key=lambda b: (b[2]-b[0]) * (b[1]-b[3]))  # (top,right,bottom,left)
-            encs = fr.face_encodings(rgb, [box])
-            if not encs:
-                msg = "Face found but encoding failed."
-                break
-
-            enc = encs[0]
-            dists = fr.face_distance(known_encodings, enc)
-            j = int(np.argmin(dists))
-            if dists[j] <= threshold:
-                name = known_names[j]
-                conf = _face_confidence(dists[j], threshold)
-                ok, msg = True, "Face Verified."
-            else:
-                conf = _face_confidence(dists[j], threshold)
-                msg = "Face Mismatch."
-
-            break  # we got a decision (match or not)
-
-        return {"ok": ok, "name": name, "confidence": conf, "message": msg}
+        return None, "No face detected.", pipe.timings_ms()
     finally:
         cap.release()
         cv2.destroyAllWindows()
 
-def register_face(student_id: str, camera_index: int = 0, timeout_sec: int = 10):
+# ---------- main API (returns dict) ----------
+def verify_face(student_id: str, threshold: float = 0.5, camera_index: int = 0, timeout_sec: int = 10):
     """
-    Captures a face from webcam and saves its encoding under face_data/<student_id>/.
+    1:1 verification: captures one face and checks it against the given
+    student's own embeddings using their adaptive threshold.
+    Returns a JSON-serializable dict.
     """
-    cap = cv2.VideoCapture(camera_index)
-    if not cap.isOpened():
-        return {"ok": False, "message": "Cannot access camera."}
-
-    t0 = time.time()
-    try:
-        while time.time() - t0 < timeout_sec:
-            ret, frame = cap.read()
-            if not ret:
-                return {"ok": False, "message": "Failed to read frame."}
-
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            boxes = fr.face_locations(rgb)
-            if not boxes:
-                cv2.waitKey(1)
-                continue
-
-            box = max(boxes, key=lambda b: (b[2]-b[0]) * (b[1]-b[3]))
-            encs = fr.face_encodings(rgb, [box])
-            if not encs:
-                return {"ok": False, "message": "Face found but encoding failed."}
-
-            enc = encs[0]
-            out_dir = os.path.join(DATA_DIR, student_id)
-            os.makedirs(out_dir, exist_ok=True)
-            out_path = os.path.join(out_dir, f"{int(time.time())}.npy")
-            np.save(out_path, enc)
-
-            # also update in-memory cache so it's available immediately
-            known_encodings.append(enc)
-            known_names.append(student_id)
+    with metrics.timed("face.verify"):
+        face_index.sync()
+        if student_id not in face_index:
+            result = {"ok": False, "name": "Unknown", "confidence": 0.0,
+                      "message": "No registered face for this student. Please register first."}
+        else:
+            enc, msg, timings = _capture_encoding(camera_index, timeout_sec)
+            result = match_student(student_id, enc, threshold) if enc is not None else \
+                {"ok": False, "name": "Unknown", "confidence": 0.0, "message": msg}
+            result["timings_ms"] = timings
+    metrics.incr("face.verify.ok" if result["ok"] else "face.verify.fail")
+    return result
+
+def identify_face(threshold: float = 0.5, camera_index: int = 0, timeout_sec: int = 10):
+    """
+    1:N identification: captures one face and returns the nearest enrolled
+    student. Costs O(gallery) per call, so it is metered separately.
+    """
+    with metrics.timed("face.identify"):
+        face_index.sync()
+        if not len(face_index):
+            result = {"ok": False, "name": "Unknown", "confidence": 0.0,
+                      "message": "No registered faces found. Please register first."}
+        else:
+            enc, msg, timings = _capture_encoding(camera_index, timeout_sec)
+            result = identify_encoding(enc, threshold) if enc is not None else \
+                {"ok": False, "name": "Unknown", "confidence": 0.0, "message": msg}
+            result["timings_ms"] = timings
+    metrics.incr("face.identify.ok" if result["ok"] else "face.identify.fail")
+    metrics.gauge("face.identify.gallery_rows", len(face_index))
+    return result
 
-            return {"ok": True, "message": "Face registered.", "path": out_path}
+def register_face(student_id: str, camera_index: int = 0, timeout_sec: int = 10):
+    """
+    Captures a face from webcam and appends its encoding to the face store.
+    """
+    enc, msg, _ = _capture_encoding(camera_index, timeout_sec)
+    if enc is None:
+        return {"ok": False, "message": "Timed out waiting for a face." if msg == "No face detected." else msg}
 
-        return {"ok": False, "message": "Timed out waiting for a face."}
-    finally:
-        cap.release()
-        cv2.destroyAllWindows()
+    # writes through to the store; other workers pick it up on their next sync
+    face_index.add(student_id, [enc])
+    return {"ok": True, "message": "Face registered.", "path": face_store.root}
@@ -0,0 +1,275 @@
+"""
+Packed face embedding store.
+
+All enrolled encodings live in two flat files under face_store/:
+
+    embeddings.f32   raw float32 rows, `dim` values each
+    index.rec        one fixed-size record per row: student id, sample
+                     number, timestamp and an alive flag
+    .generation      two int64 counters shared by every process that maps
+                     the store: [generation, epoch]
+
+Both are opened with np.memmap, so opening the store costs the same for
+ten students or ten thousand. Appends write the embedding row first and the
+index record last, so a reader never sees a record without its vector.
+Deletes only clear the alive flag (tombstone); `compact` rewrites the files
+without dead rows and is meant to be run offline.
+
+Every write bumps `generation`; `compact` also bumps `epoch` because it
+renumbers rows. Readers compare the counters against what they last saw
+(see SharedFaceIndex.sync) and only then remap the files.
+
+Usage:
+    python face_store.py migrate [--data-dir face_data] [--store-dir face_store]
+    python face_store.py compact [--store-dir face_store]
+    python face_store.py stats   [--store-dir face_store]
+"""
+import os
+import time
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:          # Windows: single-process dev server, no locking
+    fcntl = None
+
+# ---------- paths ----------
+BASE_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(BASE_DIR, "face_data")      # legacy one-file-per-embedding tree
+STORE_DIR = os.path.join(BASE_DIR, "face_store")
+
+DIM = 128
+RECORD = np.dtype([
+    ("student", "S64"),   # utf-8 student id
+    ("sample", "<i4"),
+    ("ts", "<f8"),
+    ("alive", "u1"),
+])
+
+
+class FaceStore:
+    def __init__(self, root: str = STORE_DIR, dim: int = DIM):
+        self.root = root
+        self.dim = dim
+        self.vec_path = os.path.join(root, "embeddings.f32")
+        self.idx_path = os.path.join(root, "index.rec")
+        self.lock_path = os.path.join(root, ".lock")
+        self.gen_path = os.path.join(root, ".generation")
+        os.makedirs(root, exist_ok=True)
+        for path in (self.vec_path, self.idx_path):
+            if not os.path.exists(path):
+                open(path, "ab").close()
+        with self._locked():
+            if not os.path.exists(self.gen_path) or os.path.getsize(self.gen_path) < 16:
+                with open(self.gen_path, "wb") as f:
+                    f.write(np.zeros(2, dtype="<i8").tobytes())
+        self._gen = np.memmap(self.gen_path, dtype="<i8", mode="r+", shape=(2,))
+        self.refresh()
+
+    # ---------- mapping ----------
+    def refresh(self):
+        """(Re)map the files; picks up rows appended by other processes."""
+        n = os.path.getsize(self.idx_path) // RECORD.itemsize
+        if n == 0:
+            self.records = np.zeros(0, dtype=RECORD)
+            self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        else:
+            self.records = np.memmap(self.idx_path, dtype=RECORD, mode="r", shape=(n,))
+            self.vectors = np.memmap(self.vec_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+        return n
+
+    def __len__(self):
+        return len(self.records)
+
+    def version(self):
+        """(generation, epoch) as last written by any process."""
+        return int(self._gen[0]), int(self._gen[1])
+
+    def _bump(self, epoch: bool = False):
+        self._gen[0] += 1
+        if epoch:
+            self._gen[1] += 1
+        self._gen.flush()
+
+    @property
+    def live(self) -> np.ndarray:
+        return self.records["alive"].astype(bool)
+
+    def live_count(self) -> int:
+        return int(np.count_nonzero(self.records["alive"]))
+
+    def student_ids(self) -> np.ndarray:
+        """Student id of every row, decoded to str."""
+        return np.char.decode(self.records["student"], "utf-8")
+
+    def rows_of(self, student_id: str) -> np.ndarray:
+        mask = (self.records["student"] == _key(student_id)) & (self.records["alive"] == 1)
+        return np.flatnonzero(mask)
+
+    # ---------- writes ----------
+    def append(self, student_id: str, encodings, ts: float = None):
+        """Append encodings for a student. Returns the new row ids."""
+        encs = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        return self.append_many([student_id] * len(encs), encs, ts=ts)
+
+    def append_many(self, student_ids, encodings, ts: float = None):
+        """
+        Bulk append: one encoding per entry of `student_ids`, any mix of students,
+        written with a single write + fsync per file. Returns the new row ids.
+        """
+        encs = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        if not len(encs):
+            return []
+        keys = np.array([_key(s) for s in student_ids], dtype=RECORD["student"])
+        if len(keys) != len(encs):
+            raise ValueError("student_ids and encodings differ in length")
+
+        with self._locked():
+            start = self.refresh()
+
+            # sample numbers continue per student after what is already stored
+            existing, counts = np.unique(self.records["student"], return_counts=True)
+            seen = dict(zip(existing.tolist(), counts.tolist()))
+            samples = np.empty(len(keys), dtype=np.int32)
+            for i, key in enumerate(keys.tolist()):
+                samples[i] = seen.get(key, 0)
+                seen[key] = samples[i] + 1
+
+            recs = np.zeros(len(encs), dtype=RECORD)
+            recs["student"] = keys
+            recs["sample"] = samples
+            recs["ts"] = time.time() if ts is None else ts
+            recs["alive"] = 1
+
+            with open(self.vec_path, "r+b") as f:
+                f.seek(start * self.dim * 4)      # drop any torn tail of a crashed append
+                f.write(encs.tobytes())
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.idx_path, "r+b") as f:
+                f.seek(start * RECORD.itemsize)   # same for a partial record
+                f.write(recs.tobytes())
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._bump()
+            self.refresh()
+        return list(range(start, start + len(encs)))
+
+    def delete(self, student_id: str) -> int:
+        """Tombstone every live row of a student. Returns how many rows were hit."""
+        with self._locked():
+            self.refresh()
+            rows = self.rows_of(student_id)
+            if len(rows):
+                recs = np.memmap(self.idx_path, dtype=RECORD, mode="r+", shape=(len(self.records),))
+                recs["alive"][rows] = 0
+                recs.flush()
+                del recs
+                self._bump()
+        return len(rows)
+
+    def replace(self, student_id: str, encodings):
+        """Re-enrollment: tombstone old rows, append the new ones."""
+        self.delete(student_id)
+        return self.append(student_id, encodings)
+
+    # ---------- maintenance ----------
+    def compact(self) -> int:
+        """Rewrite both files without tombstoned rows. Run offline. Returns rows dropped."""
+        with self._locked():
+            self.refresh()
+            keep = np.flatnonzero(self.records["alive"])
+            dropped = len(self.records) - len(keep)
+            if not dropped:
+                return 0
+
+            vecs = np.ascontiguousarray(self.vectors[keep])
+            recs = np.array(self.records[keep])
+            self.records = self.vectors = None        # release the old mappings
+            for path, data in ((self.vec_path, vecs), (self.idx_path, recs)):
+                tmp = path + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, path)
+            self._bump(epoch=True)
+            self.refresh()
+        return dropped
+
+    @contextmanager
+    def _locked(self):
+        """Serialize writers across processes (gunicorn workers, CLI)."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _key(student_id) -> bytes:
+    key = str(student_id).encode("utf-8")
+    if len(key) > RECORD["student"].itemsize:
+        raise ValueError(f"student id too long for the face store: {student_id!r}")
+    return key
+
+
+# ---------- migration from face_data/<student>/*.npy ----------
+def migrate_tree(data_dir: str = DATA_DIR, store: FaceStore = None) -> dict:
+    """Pack the legacy per-file tree into a store. Students already in the store are skipped."""
+    if store is None:
+        store = FaceStore()
+    known = set(store.student_ids()[store.live]) if len(store) else set()
+    migrated, skipped = {}, []
+
+    for person in sorted(os.listdir(data_dir)) if os.path.isdir(data_dir) else []:
+        person_dir = os.path.join(data_dir, person)
+        if not os.path.isdir(person_dir):
+            continue
+        if person in known:
+            skipped.append(person)
+            continue
+        encs, newest = [], 0.0
+        for file in sorted(os.listdir(person_dir)):
+            if not file.endswith(".npy"):
+                continue
+            path = os.path.join(person_dir, file)
+            try:
+                encs.append(np.load(path))
+                newest = max(newest, os.path.getmtime(path))
+            except Exception:
+                pass  # skip corrupt files
+        if encs:
+            store.append(person, encs, ts=newest)
+            migrated[person] = len(encs)
+
+    return {"migrated": migrated, "skipped": skipped}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=["migrate", "compact", "stats"])
+    ap.add_argument("--data-dir", default=DATA_DIR)
+    ap.add_argument("--store-dir", default=STORE_DIR)
+    args = ap.parse_args()
+
+    store = FaceStore(args.store_dir)
+    if args.command == "migrate":
+        out = migrate_tree(args.data_dir, store)
+        for person, n in out["migrated"].items():
+            print(f"[Migrated] {person}: {n} embeddings")
+        for person in out["skipped"]:
+            print(f"[Skipped]  {person}: already in store")
+    elif args.command == "compact":
+        print(f"Dropped {store.compact()} tombstoned rows.")
+    print(f"{store.live_count()} live / {len(store)} total rows in {store.root}")
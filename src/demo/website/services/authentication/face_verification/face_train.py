@@ -1,22 +1,19 @@
 import cv2
-import os
-import numpy as np
 import face_recognition
 from cvzone.FaceMeshModule import FaceMeshDetector
-from blink_detection import is_blinking
+from blink_detection import LivenessDetector
+from face_store import FaceStore
 
-# Create user directory for storing embeddings
+# Embeddings go to the packed store (face_store/)
 name = input("Enter your name: ").strip()
-save_dir = os.path.join(os.path.dirname(__file__), f"face_data/{name}")
-os.makedirs(save_dir, exist_ok=True)
+store = FaceStore()
 
 cap = cv2.VideoCapture(0)
 detector = FaceMeshDetector(maxFaces=1)
 
 count = 0
 max_embeddings = 20
-ratio_list = []
-blink_counter = 0
+liveness = LivenessDetector()
 capture_ready = False
 
 print("Blink once, then open eyes to capture embedding... (ESC to quit)")
@@ -30,9 +27,7 @@ while True:
 
     if faces:
         face = faces[0]
-        blink, ratio_list, blink_counter = is_blinking(face, detector, ratio_list, blink_counter)
-
-        if blink:
+        if liveness.update(face):
             capture_ready = True
         elif capture_ready:
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -41,9 +36,8 @@ while True:
             if boxes:
                 encodings = face_recognition.face_encodings(rgb_frame, boxes)
                 for encoding in encodings:
-                    npy_path = os.path.join(save_dir, f"face_{count}.npy")
-                    np.save(npy_path, encoding)
-                    print(f"[Saved] {npy_path}")
+                    store.append(name, [encoding])
+                    print(f"[Saved] {name} sample {count}")
 
                     count += 1
                     capture_ready = False
@@ -0,0 +1,129 @@
+"""
+Face verification on frames uploaded by the browser.
+
+The client grabs a short burst of JPEG/WebP frames from getUserMedia and
+posts them as multipart `frames`; nothing touches a camera on the server.
+Frames are decoded in memory, downscaled to the requested size and run
+through a FramePipeline one at a time (so the face box found in one frame
+is tracked into the next), stopping at the first frame that gives a
+confident decision.
+"""
+import cv2
+import numpy as np
+from . import face_recog
+from .pipeline import FramePipeline
+from ... import metrics
+
+# hard server-side caps; the client may only ask for less
+MAX_FRAMES = 15
+MAX_FRAME_BYTES = 512 * 1024
+MAX_SIDE = 1280
+
+REJECT_MARGIN = 0.08   # distance this far above the threshold is a confident "no"
+
+
+class FrameError(ValueError):
+    """Upload rejected before any face work was done."""
+
+
+def frame_limits(form) -> dict:
+    """Client-requested limits from the form, clamped to the server caps."""
+    def _int(name, cap):
+        try:
+            v = int(form.get(name, cap))
+        except (TypeError, ValueError):
+            v = cap
+        return max(1, min(v, cap))
+
+    return {
+        "max_frames": _int("max_frames", MAX_FRAMES),
+        "max_bytes": _int("max_bytes", MAX_FRAME_BYTES),
+        "max_side": _int("max_side", MAX_SIDE),
+    }
+
+
+def decode_frame(data: bytes, max_side: int = MAX_SIDE):
+    """JPEG/WebP bytes -> BGR ndarray (downscaled so the long side <= max_side), or None."""
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    h, w = img.shape[:2]
+    scale = max_side / float(max(h, w))
+    if scale < 1.0:
+        img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    return img
+
+
+def read_frames(files, max_frames: int = MAX_FRAMES, max_bytes: int = MAX_FRAME_BYTES, **_):
+    """Uploaded files (werkzeug FileStorage or raw bytes) -> list of bytes, caps applied."""
+    if not files:
+        raise FrameError("No frames uploaded.")
+    if len(files) > max_frames:
+        raise FrameError(f"Too many frames (max {max_frames}).")
+
+    out = []
+    for f in files:
+        data = f if isinstance(f, (bytes, bytearray)) else f.read(max_bytes + 1)
+        if len(data) > max_bytes:
+            raise FrameError(f"Frame too large (max {max_bytes} bytes).")
+        out.append(bytes(data))
+    return out
+
+
+def iter_frames(files, max_frames: int = MAX_FRAMES, max_bytes: int = MAX_FRAME_BYTES,
+                max_side: int = MAX_SIDE):
+    """Lazily decode uploaded files (werkzeug FileStorage or raw bytes)."""
+    for data in read_frames(files, max_frames, max_bytes):
+        img = decode_frame(data, max_side)
+        if img is not None:
+            yield img
+
+
+def encode_frame(bgr, pipe: FramePipeline = None):
+    """Encoding of the biggest face in a BGR frame, or None."""
+    return (pipe or FramePipeline(detect_every=1)).process(bgr)
+
+
+def _confident(result: dict) -> bool:
+    if result["ok"]:
+        return True
+    thr = result.get("threshold")
+    return thr is not None and result.get("distance", 0.0) > thr + REJECT_MARGIN
+
+
+def verify_frames(student_id: str, files, threshold: float = 0.5, **limits) -> dict:
+    """1:1 verification over an uploaded burst; stops at the first confident frame."""
+    result = {"ok": False, "name": "Unknown", "confidence": 0.0, "message": "No face detected."}
+    used, pipe = 0, FramePipeline()
+    with metrics.timed("face.verify"):
+        for img in iter_frames(files, **limits):
+            used += 1
+            enc = pipe.process(img)
+            if enc is None:
+                continue
+            result = face_recog.match_student(student_id, enc, threshold)
+            if _confident(result):
+                break
+    metrics.incr("face.verify.ok" if result["ok"] else "face.verify.fail")
+    metrics.incr("face.frames_decoded", used)
+    result["frames_used"] = used
+    result["timings_ms"] = pipe.timings_ms()
+    return result
+
+
+def identify_frames(files, threshold: float = 0.5, **limits) -> dict:
+    """1:N identification over an uploaded burst; first frame with a face decides."""
+    result = {"ok": False, "name": "Unknown", "confidence": 0.0, "message": "No face detected."}
+    used, pipe = 0, FramePipeline()
+    with metrics.timed("face.identify"):
+        for img in iter_frames(files, **limits):
+            used += 1
+            enc = pipe.process(img)
+            if enc is not None:
+                result = face_recog.identify_encoding(enc, threshold)
+                break
+    metrics.incr("face.identify.ok" if result["ok"] else "face.identify.fail")
+    metrics.incr("face.frames_decoded", used)
+    result["frames_used"] = used
+    result["timings_ms"] = pipe.timings_ms()
+    return result
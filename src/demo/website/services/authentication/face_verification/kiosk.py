@@ -0,0 +1,197 @@
+"""
+Kiosk mode for a shared classroom check-in terminal.
+
+One long-lived thread owns the camera and keeps the newest frames in a
+ring buffer, so the open / warm-up / release cost is paid once instead of
+once per student. Check-in requests read frames from the buffer and run
+1:N identification back to back.
+
+The capture thread lives in the process that started it: run the kiosk
+app with a single worker (gunicorn -w 1 --threads N).
+"""
+import threading
+import time
+from collections import deque
+import cv2
+from . import face_recog
+from .pipeline import FramePipeline
+from ... import metrics
+
+
+class FrameRing:
+    """Fixed-size buffer of (seq, timestamp, frame); readers wait on new frames."""
+
+    def __init__(self, size: int = 30):
+        self._frames = deque(maxlen=size)
+        self._cond = threading.Condition()
+        self.seq = 0
+
+    def put(self, frame):
+        with self._cond:
+            self.seq += 1
+            self._frames.append((self.seq, time.time(), frame))
+            self._cond.notify_all()
+
+    def after(self, seq: int, timeout: float = None):
+        """Frames newer than `seq`, waiting up to `timeout` for at least one."""
+        with self._cond:
+            if timeout:
+                self._cond.wait_for(lambda: self.seq > seq, timeout)
+            return [item for item in self._frames if item[0] > seq]
+
+    def __len__(self):
+        return len(self._frames)
+
+
+class Kiosk:
+    def __init__(self, camera_index: int = 0, buffer_size: int = 30, threshold: float = 0.5,
+                 lookback_sec: float = 0.5, repeat_cooldown_sec: float = 30.0):
+        self.camera_index = camera_index
+        self.threshold = threshold
+        self.lookback_sec = lookback_sec                 # frames older than this are stale
+        self.repeat_cooldown_sec = repeat_cooldown_sec   # same student twice in a row
+        self.ring = FrameRing(buffer_size)
+        self.pipe = FramePipeline()
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._checkin_lock = threading.Lock()
+        self._pending_lock = threading.Lock()            # guards _pending (requests queued on the check-in lock)
+        self._consumed_seq = 0
+        self._pending = 0
+        self._checkins = deque()                         # timestamps of successful check-ins
+        self._last_seen = {}                             # student id -> last check-in time
+        self.checkins_total = 0
+        self.started_at = None
+        self.error = None
+
+    # ---------- capture thread ----------
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._capture_loop, name="kiosk-capture", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _capture_loop(self):
+        cap = cv2.VideoCapture(self.camera_index)
+        if not cap.isOpened():
+            self.error = "Cannot access camera."
+            return
+        self.error, self.started_at = None, time.time()
+        try:
+            while not self._stop.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    self.error = "Failed to read frame."
+                    time.sleep(0.05)
+                    continue
+                self.ring.put(frame)
+        finally:
+            cap.release()
+
+    # ---------- check-in ----------
+    def check_in(self, timeout_sec: float = 5.0) -> dict:
+        """Identify the student currently in front of the camera."""
+        if not self.running:
+            return {"ok": False, "name": "Unknown", "confidence": 0.0, "message": "Kiosk is not running."}
+
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            with self._checkin_lock, metrics.timed("face.kiosk.checkin"):
+                return self._check_in(timeout_sec)
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
+
+    def _check_in(self, timeout_sec: float) -> dict:
+        result = {"ok": False, "name": "Unknown", "confidence": 0.0, "message": "No face detected."}
+        deadline = time.time() + timeout_sec
+        last = self._consumed_seq
+        self.pipe.reset()
+
+        while time.time() < deadline:
+            items = self.ring.after(last, timeout=deadline - time.time())
+            fresh = time.time() - self.lookback_sec
+            for seq, ts, frame in items:
+                last = seq
+                if ts < fresh:
+                    continue
+                enc = self.pipe.process(frame)
+                if enc is None:
+                    continue
+                result = face_recog.identify_encoding(enc, self.threshold)
+                if not result["ok"]:
+                    continue
+
+                now = time.time()
+                self._consumed_seq = last
+                prev = self._last_seen.get(result["name"])
+                if prev is not None and now - prev < self.repeat_cooldown_sec:
+                    result.update(ok=False, message="Already checked in.")
+                    return result
+                self._last_seen[result["name"]] = now
+                self._checkins.append(now)
+                self.checkins_total += 1
+                metrics.incr("face.kiosk.checkins")
+                return result
+
+        self._consumed_seq = last
+        return result
+
+    # ---------- stats ----------
+    def stats(self) -> dict:
+        now = time.time()
+        while self._checkins and now - self._checkins[0] > 60.0:
+            self._checkins.popleft()
+        depth = min(self.ring.seq - self._consumed_seq, len(self.ring))
+        out = {
+            "running": self.running,
+            "error": self.error,
+            "frames_captured": self.ring.seq,
+            "capture_fps": round(self.ring.seq / (now - self.started_at), 1) if self.started_at else 0.0,
+            "queue_depth": depth,
+            "pending_checkins": self._pending,
+            "students_per_minute": len(self._checkins),
+            "checkins_total": self.checkins_total,
+        }
+        metrics.gauge("face.kiosk.queue_depth", depth)
+        metrics.gauge("face.kiosk.students_per_minute", out["students_per_minute"])
+        return out
+
+
+# ---------- process-wide kiosk ----------
+_kiosk = None
+_kiosk_lock = threading.Lock()
+
+
+def start_kiosk(camera_index: int = 0, **kwargs) -> Kiosk:
+    global _kiosk
+    with _kiosk_lock:
+        if _kiosk is None or _kiosk.camera_index != camera_index:
+            if _kiosk is not None:
+                _kiosk.stop()
+            _kiosk = Kiosk(camera_index, **kwargs)
+        _kiosk.start()
+        return _kiosk
+
+
+def stop_kiosk():
+    with _kiosk_lock:
+        if _kiosk is not None:
+            _kiosk.stop()
+
+
+def get_kiosk() -> Kiosk:
+    return _kiosk
@@ -0,0 +1,136 @@
+"""
+Per-frame face pipeline: convert -> locate -> encode, with the cheap paths first.
+
+Locating a face uses, in order of preference:
+  1. a region handed in by the caller (e.g. the MediaPipe face-mesh bbox),
+  2. tracking: for up to `detect_every - 1` frames the face is re-detected only
+     inside the previous box enlarged by `track_margin`, so a moving face is
+     followed at a fraction of the cost; no face there falls through to 3,
+  3. HOG/CNN detection on a downscaled copy, boxes mapped back to full size.
+
+Encoding always runs on the full-resolution frame. Every stage is timed;
+`last_timings` holds the latest frame and totals go to services.metrics.
+"""
+import os
+import time
+import cv2
+import numpy as np
+import face_recognition as fr
+from ... import metrics
+
+# defaults, overridable per deployment
+DETECT_SCALE = float(os.getenv("FACE_DETECT_SCALE", "0.5"))
+DETECT_EVERY = int(os.getenv("FACE_DETECT_EVERY", "5"))
+DETECT_MODEL = os.getenv("FACE_DETECT_MODEL", "hog")      # "hog" or "cnn"
+TRACK_MARGIN = float(os.getenv("FACE_TRACK_MARGIN", "0.5"))  # search area around the last box, per side
+
+
+def landmark_box(landmarks, shape, pad: float = 0.15):
+    """
+    Face-mesh landmarks ([[x, y], ...] in pixels) -> padded
+    (top, right, bottom, left) box clipped to the frame.
+    """
+    xs = [p[0] for p in landmarks]
+    ys = [p[1] for p in landmarks]
+    left, right, top, bottom = min(xs), max(xs), min(ys), max(ys)
+    px, py = (right - left) * pad, (bottom - top) * pad
+    h, w = shape[:2]
+    return (max(0, int(top - py)), min(w - 1, int(right + px)),
+            min(h - 1, int(bottom + py)), max(0, int(left - px)))
+
+
+def _area(box):
+    return (box[2] - box[0]) * (box[1] - box[3])   # (top,right,bottom,left)
+
+
+class FramePipeline:
+    def __init__(self, scale: float = DETECT_SCALE, detect_every: int = DETECT_EVERY,
+                 model: str = DETECT_MODEL, upsample: int = 1, num_jitters: int = 1,
+                 landmark_model: str = "small", track_margin: float = TRACK_MARGIN):
+        self.scale = scale
+        self.detect_every = max(1, detect_every)
+        self.track_margin = track_margin
+        self.model = model
+        self.upsample = upsample
+        self.num_jitters = num_jitters
+        self.landmark_model = landmark_model
+        self.last_timings = {}
+        self.totals = {}
+        self.reset()
+
+    def reset(self):
+        """Forget the tracked box (new subject / new camera session)."""
+        self._box = None
+        self._since_detect = 0
+
+    # ---------- stages ----------
+    def _timed(self, stage, fn, *args):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        dt = time.perf_counter() - t0
+        self.last_timings[stage] = round(dt * 1000.0, 3)
+        self.totals[stage] = self.totals.get(stage, 0.0) + dt
+        metrics.observe(f"face.stage.{stage}", dt)
+        return out
+
+    def detect(self, rgb):
+        """Biggest face box in full-resolution coordinates, detected on a downscaled copy."""
+        small = np.ascontiguousarray(rgb)
+        if self.scale < 1.0:
+            small = cv2.resize(rgb, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        boxes = fr.face_locations(small, number_of_times_to_upsample=self.upsample, model=self.model)
+        if not boxes:
+            return None
+        t, r, b, l = max(boxes, key=_area)
+        k = 1.0 / self.scale if self.scale < 1.0 else 1.0
+        return int(t * k), int(r * k), int(b * k), int(l * k)
+
+    def track(self, rgb, box):
+        """The face near its previous `box`: detect() on an enlarged crop around it, or None."""
+        t, r, b, l = box
+        h, w = rgb.shape[:2]
+        my, mx = int((b - t) * self.track_margin), int((r - l) * self.track_margin)
+        top, left = max(0, t - my), max(0, l - mx)
+        found = self.detect(rgb[top:min(h, b + my), left:min(w, r + mx)])
+        if found is None:
+            return None
+        return tuple(v + off for v, off in zip(found, (top, left, top, left)))
+
+    def locate(self, rgb, roi=None):
+        """(box, source) where source is 'roi', 'track' or 'detect'; box may be None."""
+        if roi is not None:
+            self._box, self._since_detect = roi, 0
+            return roi, "roi"
+        if self._box is not None and self._since_detect < self.detect_every - 1:
+            box = self._timed("track", self.track, rgb, self._box)
+            if box is not None:
+                self._box, self._since_detect = box, self._since_detect + 1
+                return box, "track"
+            # lost it (moved too far, or gone): full-frame detect below
+        box = self._timed("detect", self.detect, rgb)
+        self._box, self._since_detect = box, 0
+        return box, "detect"
+
+    def encode(self, rgb, box):
+        encs = fr.face_encodings(rgb, [box], num_jitters=self.num_jitters, model=self.landmark_model)
+        return encs[0] if encs else None
+
+    # ---------- one frame ----------
+    def process(self, bgr, roi=None):
+        """Encoding of the face in a BGR frame, or None. `roi` is an optional (t,r,b,l) box."""
+        self.last_timings = {}
+        rgb = self._timed("convert", cv2.cvtColor, bgr, cv2.COLOR_BGR2RGB)
+
+        box, source = self.locate(rgb, roi)
+        self.last_timings["source"] = source
+        if box is None:
+            return None
+
+        enc = self._timed("encode", self.encode, rgb, box)
+        if enc is None:
+            self.reset()
+        return enc
+
+    def timings_ms(self) -> dict:
+        """Accumulated time per stage over this pipeline's lifetime."""
+        return {k: round(v * 1000.0, 3) for k, v in self.totals.items()}
@@ -0,0 +1,121 @@
+"""
+Speech-to-text backends for phrase checking.
+
+Every backend takes the float32 signal verification already holds and
+returns lower-case text. "Nothing intelligible" is "", and a backend that
+cannot answer (network down, model missing, timeout) raises ASRError, so
+callers can tell "wrong phrase" apart from "could not check".
+
+    google   Google Web Speech through speech_recognition (network, per-call timeout)
+    vosk     local offline Kaldi model; needs `pip install vosk` and a model
+             directory in SPEECH_ASR_VOSK_MODEL
+    mock     fixed answer, for benchmarks and tests
+
+Pick one with SPEECH_ASR_BACKEND (default: google).
+"""
+import json
+import os
+import time
+import threading
+import speech_recognition as sr
+from . import audio
+
+try:
+    import vosk
+except ImportError:          # optional: only needed for the offline backend
+    vosk = None
+
+ASR_BACKEND = os.getenv("SPEECH_ASR_BACKEND", "google")
+VOSK_MODEL_DIR = os.getenv("SPEECH_ASR_VOSK_MODEL", "")
+
+
+class ASRError(RuntimeError):
+    """The backend could not produce a transcript."""
+
+
+class ASRBackend:
+    name = "base"
+
+    def transcribe(self, y, fs: int = audio.SAMPLE_RATE, timeout: float = None) -> str:
+        raise NotImplementedError
+
+
+class GoogleASR(ASRBackend):
+    name = "google"
+
+    def __init__(self, language: str = "en-US"):
+        self.language = language
+
+    def transcribe(self, y, fs: int = audio.SAMPLE_RATE, timeout: float = None) -> str:
+        r = sr.Recognizer()
+        r.operation_timeout = timeout          # socket timeout for the HTTP call
+        data = sr.AudioData(audio.to_pcm16(y), fs, 2)
+        try:
+            return r.recognize_google(data, language=self.language).lower()
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError as e:
+            raise ASRError(f"Google speech request failed: {e}")
+
+
+class VoskASR(ASRBackend):
+    name = "vosk"
+
+    def __init__(self, model_dir: str = VOSK_MODEL_DIR):
+        if vosk is None:
+            raise ASRError("vosk is not installed (pip install vosk).")
+        if not model_dir or not os.path.isdir(model_dir):
+            raise ASRError(f"Vosk model directory not found: {model_dir!r}")
+        self.model_dir = model_dir
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                vosk.SetLogLevel(-1)
+                self._model = vosk.Model(self.model_dir)
+        return self._model
+
+    def transcribe(self, y, fs: int = audio.SAMPLE_RATE, timeout: float = None) -> str:
+        # runs locally; the caller's deadline bounds how long it waits for us
+        rec = vosk.KaldiRecognizer(self._get_model(), fs)
+        rec.AcceptWaveform(audio.to_pcm16(y))
+        return json.loads(rec.FinalResult()).get("text", "").lower()
+
+
+class MockASR(ASRBackend):
+    name = "mock"
+
+    def __init__(self, text: str = "", delay: float = 0.0, error: str = None):
+        self.text = text
+        self.delay = delay
+        self.error = error
+
+    def transcribe(self, y, fs: int = audio.SAMPLE_RATE, timeout: float = None) -> str:
+        if self.delay:
+            time.sleep(self.delay if timeout is None else min(self.delay, timeout))
+        if self.error:
+            raise ASRError(self.error)
+        return self.text.lower()
+
+
+BACKENDS = {"google": GoogleASR, "vosk": VoskASR, "mock": MockASR}
+
+_backend = None
+
+
+def get_backend() -> ASRBackend:
+    """Process-wide backend chosen by SPEECH_ASR_BACKEND."""
+    global _backend
+    if _backend is None:
+        if ASR_BACKEND not in BACKENDS:
+            raise ASRError(f"Unknown SPEECH_ASR_BACKEND {ASR_BACKEND!r} (choose from {sorted(BACKENDS)})")
+        _backend = BACKENDS[ASR_BACKEND]()
+    return _backend
+
+
+def set_backend(backend: ASRBackend):
+    """Swap the process-wide backend (benchmarks, tests)."""
+    global _backend
+    _backend = backend
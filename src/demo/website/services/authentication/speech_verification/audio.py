@@ -0,0 +1,141 @@
+"""
+In-memory audio for speech registration / verification.
+
+Audio is either recorded from the server microphone or uploaded by the
+browser as a multipart `audio` file (16-bit PCM WAV from microphone.js;
+FLAC/OGG also decode). Either way it is decoded exactly once into a mono
+float32 array at SAMPLE_RATE, and that array is what every stage
+(energy check, MFCC, transcription) works on. Nothing is written to disk.
+
+Microphone capture runs an energy VAD over 30 ms chunks and stops once the
+speaker has been quiet for VAD_HANGOVER_SEC; `duration` is only the upper
+bound. `trim_silence` applies the same rule offline to cut leading and
+trailing silence before features are computed.
+"""
+import io
+import numpy as np
+import librosa
+import sounddevice as sd
+import soundfile as sf
+
+SAMPLE_RATE = 16000
+
+# hard server-side caps for uploads
+MAX_AUDIO_BYTES = 2 * 1024 * 1024
+MAX_AUDIO_SEC = 15.0
+
+# voice activity detection
+VAD_FRAME_SEC = 0.03        # analysis chunk
+VAD_ENERGY = 1e-4           # mean-square floor for a speech frame (~ -40 dBFS)
+VAD_NOISE_RATIO = 4.0       # ... and this many times the quietest frame so far
+VAD_HANGOVER_SEC = 0.8      # silence after speech that ends a recording
+VAD_MIN_SEC = 1.0           # never stop earlier than this
+TRIM_PAD_SEC = 0.15         # kept around the speech when trimming
+
+
+class AudioError(ValueError):
+    """Upload rejected before any speech work was done."""
+
+
+class VoiceActivity:
+    """Streaming end-of-utterance detector; feed it consecutive chunks."""
+
+    def __init__(self, fs: int = SAMPLE_RATE, energy: float = VAD_ENERGY,
+                 hangover_sec: float = VAD_HANGOVER_SEC):
+        self.fs = fs
+        self.energy = energy
+        self.hangover = hangover_sec
+        self.floor = np.inf            # quietest chunk so far (noise estimate)
+        self.started = False           # any speech seen yet
+        self.silence = 0.0             # seconds of silence since the last speech chunk
+
+    def is_speech(self, e: float) -> bool:
+        self.floor = min(self.floor, e)
+        return e > max(self.energy, VAD_NOISE_RATIO * self.floor)
+
+    def feed(self, chunk) -> bool:
+        """True once speech has started and then stayed quiet for the hangover time."""
+        if self.is_speech(float(np.mean(np.square(chunk)))):
+            self.started, self.silence = True, 0.0
+        else:
+            self.silence += len(chunk) / float(self.fs)
+        return self.started and self.silence >= self.hangover
+
+
+def record(duration: float = 5, fs: int = SAMPLE_RATE, vad: bool = True,
+           min_sec: float = VAD_MIN_SEC) -> np.ndarray:
+    """
+    Record from the default microphone as mono float32. With `vad`, stops
+    shortly after the speaker finishes; `duration` is the upper bound.
+    """
+    print("Recording...")
+    if not vad:
+        audio = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype="float32")
+        sd.wait()
+        return audio.reshape(-1)
+
+    block = int(fs * VAD_FRAME_SEC)
+    detector, chunks = VoiceActivity(fs), []
+    with sd.InputStream(samplerate=fs, channels=1, dtype="float32", blocksize=block) as stream:
+        for i in range(int(np.ceil(duration / VAD_FRAME_SEC))):
+            data, _ = stream.read(block)
+            chunks.append(data.reshape(-1).copy())
+            if detector.feed(chunks[-1]) and (i + 1) * VAD_FRAME_SEC >= min_sec:
+                break
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+
+
+def trim_silence(y: np.ndarray, fs: int = SAMPLE_RATE, pad_sec: float = TRIM_PAD_SEC) -> np.ndarray:
+    """Cut leading / trailing silence (same rule as the VAD). Unchanged if no speech is found."""
+    frame = int(fs * VAD_FRAME_SEC)
+    n = len(y) // frame
+    if n == 0:
+        return y
+    e = np.square(y[:n * frame]).reshape(n, frame).mean(axis=1)
+    speech = np.flatnonzero(e > max(VAD_ENERGY, VAD_NOISE_RATIO * e.min()))
+    if not len(speech):
+        return y
+    pad = int(pad_sec * fs)
+    start = max(0, speech[0] * frame - pad)
+    stop = min(len(y), (speech[-1] + 1) * frame + pad)
+    return y[start:stop]
+
+
+def decode(data: bytes, fs: int = SAMPLE_RATE, max_sec: float = MAX_AUDIO_SEC) -> np.ndarray:
+    """Encoded audio bytes -> mono float32 at `fs`. Raises AudioError."""
+    try:
+        y, rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    except RuntimeError as e:         # soundfile.LibsndfileError subclasses RuntimeError
+        raise AudioError(f"Unsupported audio upload: {e}")
+    if len(y) / float(rate) > max_sec:
+        raise AudioError(f"Audio too long (max {max_sec:g} s).")
+    y = y.mean(axis=1)
+    if rate != fs:
+        y = librosa.resample(y, orig_sr=rate, target_sr=fs)
+    return np.ascontiguousarray(y, dtype=np.float32)
+
+
+def read_upload(file, fs: int = SAMPLE_RATE, max_bytes: int = MAX_AUDIO_BYTES) -> np.ndarray:
+    """Decode a werkzeug FileStorage (or raw bytes) with the size cap applied."""
+    if file is None:
+        raise AudioError("No audio uploaded.")
+    data = file if isinstance(file, (bytes, bytearray)) else file.read(max_bytes + 1)
+    if not data:
+        raise AudioError("Empty audio upload.")
+    if len(data) > max_bytes:
+        raise AudioError(f"Audio too large (max {max_bytes} bytes).")
+    return decode(bytes(data), fs)
+
+
+def to_int16(y: np.ndarray) -> np.ndarray:
+    """float32 [-1, 1] -> int16 samples."""
+    return (np.clip(y, -1.0, 1.0) * 32767.0).astype("<i2")
+
+
+def to_pcm16(y: np.ndarray) -> bytes:
+    """float32 [-1, 1] -> little-endian 16-bit PCM bytes (for speech_recognition.AudioData)."""
+    return to_int16(y).tobytes()
+
+
+def seconds(y: np.ndarray, fs: int = SAMPLE_RATE) -> float:
+    return round(len(y) / float(fs), 3)
@@ -0,0 +1,206 @@
+"""
+Accuracy / latency / memory benchmark for speaker verification over a local WAV corpus.
+
+Dataset layout (one folder per speaker, any number of recordings):
+    voices/<speaker>/*.wav        (anything soundfile decodes: wav/flac/ogg)
+
+Per speaker, the first --enroll recordings are enrolled; the rest are probes.
+Each probe is scored against its own templates (genuine) and against every
+other speaker's (impostor) with the same SpeakerStore the app uses, so both
+the raw cosine and, with enough speakers, the S-normalized score are swept.
+
+Backends (--backends):
+    mfcc       register_voice.extract_features (mean MFCC)
+    pyannote   speech_recog.embed_wav (pyannote/embedding; needs the model)
+
+Every probe goes through the verification stages one by one and each is
+timed: decode (bytes -> float32), trim (silence), features / embedding,
+asr (register_voice.transcribe), score. ASR defaults to asr.MockASR with
+--asr-delay, so the whole run works offline; --asr google|vosk measures a
+real backend instead. Memory is the RSS growth from loading each backend
+plus the model's parameter bytes.
+
+Run from src/:
+    python -m demo.website.services.authentication.speech_verification.bench_speech \
+        voices/ --backends mfcc pyannote --out bench_speech.json
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import numpy as np
+from . import asr, audio
+from ... import model_registry
+from .speaker_store import MIN_COHORT, SpeakerStore
+
+AUDIO_EXTS = {".wav", ".flac", ".ogg"}
+
+
+def load_dataset(root: str, enroll: int):
+    """{speaker: (enroll_paths, probe_paths)} for speakers with at least one probe."""
+    out = {}
+    for speaker in sorted(os.listdir(root)):
+        d = os.path.join(root, speaker)
+        if not os.path.isdir(d):
+            continue
+        files = sorted(os.path.join(d, f) for f in os.listdir(d)
+                       if os.path.splitext(f)[1].lower() in AUDIO_EXTS)
+        if len(files) > enroll:
+            out[speaker] = (files[:enroll], files[enroll:])
+    return out
+
+
+def percentiles(samples_ms):
+    if not samples_ms:
+        return None
+    a = np.asarray(samples_ms)
+    return {"p50": round(float(np.percentile(a, 50)), 3), "p90": round(float(np.percentile(a, 90)), 3),
+            "p99": round(float(np.percentile(a, 99)), 3), "mean": round(float(a.mean()), 3)}
+
+
+def error_rates(genuine, impostor, thresholds):
+    """FAR/FRR at each threshold plus the EER over a full sweep. Accept means score > t."""
+    g, i = np.sort(np.asarray(genuine)), np.sort(np.asarray(impostor))
+    at = {}
+    for t in thresholds:
+        far = float(1.0 - np.searchsorted(i, t, side="right") / len(i)) if len(i) else None
+        frr = float(np.searchsorted(g, t, side="right") / len(g)) if len(g) else None
+        at[str(t)] = {"far": far, "frr": frr}
+
+    eer = eer_t = None
+    if len(g) and len(i):
+        sweep = np.unique(np.concatenate([g, i]))
+        far = 1.0 - np.searchsorted(i, sweep, side="right") / len(i)
+        frr = np.searchsorted(g, sweep, side="right") / len(g)
+        k = int(np.argmin(np.abs(far - frr)))
+        eer, eer_t = float((far[k] + frr[k]) / 2.0), float(sweep[k])
+    return {"at": at, "eer": eer, "eer_threshold": eer_t}
+
+
+def load_backend(name: str):
+    """(stage name, vectorizer(y, fs)) for a backend, loading its model first."""
+    if name == "mfcc":
+        from . import register_voice
+        model_registry.warm("mfcc")
+        return "features", register_voice.extract_features
+    if name == "pyannote":
+        from . import speech_recog
+        model_registry.warm("speaker")
+        return "embedding", lambda y, fs: speech_recog.embed_wav(y, fs).squeeze()
+    raise ValueError(f"unknown backend {name!r}")
+
+
+def run_backend(data, name, thresholds, snorm_thresholds):
+    from . import register_voice
+
+    rss0 = model_registry.rss_bytes()
+    stage, vectorize = load_backend(name)
+    model = model_registry.status()["models"].get("speaker" if name == "pyannote" else "mfcc", {})
+    timings = {k: [] for k in ("decode", "trim", stage, "asr", "score")}
+    asr_errors = 0
+
+    def prepare(path):
+        with open(path, "rb") as f:
+            raw = f.read()
+        t = time.perf_counter()
+        y = audio.decode(raw, max_sec=float("inf"))
+        timings["decode"].append((time.perf_counter() - t) * 1000.0)
+        t = time.perf_counter()
+        y = audio.trim_silence(y)
+        timings["trim"].append((time.perf_counter() - t) * 1000.0)
+        t = time.perf_counter()
+        vec = vectorize(y, audio.SAMPLE_RATE)
+        timings[stage].append((time.perf_counter() - t) * 1000.0)
+        return y, vec
+
+    t0 = time.perf_counter()
+    files = 0
+    with tempfile.TemporaryDirectory(prefix="bench_speech_") as root:
+        store = SpeakerStore(root, name)
+        for speaker, (enroll_paths, _) in data.items():
+            for path in enroll_paths:
+                store.enroll(speaker, prepare(path)[1], append=True)
+                files += 1
+
+        genuine, impostor, genuine_sn, impostor_sn = [], [], [], []
+        for speaker, (_, probe_paths) in data.items():
+            for path in probe_paths:
+                y, vec = prepare(path)
+                files += 1
+                t = time.perf_counter()
+                try:
+                    register_voice.transcribe(y, audio.SAMPLE_RATE, timeout=register_voice.VERIFY_DEADLINE_SEC)
+                except asr.ASRError:
+                    asr_errors += 1
+                timings["asr"].append((time.perf_counter() - t) * 1000.0)
+
+                for claimed in data:
+                    t = time.perf_counter()
+                    scored = store.score(claimed, vec)
+                    timings["score"].append((time.perf_counter() - t) * 1000.0)
+                    same = claimed == speaker
+                    (genuine if same else impostor).append(scored["score"])
+                    if scored["snorm"] is not None:
+                        (genuine_sn if same else impostor_sn).append(scored["snorm"])
+        speakers = len(store)
+    wall = time.perf_counter() - t0
+
+    return {
+        "backend": name,
+        "files": files,
+        "speakers_enrolled": speakers,
+        "genuine_pairs": len(genuine),
+        "impostor_pairs": len(impostor),
+        "cosine": error_rates(genuine, impostor, thresholds),
+        "snorm": error_rates(genuine_sn, impostor_sn, snorm_thresholds) if genuine_sn else None,
+        "stage_ms": {k: percentiles(v) for k, v in timings.items()},
+        "asr_errors": asr_errors,
+        "files_per_sec": round(files / wall, 2) if wall else None,
+        "memory": {"rss_delta_bytes": model_registry.rss_bytes() - rss0,
+                   "param_bytes": model.get("param_bytes", 0),
+                   "rss_bytes": model_registry.rss_bytes()},
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("dataset")
+    ap.add_argument("--enroll", type=int, default=2, help="recordings per speaker used for enrollment")
+    ap.add_argument("--backends", nargs="+", default=["mfcc"], choices=["mfcc", "pyannote"])
+    ap.add_argument("--thresholds", nargs="+", type=float, default=[0.6, 0.75, 0.9])
+    ap.add_argument("--snorm-thresholds", nargs="+", type=float, default=[1.0, 2.0, 3.0])
+    ap.add_argument("--asr", default="mock", choices=sorted(asr.BACKENDS),
+                    help="ASR backend timed per probe (mock = offline stub)")
+    ap.add_argument("--asr-delay", type=float, default=0.0, help="seconds the mock ASR sleeps per call")
+    ap.add_argument("--out", default=None, help="write results as JSON")
+    args = ap.parse_args(argv)
+
+    data = load_dataset(args.dataset, args.enroll)
+    if not data:
+        ap.error("no speaker folder has more than --enroll recordings")
+    if len(data) <= MIN_COHORT:
+        print(f"note: {len(data)} speakers; S-norm needs more than {MIN_COHORT}, only cosine is reported")
+
+    asr.set_backend(asr.MockASR(delay=args.asr_delay) if args.asr == "mock" else asr.BACKENDS[args.asr]())
+
+    results = []
+    for name in args.backends:
+        r = run_backend(data, name, args.thresholds, args.snorm_thresholds)
+        results.append(r)
+        eer = lambda e: f"{e['eer']:.4f}@{e['eer_threshold']:.3f}" if e and e["eer"] is not None else "n/a"
+        stages = " ".join(f"{k} {(v or {}).get('p50')}" for k, v in r["stage_ms"].items())
+        print(f"{name:>8} | EER cos {eer(r['cosine'])} snorm {eer(r['snorm'])} | p50 ms: {stages} | "
+              f"{r['files_per_sec']} files/s | +{r['memory']['rss_delta_bytes'] / 2**20:.1f} MiB RSS")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"dataset": os.path.abspath(args.dataset), "enroll": args.enroll, "asr": args.asr,
+                       "machine": platform.platform(), "python": platform.python_version(),
+                       "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,24 @@
-import os, random
+import os, random, time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 import numpy as np
-import sounddevice as sd
 from scipy.io.wavfile import write
 import librosa
-import speech_recognition as sr
+from . import asr, audio
+from ... import model_registry
+from .speaker_store import SNORM_THRESHOLD, SpeakerStore, accept
 
 BASE_DIR = os.path.dirname(__file__)
 SAMPLES_DIR = os.path.join(BASE_DIR, "Voice_samples")
 os.makedirs(SAMPLES_DIR, exist_ok=True)
 
+# transcription runs here, concurrently with the speaker-similarity stage
+VERIFY_DEADLINE_SEC = float(os.getenv("SPEECH_VERIFY_DEADLINE_SEC", "6"))
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv("SPEECH_ASR_WORKERS", "4")),
+                           thread_name_prefix="speech-asr")
+
+# every student's MFCC templates (<id>_features.npy) in one in-memory matrix
+templates = SpeakerStore(SAMPLES_DIR, "features")
+
 WORDS = [
     "machine", "learning", "data", "science", "python", "flask",
     "student", "teacher", "voice", "recognition", "system", "database",
@@ -21,25 +31,19 @@ WORDS = [
 def get_random_phrase(n=6):
     return " ".join(random.sample(WORDS, n))
 
-# -----------------------
-# Recording helper (PCM WAV)
-# -----------------------
-def record_audio(filename, duration=5, fs=16000):
-    """Record microphone audio as proper 16-bit PCM WAV."""
-    print("Recording...")
-    audio = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype="int16")
-    sd.wait()
-    write(filename, fs, audio)
-    print("Saved:", filename)
-
 # -----------------------
 # Features (MFCC)
 # -----------------------
-def extract_features(path):
-    y, sr = librosa.load(path, sr=16000)
-    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+def extract_features(y, fs=audio.SAMPLE_RATE):
+    """Mean MFCC vector of a float32 signal (a WAV path is still accepted)."""
+    if isinstance(y, str):
+        y, fs = librosa.load(y, sr=audio.SAMPLE_RATE)
+    mfcc = librosa.feature.mfcc(y=y, sr=fs, n_mfcc=13)
     return np.mean(mfcc.T, axis=0)
 
+# librosa JIT-compiles its kernels on the first call; warm it before traffic
+model_registry.register("mfcc", None, lambda _: extract_features(model_registry.noise(1.0, audio.SAMPLE_RATE)))
+
 # -----------------------
 # Speech presence check
 # -----------------------
@@ -52,77 +56,103 @@ def has_speech(y, threshold=1e-5):
 # -----------------------
 # Transcription
 # -----------------------
-def transcribe(path):
-    r = sr.Recognizer()
-    with sr.AudioFile(path) as source:
-        audio = r.record(source)
-    try:
-        return r.recognize_google(audio).lower()
-    except sr.UnknownValueError:
-        return ""
-    except sr.RequestError:
-        return ""
+def transcribe(y, fs=audio.SAMPLE_RATE, timeout=None):
+    """Text of a float32 signal from the configured ASR backend; raises asr.ASRError."""
+    return asr.get_backend().transcribe(y, fs, timeout=timeout)
 
 # -----------------------
 # Registration
 # -----------------------
-def register_student(student_id, phrase, duration=5, fs=16000):
+def register_student(student_id, phrase, duration=5, fs=audio.SAMPLE_RATE, y=None, append=False):
+    """
+    Enroll from `y` (float32 at `fs`, e.g. a browser upload) or, when no
+    audio is given, from the server microphone. Re-registering replaces the
+    student's templates unless `append` adds this one as another sample.
+    """
     wav_path = os.path.join(SAMPLES_DIR, f"{student_id}_registered.wav")
-    feat_path = os.path.join(SAMPLES_DIR, f"{student_id}_features.npy")
 
     print(f"Expected phrase (register): {phrase}")
-    record_audio(wav_path, duration=duration, fs=fs)
+    if y is None:
+        y = audio.record(duration=duration, fs=fs)
+    recorded = audio.seconds(y, fs)
+    y = audio.trim_silence(y, fs)
 
-    features = extract_features(wav_path)
-    np.save(feat_path, features)
+    features = extract_features(y, fs)
+    samples = templates.enroll(student_id, features, append=append)
+    write(wav_path, fs, audio.to_int16(y))   # enrollment record only, never read back
 
-    return {"ok": True, "message": f"Voice registered with phrase: '{phrase}'"}
+    return {"ok": True, "message": f"Voice registered with phrase: '{phrase}'",
+            "samples": samples, "audio_seconds": audio.seconds(y, fs), "recorded_seconds": recorded}
 
 # -----------------------
 # Verification
 # -----------------------
-def verify_student(student_id, phrase, duration=8, fs=16000, threshold=0.75):
-    feat_path = os.path.join(SAMPLES_DIR, f"{student_id}_features.npy")
-    if not os.path.exists(feat_path):
+def verify_student(student_id, phrase, duration=8, fs=audio.SAMPLE_RATE, threshold=0.75, y=None,
+                   deadline_sec=VERIFY_DEADLINE_SEC, snorm_threshold=SNORM_THRESHOLD):
+    """
+    Verify `y` (float32 at `fs`, e.g. a browser upload) or, when no audio is
+    given, a fresh server-microphone recording. The signal is decoded once
+    and every step below works on the same array.
+
+    Transcription runs on the worker pool while the speaker similarity is
+    computed here; a failed similarity returns at once without waiting for
+    the transcript. Both stages together get at most `deadline_sec`.
+
+    The speaker decision is S-norm against the other enrolled speakers once
+    there are enough of them (`snorm_threshold`), raw cosine `threshold`
+    before that.
+    """
+    if student_id not in templates:
         return {"ok": False, "message": "No registered voice found"}
 
-    registered_features = np.load(feat_path)
-
-    login_wav = os.path.join(SAMPLES_DIR, f"{student_id}_login.wav")
     print(f"Expected phrase (verify): {phrase}")
-    record_audio(login_wav, duration=duration, fs=fs)
+    if y is None:
+        y = audio.record(duration=duration, fs=fs)
+    recorded = audio.seconds(y, fs)
+    y = audio.trim_silence(y, fs)     # features and ASR only see the utterance
+    result = {"ok": False, "expected_phrase": phrase,
+              "audio_seconds": audio.seconds(y, fs), "recorded_seconds": recorded}
 
     # --- Step 1: Ensure speech is present
-    y, sr = librosa.load(login_wav, sr=16000)
     if not has_speech(y):
-        return {"ok": False, "message": "No speech detected"}
-
-    # --- Step 2: Extract features + similarity
-    features = extract_features(login_wav)
-    sim = float(
-        np.dot(registered_features, features) /
-        (np.linalg.norm(registered_features) * np.linalg.norm(features))
-    )
-    print(f"Similarity={sim:.4f}")
-
-    # --- Step 3: Transcribe and check phrase
-    spoken_text = transcribe(login_wav)
+        result["message"] = "No speech detected"
+        return result
+
+    # --- Step 2: transcription in the background, similarity here
+    t0 = time.perf_counter()
+    deadline = t0 + deadline_sec
+    spoken = _pool.submit(transcribe, y, fs, deadline_sec)
+    scored = templates.score(student_id, extract_features(y, fs))
+    if scored is None:                # template removed since the check above
+        spoken.cancel()
+        result["message"] = "No registered voice found"
+        return result
+    timings = {"similarity": round((time.perf_counter() - t0) * 1000.0, 3)}
+    result.update(similarity=scored["score"], snorm=scored["snorm"], cohort=scored["cohort"],
+                  impostor_mean=scored["impostor_mean"], timings_ms=timings)
+    print(f"Similarity={scored['score']:.4f} S-norm={scored['snorm']}")
+
+    if not accept(scored, threshold, snorm_threshold):
+        spoken.cancel()               # no-op if already running; nobody waits for it
+        result["message"] = "Verification failed"
+        return result
+
+    # --- Step 3: wait for the transcript within what is left of the deadline
+    try:
+        spoken_text = spoken.result(timeout=max(0.0, deadline - time.perf_counter()))
+    except FutureTimeout:
+        result["message"] = "Speech recognition timed out"
+        return result
+    except asr.ASRError as e:
+        print(f"ASR error: {e}")
+        result["message"] = "Speech recognition unavailable"
+        return result
+    finally:
+        timings["total"] = round((time.perf_counter() - t0) * 1000.0, 3)
     print(f"Recognized text: '{spoken_text}'")
 
-    if phrase.lower() not in spoken_text:
-        return {
-            "ok": False,
-            "similarity": sim,
-            "expected_phrase": phrase,
-            "spoken": spoken_text,
-            "message": "Phrase mismatch"
-        }
-
     # --- Final decision
-    return {
-        "ok": bool(sim > threshold),
-        "similarity": sim,
-        "expected_phrase": phrase,
-        "spoken": spoken_text,
-        "message": "Verification passed" if sim > threshold else "Verification failed"
-    }
+    ok = phrase.lower() in spoken_text
+    result.update(ok=ok, spoken=spoken_text,
+                  message="Verification passed" if ok else "Phrase mismatch")
+    return result
@@ -0,0 +1,169 @@
+"""
+Speaker templates kept in memory and scored against a cohort.
+
+Enrollment vectors stay in Voice_samples/<id>_<kind>.npy (one row per
+enrollment sample; the old single-vector files load as one row). The store
+reads them all once into one L2-normalized matrix and only re-reads files
+whose mtime changed, so re-registration in any worker invalidates the
+cached template on the next call.
+
+Scoring is one matrix-vector product over the whole matrix: the claimed
+speaker's best cosine plus every other speaker's score, which doubles as
+the impostor cohort. With at least MIN_COHORT other speakers the score is
+S-normalized:
+
+    snorm = ((s - mu_e) / sd_e + (s - mu_p) / sd_p) / 2
+
+where (mu_p, sd_p) are the probe's top-K cohort scores and (mu_e, sd_e) the
+enrollment's (cached per student until the store changes). S-norm is in
+units of impostor spread, so one threshold works across speakers and
+feature types.
+"""
+import os
+import threading
+import numpy as np
+
+MIN_COHORT = int(os.getenv("SPEECH_MIN_COHORT", "5"))       # other speakers needed for S-norm
+COHORT_TOP_K = int(os.getenv("SPEECH_COHORT_TOP_K", "100"))  # adaptive S-norm: closest K impostors
+SNORM_THRESHOLD = float(os.getenv("SPEECH_SNORM_THRESHOLD", "2.0"))
+
+
+def _normalize(m):
+    m = np.asarray(m, dtype=np.float32)
+    n = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.where(n > 0, n, 1.0)
+
+
+def _top_stats(scores, k):
+    if len(scores) > k:
+        scores = np.partition(scores, len(scores) - k)[-k:]
+    return float(scores.mean()), max(float(scores.std()), 1e-6)
+
+
+class SpeakerStore:
+    def __init__(self, root: str, kind: str):
+        self.root = root
+        self.suffix = f"_{kind}.npy"
+        self._lock = threading.RLock()
+        self._dir_mtime = None
+        self._files = {}            # student id -> mtime_ns of its file
+        self._vecs = {}             # student id -> (n, d) normalized rows
+        self._rebuild()
+
+    # ---------- loading ----------
+    def path_of(self, student_id) -> str:
+        return os.path.join(self.root, f"{student_id}{self.suffix}")
+
+    def refresh(self) -> bool:
+        """Re-read changed template files. Returns True if anything changed."""
+        mtime = os.stat(self.root).st_mtime_ns
+        if mtime == self._dir_mtime:
+            return False
+        with self._lock:
+            seen = {}
+            for name in os.listdir(self.root):
+                if not name.endswith(self.suffix):
+                    continue
+                sid = name[:-len(self.suffix)]
+                path = os.path.join(self.root, name)
+                try:
+                    seen[sid] = os.stat(path).st_mtime_ns
+                    if self._files.get(sid) != seen[sid]:
+                        vecs = np.load(path)
+                        self._vecs[sid] = _normalize(vecs.reshape(-1, vecs.shape[-1]))
+                except (OSError, ValueError):
+                    seen.pop(sid, None)      # half-written or corrupt; skip
+            for gone in set(self._vecs) - set(seen):
+                del self._vecs[gone]
+            self._files, self._dir_mtime = seen, mtime
+            self._rebuild()
+        return True
+
+    def _rebuild(self):
+        ids = sorted(sid for sid, v in self._vecs.items() if len(v))
+        dims = {self._vecs[s].shape[1] for s in ids}
+        if len(dims) > 1:                        # keep the majority dimension
+            dim = max(dims, key=lambda d: sum(self._vecs[s].shape[1] == d for s in ids))
+            ids = [s for s in ids if self._vecs[s].shape[1] == dim]
+        self._mat = np.vstack([self._vecs[s] for s in ids]) if ids else np.zeros((0, 0), np.float32)
+        self._rows, start = {}, 0
+        for sid in ids:
+            n = len(self._vecs[sid])
+            self._rows[sid] = slice(start, start + n)
+            start += n
+        self._enroll_stats = {}
+
+    # ---------- introspection ----------
+    def __contains__(self, student_id):
+        self.refresh()
+        return student_id in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def samples(self, student_id) -> int:
+        sl = self._rows.get(student_id)
+        return 0 if sl is None else sl.stop - sl.start
+
+    # ---------- enrollment ----------
+    def enroll(self, student_id, vector, append: bool = False) -> int:
+        """
+        Save an enrollment vector. Re-registration replaces the student's
+        templates unless `append` adds another sample. Returns the sample count.
+        """
+        vec = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        path = self.path_of(student_id)
+        with self._lock:
+            if append and os.path.exists(path):
+                old = np.load(path)
+                vec = np.vstack([old.reshape(-1, old.shape[-1]), vec])
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, vec if len(vec) > 1 else vec[0])   # single sample keeps the old 1-D layout
+            os.replace(tmp, path)
+            self._dir_mtime = None                            # force a re-read on the next refresh
+            self.refresh()
+        return len(vec)
+
+    # ---------- scoring ----------
+    def _enrollment_stats(self, student_id, cohort_mask, k):
+        if student_id not in self._enroll_stats:
+            scores = (self._mat[self._rows[student_id]] @ self._mat[cohort_mask].T).ravel()
+            self._enroll_stats[student_id] = _top_stats(scores, k)
+        return self._enroll_stats[student_id]
+
+    def score(self, student_id, probe, top_k: int = COHORT_TOP_K):
+        """
+        {"score", "snorm", "cohort", "impostor_mean", "best_impostor"} for a
+        probe against the claimed student, or None if they have no template.
+        snorm is None when the cohort is too small.
+        """
+        self.refresh()
+        with self._lock:
+            sl = self._rows.get(student_id)
+            if sl is None:
+                return None
+            p = _normalize(probe).reshape(-1)
+            if p.shape[0] != self._mat.shape[1]:
+                raise ValueError(f"probe has {p.shape[0]} dims, templates have {self._mat.shape[1]}")
+            scores = self._mat @ p
+            claimed = float(scores[sl].max())
+
+            cohort = np.ones(len(scores), dtype=bool)
+            cohort[sl] = False
+            impostor = scores[cohort]
+            out = {"score": claimed, "snorm": None, "cohort": len(self._rows) - 1,
+                   "impostor_mean": float(impostor.mean()) if len(impostor) else None,
+                   "best_impostor": float(impostor.max()) if len(impostor) else None}
+            if out["cohort"] >= MIN_COHORT:
+                mu_p, sd_p = _top_stats(impostor, top_k)
+                mu_e, sd_e = self._enrollment_stats(student_id, cohort, top_k)
+                out["snorm"] = 0.5 * ((claimed - mu_e) / sd_e + (claimed - mu_p) / sd_p)
+            return out
+
+
+def accept(scored: dict, threshold: float, snorm_threshold: float = SNORM_THRESHOLD) -> bool:
+    """S-norm decision when a cohort is available, raw cosine `threshold` otherwise."""
+    if scored["snorm"] is not None:
+        return scored["snorm"] > snorm_threshold
+    return scored["score"] > threshold
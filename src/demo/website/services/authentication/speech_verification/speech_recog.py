@@ -2,25 +2,39 @@ import os
 import random
 import numpy as np
 import soundfile as sf
-import sounddevice as sd
 import torch
-from numpy.linalg import norm
 from scipy.io.wavfile import write
 from pyannote.audio import Model
+from . import audio
+from ... import model_registry
+from .speaker_store import SNORM_THRESHOLD, SpeakerStore, accept
 
 # ---------- paths ----------
 BASE_DIR = os.path.dirname(__file__)
 SAMPLES_DIR = os.path.join(BASE_DIR, "Voice_samples")
 os.makedirs(SAMPLES_DIR, exist_ok=True)
 
-# ---------- lazy model cache ----------
-_MODEL = None
+# every student's pyannote embeddings (<id>_embedding.npy) in one in-memory matrix
+embeddings = SpeakerStore(SAMPLES_DIR, "embedding")
+
+# ---------- inference settings (per worker) ----------
+# 0 = embed the whole utterance in one pass; otherwise cut it into windows of
+# this many seconds (50% overlap), embed them EMBED_BATCH at a time and average
+EMBED_WINDOW_SEC = float(os.getenv("SPEECH_EMBED_WINDOW_SEC", "0"))
+EMBED_BATCH = int(os.getenv("SPEECH_EMBED_BATCH", "8"))
+
+# ---------- model lifecycle (see services/model_registry.py) ----------
+def _load_model():
+    # If your env needs a HF token, set env var HUGGINGFACE_TOKEN and use: os.getenv("HUGGINGFACE_TOKEN")
+    return Model.from_pretrained("pyannote/embedding", use_auth_token=None)
+
+def _warmup(model):
+    embed_wav(model_registry.noise(2.0, audio.SAMPLE_RATE))
+
+model_registry.register("speaker", _load_model, _warmup)
+
 def _get_model():
-    global _MODEL
-    if _MODEL is None:
-        # If your env needs a HF token, set env var HUGGINGFACE_TOKEN and use: os.getenv("HUGGINGFACE_TOKEN")
-        _MODEL = Model.from_pretrained("pyannote/embedding", use_auth_token=None)
-    return _MODEL
+    return model_registry.get("speaker")
 
 # ---------- helpers ----------
 _PHRASES = [
@@ -34,65 +48,83 @@ _PHRASES = [
 def get_random_phrase():
     return random.choice(_PHRASES)
 
-def record_audio_wav(path, duration=4, fs=16000):
-    """Records mono audio to `path`."""
-    audio = sd.rec(int(duration * fs), samplerate=fs, channels=1)
-    sd.wait()
-    write(path, fs, audio)  # writes 16-bit PCM WAV
-
-def embed_wav(path):
-    """Returns an embedding vector for the given WAV file path."""
+def embed_wav(wav, sr=audio.SAMPLE_RATE):
+    """Returns an embedding vector for a float32 signal at `sr` (or a WAV file path)."""
     model = _get_model()
-    wav, sr = sf.read(path)
-    wav_t = torch.tensor(wav, dtype=torch.float32).unsqueeze(0)
+    if isinstance(wav, str):
+        wav, sr = sf.read(wav, dtype="float32")
+    wav = np.ascontiguousarray(wav, dtype=np.float32)
+    win = int(EMBED_WINDOW_SEC * sr)
+    if not win or len(wav) <= win:
+        wav_t = torch.from_numpy(wav).unsqueeze(0)
+        with torch.no_grad():
+            emb = model({"waveform": wav_t, "sample_rate": sr}).numpy().squeeze()
+        return emb
+
+    step = max(1, win // 2)
+    starts = range(0, len(wav) - win + 1, step)
+    windows = np.stack([wav[s:s + win] for s in starts])[:, None, :]     # (n, channel, samples)
+    embs = []
     with torch.no_grad():
-        emb = model({"waveform": wav_t, "sample_rate": sr}).numpy().squeeze()
-    return emb
+        for b in range(0, len(windows), EMBED_BATCH):
+            embs.append(model(torch.from_numpy(windows[b:b + EMBED_BATCH])).numpy())
+    return np.concatenate(embs).mean(axis=0)
 
 # ---------- main callable ----------
-def verify_student(student_id: str, threshold: float = 0.75, duration: int = 4, fs: int = 16000):
+def verify_student(student_id: str, threshold: float = 0.75, duration: int = 4, fs: int = audio.SAMPLE_RATE,
+                   y=None, snorm_threshold: float = SNORM_THRESHOLD):
     """
     1) Prompts the user with a random phrase,
-    2) Records voice, computes embedding,
-    3) Compares with stored registration embedding: {student_id}_embedding.npy in Voice_samples/.
+    2) Takes `y` (float32 at `fs`) or records from the microphone, computes embedding,
+    3) Scores it against the student's registered embeddings, S-normalized
+       against the other enrolled speakers when there are enough of them.
 
     Returns:
-        dict: {"ok": bool, "similarity": float, "phrase": str, "message": str, "login_wav": path}
+        dict: {"ok": bool, "similarity": float, "snorm": float|None, "phrase": str, "message": str}
     """
     phrase = get_random_phrase()
-    login_wav = os.path.join(SAMPLES_DIR, f"{student_id}_login.wav")
-    reg_npy   = os.path.join(SAMPLES_DIR, f"{student_id}_embedding.npy")
 
     # Record
-    try:
-        record_audio_wav(login_wav, duration=duration, fs=fs)
-    except Exception as e:
-        return {"ok": False, "similarity": 0.0, "phrase": phrase, "message": f"Mic error: {e}", "login_wav": login_wav}
+    if y is None:
+        try:
+            y = audio.record(duration=duration, fs=fs)
+        except Exception as e:
+            return {"ok": False, "similarity": 0.0, "phrase": phrase, "message": f"Mic error: {e}"}
 
-    # Load registered embedding
-    if not os.path.exists(reg_npy):
+    # Registered embeddings
+    if student_id not in embeddings:
         return {"ok": False, "similarity": 0.0, "phrase": phrase,
-                "message": "No registered voice found. Please register first.", "login_wav": login_wav}
+                "message": "No registered voice found. Please register first."}
 
+    recorded = audio.seconds(y, fs)
+    y = audio.trim_silence(y, fs)
     try:
-        stored_emb = np.load(reg_npy).squeeze()
-        login_emb  = embed_wav(login_wav).squeeze()
+        scored = embeddings.score(student_id, embed_wav(y, fs).squeeze())
     except Exception as e:
-        return {"ok": False, "similarity": 0.0, "phrase": phrase, "message": f"Embedding error: {e}", "login_wav": login_wav}
+        return {"ok": False, "similarity": 0.0, "phrase": phrase, "message": f"Embedding error: {e}"}
+
+    if scored is None:                  # template removed since the check above
+        return {"ok": False, "similarity": 0.0, "phrase": phrase,
+                "message": "No registered voice found. Please register first."}
 
-    # Cosine similarity
-    denom = (norm(stored_emb) * norm(login_emb))
-    sim = float(np.dot(stored_emb, login_emb) / denom) if denom else 0.0
-    ok = sim > threshold
+    ok = accept(scored, threshold, snorm_threshold)
     msg = "Voice Verified: Login Successful." if ok else "Voice Mismatch: Login Denied."
 
-    return {"ok": ok, "similarity": sim, "phrase": phrase, "message": msg, "login_wav": login_wav}
+    return {"ok": ok, "similarity": scored["score"], "snorm": scored["snorm"], "cohort": scored["cohort"],
+            "phrase": phrase, "message": msg,
+            "audio_seconds": audio.seconds(y, fs), "recorded_seconds": recorded}
 
-def register_student(student_id: str, duration: int = 4, fs: int = 16000):
-    """Records a clean sample and stores {student_id}_embedding.npy under Voice_samples/."""
+def register_student(student_id: str, duration: int = 4, fs: int = audio.SAMPLE_RATE, y=None,
+                     append: bool = False):
+    """
+    Records (or takes `y`) a clean sample and stores it in {student_id}_embedding.npy
+    under Voice_samples/, replacing earlier samples unless `append`.
+    """
     reg_wav = os.path.join(SAMPLES_DIR, f"{student_id}_register.wav")
-    reg_npy = os.path.join(SAMPLES_DIR, f"{student_id}_embedding.npy")
-    record_audio_wav(reg_wav, duration=duration, fs=fs)
-    emb = embed_wav(reg_wav)
-    np.save(reg_npy, emb)
-    return {"ok": True, "message": "Registration voice saved.", "register_wav": reg_wav, "embedding": reg_npy}
+    if y is None:
+        y = audio.record(duration=duration, fs=fs)
+    y = audio.trim_silence(y, fs)
+    write(reg_wav, fs, audio.to_int16(y))   # enrollment record only
+    samples = embeddings.enroll(student_id, embed_wav(y, fs).squeeze(), append=append)
+    return {"ok": True, "message": "Registration voice saved.", "register_wav": reg_wav,
+            "embedding": embeddings.path_of(student_id), "samples": samples}
@@ -0,0 +1,236 @@
+"""
+Biometric work as background jobs.
+
+Face / speech registration and verification used to run inside the request
+and hold a gunicorn worker for the whole camera timeout or recording. The
+routes now hand the work to a bounded pool and answer 202 with a job id;
+the client polls GET /api/jobs/<id> (optionally long-polling with ?wait=).
+
+Two pools, both created on first use in each worker:
+    cpu   uploaded frames / audio: a process pool (JOB_CPU_WORKERS
+          processes, JOB_MP_START start method) so detection, encoding and
+          MFCC/embedding run outside the web worker's GIL. 0 = threads.
+    io    server camera / microphone: threads (JOB_IO_WORKERS), since the
+          work waits on a device.
+
+At most JOB_MAX_PENDING jobs may be queued or running per worker; beyond
+that submit raises JobQueueFull (HTTP 503). Job state is written to
+JOB_DIR as one JSON file per job, so a poll can land on any gunicorn
+worker; finished jobs are swept after JOB_TTL_SEC.
+
+Metrics (per web worker): jobs.<name>.queue_wait and jobs.<name>.run
+latencies, jobs.<name>.done / .failed / .rejected counters and the
+jobs.pending gauge. Metrics recorded inside pool processes stay there.
+"""
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from . import metrics, model_registry
+
+JOB_CPU_WORKERS = int(os.getenv("JOB_CPU_WORKERS", "2"))
+JOB_IO_WORKERS = int(os.getenv("JOB_IO_WORKERS", "2"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "16"))
+JOB_TTL_SEC = float(os.getenv("JOB_TTL_SEC", "600"))
+JOB_DIR = os.getenv("JOB_DIR") or os.path.join(tempfile.gettempdir(), "attendance_jobs")
+JOB_MP_START = os.getenv("JOB_MP_START", "spawn")   # spawn: no torch/OpenMP state inherited
+MAX_WAIT_SEC = 25.0                                  # cap for long-polling
+FINAL = ("done", "failed")
+
+
+class JobQueueFull(RuntimeError):
+    """Too many jobs queued or running in this worker."""
+
+
+def _json_safe(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()            # np.bool_ / np.float32 from the matchers
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def _path(root: str, job_id: str) -> str:
+    return os.path.join(root, f"{job_id}.json")
+
+
+def _write(root: str, job: dict):
+    path = _path(root, job["id"])
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(job, f, default=_json_safe)
+    os.replace(tmp, path)
+
+
+def _read(root: str, job_id: str):
+    try:
+        with open(_path(root, job_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _init_process():
+    model_registry.worker_start()     # torch threads, and preload per MODEL_PRELOAD
+
+
+def _run(root, job, fn, args, kwargs):
+    """Runs in the pool: mark running, call fn, return (result, started, run seconds)."""
+    started = time.time()
+    _write(root, dict(job, state="running", started=started))
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, started, time.perf_counter() - t0
+
+
+class JobManager:
+    def __init__(self, root: str = JOB_DIR, cpu_workers: int = JOB_CPU_WORKERS,
+                 io_workers: int = JOB_IO_WORKERS, max_pending: int = JOB_MAX_PENDING,
+                 ttl_sec: float = JOB_TTL_SEC):
+        self.root = root
+        self.cpu_workers = cpu_workers
+        self.io_workers = io_workers
+        self.max_pending = max_pending
+        self.ttl_sec = ttl_sec
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._jobs = {}          # job id -> job dict (jobs submitted by this worker)
+        self._futures = {}       # job id -> Future while in flight
+        self._swept = 0.0
+
+    def _pool(self, cpu: bool):
+        kind = "cpu" if cpu and self.cpu_workers > 0 else "io"
+        with self._lock:
+            if kind not in self._pools:
+                if kind == "cpu":
+                    self._pools[kind] = ProcessPoolExecutor(
+                        max_workers=self.cpu_workers, initializer=_init_process,
+                        mp_context=multiprocessing.get_context(JOB_MP_START))
+                else:
+                    self._pools[kind] = ThreadPoolExecutor(max_workers=max(1, self.io_workers),
+                                                           thread_name_prefix="biometric-job")
+            return self._pools[kind]
+
+    def _drop_broken(self):
+        """A crashed child (OOM, segfault in dlib) breaks the whole pool; start a fresh one next time."""
+        with self._lock:
+            pool = self._pools.get("cpu")
+            if pool is not None and getattr(pool, "_broken", False):
+                del self._pools["cpu"]
+                pool.shutdown(wait=False)
+
+    # ---------- submitting ----------
+    def submit(self, name: str, fn, *args, owner=None, cpu: bool = True, **kwargs) -> dict:
+        """
+        Queue fn(*args, **kwargs). `fn` and its arguments must be picklable
+        (module-level function, bytes / arrays) when it goes to the process
+        pool. `owner` limits who may read the job. Raises JobQueueFull.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        self._sweep()
+        with self._lock:
+            if len(self._futures) >= self.max_pending:
+                metrics.incr(f"jobs.{name}.rejected")
+                raise JobQueueFull(f"Too many verifications in progress (max {self.max_pending}); retry shortly.")
+            job = {"id": uuid.uuid4().hex, "name": name, "owner": owner,
+                   "state": "queued", "submitted": time.time()}
+            self._jobs[job["id"]] = job
+            self._futures[job["id"]] = None     # hold the slot until the future exists
+        try:
+            _write(self.root, job)
+            try:
+                fut = self._pool(cpu).submit(_run, self.root, job, fn, args, kwargs)
+            except BrokenProcessPool:
+                self._drop_broken()
+                fut = self._pool(cpu).submit(_run, self.root, job, fn, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self._futures.pop(job["id"], None)
+                self._jobs.pop(job["id"], None)
+            raise
+        with self._lock:
+            self._futures[job["id"]] = fut
+            metrics.gauge("jobs.pending", len(self._futures))
+        fut.add_done_callback(lambda f, job=job: self._finish(job, f))
+        return job
+
+    def _finish(self, job: dict, fut):
+        done = dict(job)
+        try:
+            result, started, run_sec = fut.result()
+            done.update(state="done", result=json.loads(json.dumps(result, default=_json_safe)),
+                        started=started, run_ms=round(run_sec * 1000.0, 3))
+            metrics.observe(f"jobs.{job['name']}.queue_wait", max(0.0, started - job["submitted"]))
+            metrics.observe(f"jobs.{job['name']}.run", run_sec)
+            metrics.incr(f"jobs.{job['name']}.done")
+        except Exception as e:
+            done.update(state="failed", error=str(e) or type(e).__name__)
+            metrics.incr(f"jobs.{job['name']}.failed")
+            if isinstance(e, BrokenProcessPool):
+                self._drop_broken()
+        done["finished"] = time.time()
+        try:
+            _write(self.root, done)
+        finally:
+            with self._lock:
+                self._jobs[job["id"]] = done
+                self._futures.pop(job["id"], None)
+                metrics.gauge("jobs.pending", len(self._futures))
+
+    # ---------- reading ----------
+    def get(self, job_id: str, owner=None):
+        """The job as the client sees it, or None (unknown, expired, or someone else's)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job["state"] not in FINAL:
+            job = _read(self.root, job_id) or job      # the pool / another worker may be further along
+        if job is None or (job.get("owner") is not None and job["owner"] != owner):
+            return None
+        view = {k: v for k, v in job.items() if k != "owner"}
+        if job["state"] in FINAL and "started" in job:
+            view["queue_ms"] = round((job["started"] - job["submitted"]) * 1000.0, 3)
+        return view
+
+    def wait(self, job_id: str, owner=None, timeout: float = 0.0):
+        """get(), after waiting up to `timeout` seconds for the job to finish."""
+        deadline = time.monotonic() + max(0.0, min(timeout, MAX_WAIT_SEC))
+        with self._lock:
+            fut = self._futures.get(job_id)
+        if fut is not None:                             # ours: block on the future itself
+            wait_futures([fut], timeout=max(0.0, deadline - time.monotonic()))
+        while True:                                     # then until the done-callback has published
+            job = self.get(job_id, owner)
+            if job is None or job["state"] in FINAL or time.monotonic() >= deadline:
+                return job
+            time.sleep(0.02 if fut is not None else 0.1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._futures), "max_pending": self.max_pending,
+                    "pools": sorted(self._pools)}
+
+    def _sweep(self):
+        now = time.time()
+        if now - self._swept < 60:
+            return
+        self._swept = now
+        with self._lock:
+            for jid in [j for j, job in self._jobs.items()
+                        if job["state"] in FINAL and now - job.get("finished", now) > self.ttl_sec]:
+                del self._jobs[jid]
+        try:
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if now - os.stat(path).st_mtime > self.ttl_sec:
+                    os.remove(path)
+        except OSError:
+            pass
+
+
+manager = JobManager()
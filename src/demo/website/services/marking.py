@@ -0,0 +1,419 @@
+"""
+The attendance mark, shared by every route that marks a student.
+
+One mark costs one read, one write and a commit:
+
+    SELECT  the session LEFT JOIN the student (by student code): one row
+            answers "session exists", "student exists", the session
+            window and the geofence
+    INSERT  attendances ... ON CONFLICT (session_id, student_id) DO NOTHING
+            RETURNING id, marked_at; no row back means "already marked"
+    the outbox event (and the idempotency key) go into the same transaction
+
+There is no check-then-insert window: the uq_mark_once constraint decides
+which of two concurrent marks wins, and the loser gets a 409 instead of an
+IntegrityError. SQLite (3.35+) and PostgreSQL take the single-statement
+path. Other dialects insert inside a savepoint.
+
+Idempotency-Key: a client retrying after a timeout sends the same key
+again. The first response is stored with the mark. When a keyed insert hits
+the conflict, that stored response is replayed, so a retry never turns a
+successful mark into "already marked". The key therefore costs nothing
+before the insert. Keys are scoped to the caller and kept for
+IDEMPOTENCY_TTL_HOURS. Reusing a key for a different session or student is
+a 422.
+
+mark_many() is the bulk / offline-sync path: one pass validates every item
+(including its client timestamp against the session window and, for
+students, that the sync arrives within BULK_OFFLINE_GRACE_SEC of the
+session's end), two SELECTs
+resolve all sessions and students, and a single executemany INSERT ... ON
+CONFLICT DO NOTHING writes the batch. Its outbox events are inserted together,
+so the drainer applies their side effects as one batch.
+"""
+import hashlib
+import json
+import math
+import os
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, delete, select
+from sqlalchemy.exc import IntegrityError
+from . import metrics, outbox
+from ..extensions import db
+from ..models import Attendance, IdempotencyKey, Session, User
+
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_PURGE_P = float(os.getenv("IDEMPOTENCY_PURGE_P", "0.01"))   # chance a keyed mark purges expired keys
+MAX_KEY_LEN = 200
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "500"))
+BULK_CLOCK_SKEW_SEC = float(os.getenv("BULK_CLOCK_SKEW_SEC", "300"))   # slack for device clocks
+# how long after a session ends a student's offline marks may still sync
+BULK_OFFLINE_GRACE_SEC = float(os.getenv("BULK_OFFLINE_GRACE_SEC", "3600"))
+
+# what validation and the outbox event need to know about one (session, student)
+Target = namedtuple("Target", "session_id class_name teacher_id lat lng radius_m user_id student_name student_code")
+
+
+class MarkError(ValueError):
+    """A rejected mark; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+    def body(self) -> dict:
+        return {"ok": False, "error": str(self)}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    R = 6371000.0
+    to_rad = math.pi / 180.0
+    dlat = (lat2 - lat1) * to_rad
+    dlon = (lon2 - lon1) * to_rad
+    a = math.sin(dlat/2)**2 + math.cos(lat1*to_rad) * math.cos(lat2*to_rad) * math.sin(dlon/2)**2
+    return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+# ---------- validation ----------
+def parse(data: dict) -> dict:
+    """Validated mark fields from a request body; raises MarkError."""
+    if not isinstance(data, dict):
+        raise MarkError("body must be a JSON object")
+    for f in ("session_id", "student_id"):
+        if data.get(f) in (None, "", []):
+            raise MarkError(f"missing field: {f}")
+    try:
+        session_id = int(data["session_id"])
+    except (TypeError, ValueError):
+        raise MarkError("session_id must be an integer")
+    student_id = str(data["student_id"]).strip()      # student codes are strings ("21BCE001")
+    return {"session_id": session_id, "student_id": student_id,
+            "speech_ok": bool(data.get("speech_ok", False)), "face_ok": bool(data.get("face_ok", False)),
+            "lat": data.get("lat"), "lng": data.get("lng")}
+
+
+def _authorize(actor, target):
+    """Students mark only themselves; teachers only in their own sessions."""
+    if actor is None:
+        return
+    if actor.role == "student" and actor.student_id != target.student_code:
+        raise MarkError("Students can only mark their own attendance", 403)
+    if actor.role == "teacher" and target.teacher_id != actor.id:
+        raise MarkError("Not your session", 403)
+
+
+def _check_geofence(target, m):
+    if target.lat is None or target.lng is None or target.radius_m is None:
+        return
+    if m["lat"] is None or m["lng"] is None:
+        raise MarkError("geolocation required for this session")
+    try:
+        dist = haversine_m(float(target.lat), float(target.lng), float(m["lat"]), float(m["lng"]))
+    except (TypeError, ValueError):
+        raise MarkError("bad_coordinates")
+    if dist > float(target.radius_m):
+        raise MarkError(f"outside_radius:{round(dist)}")
+
+
+def _naive_utc(dt: datetime) -> datetime:
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def client_time(v) -> datetime:
+    """A client timestamp (ms since the epoch or ISO 8601) as naive UTC; missing means now."""
+    if v in (None, ""):
+        return _now()
+    try:
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            return datetime.fromtimestamp(v / 1000, tz=timezone.utc).replace(tzinfo=None)
+        if isinstance(v, str):
+            return _naive_utc(datetime.fromisoformat(v.replace("Z", "+00:00")))
+    except (ValueError, OverflowError, OSError):
+        pass
+    raise MarkError("marked_at must be ms since the epoch or an ISO 8601 string")
+
+
+def _check_window(session, at: datetime, now: datetime):
+    """A mark taken offline must fall inside its session (give or take the clock skew)."""
+    skew = timedelta(seconds=BULK_CLOCK_SKEW_SEC)
+    if at > now + skew:
+        raise MarkError("marked_at is in the future")
+    if at < _naive_utc(session.start_ts) - skew or at > _naive_utc(session.end_ts) + skew:
+        raise MarkError("outside_session_window")
+
+
+def _check_sync_deadline(actor, session, now: datetime):
+    """
+    A student's own (backdated) marks must reach the server within
+    BULK_OFFLINE_GRACE_SEC of the session's end; otherwise a mark refused
+    by POST /api/attendance could be replayed through bulk days later.
+    Teachers may sync a roster late.
+    """
+    if actor is not None and actor.role == "student" and \
+            now > _naive_utc(session.end_ts) + timedelta(seconds=BULK_OFFLINE_GRACE_SEC):
+        raise MarkError("offline_sync_too_late")
+
+
+def resolve(session_id: int, student_codes):
+    """
+    Session and students in one round trip: one row per code (the student
+    columns are NULL for an unknown code), or no rows if the session is missing.
+    """
+    codes = [student_codes] if isinstance(student_codes, str) else list(student_codes)
+    stmt = (select(Session.id.label("session_id"), Session.class_name, Session.teacher_id,
+                   Session.lat, Session.lng, Session.radius_m, Session.start_ts, Session.end_ts,
+                   User.id.label("user_id"), User.name.label("student_name"),
+                   User.student_id.label("student_code"))
+            .select_from(Session)
+            .outerjoin(User, and_(User.student_id.in_(codes), User.role == "student"))
+            .where(Session.id == session_id))
+    return db.session.execute(stmt).all()
+
+
+# ---------- writing ----------
+def _dialect_insert(model):
+    """insert() with ON CONFLICT support for this engine, or None."""
+    name = db.session.get_bind().dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(model)
+
+
+def insert_once(values: dict):
+    """(id, marked_at) of the new row, or None if this student was already marked."""
+    ins = _dialect_insert(Attendance)
+    if ins is not None:
+        stmt = (ins.values(**values)
+                .on_conflict_do_nothing(index_elements=["session_id", "student_id"])
+                .returning(Attendance.id, Attendance.marked_at))
+        return db.session.execute(stmt).first()
+    try:
+        with db.session.begin_nested():
+            a = Attendance(**values)
+            db.session.add(a)
+        return a.id, a.marked_at
+    except IntegrityError:
+        return None
+
+
+def insert_many(values: list) -> dict:
+    """
+    Insert every row that is not marked yet with one executemany; returns
+    {(session_id, student_id): (id, marked_at)} for the rows inserted.
+    """
+    if not values:
+        return {}
+    ins = _dialect_insert(Attendance)
+    if ins is None:
+        out = {}
+        for v in values:
+            new = insert_once(v)
+            if new is not None:
+                out[(v["session_id"], v["student_id"])] = tuple(new)
+        return out
+    stmt = (ins.on_conflict_do_nothing(index_elements=["session_id", "student_id"])
+            .returning(Attendance.id, Attendance.session_id, Attendance.student_id, Attendance.marked_at))
+    return {(r.session_id, r.student_id): (r.id, r.marked_at) for r in db.session.execute(stmt, values)}
+
+
+def event(attendance_id, marked_at, target) -> dict:
+    """The outbox payload of one mark."""
+    return {"attendance_id": attendance_id, "session_id": target.session_id, "class_name": target.class_name,
+            "student_id": target.student_code, "student_name": target.student_name,
+            "marked_at": marked_at.isoformat()}
+
+
+# ---------- idempotency keys ----------
+def scoped_key(actor, client_key):
+    if not client_key:
+        return None
+    if len(client_key) > MAX_KEY_LEN:
+        raise MarkError(f"Idempotency-Key longer than {MAX_KEY_LEN} characters")
+    return f"{actor.id if actor is not None else '-'}:{client_key}"
+
+
+def replay(key, fingerprint):
+    """(body, status) stored under `key`, or None. An expired key is dropped."""
+    row = db.session.get(IdempotencyKey, key)
+    if row is None:
+        return None
+    if row.created_at < _now() - timedelta(hours=IDEMPOTENCY_TTL_HOURS):
+        db.session.delete(row)
+        db.session.commit()
+        return None
+    if row.fingerprint != fingerprint:
+        raise MarkError("Idempotency-Key was already used for a different request", 422)
+    metrics.incr("mark.replayed")
+    return dict(json.loads(row.response), replayed=True), row.status
+
+
+def remember(key, fingerprint, body, status):
+    """Store a response under `key`, in the caller's transaction."""
+    db.session.add(IdempotencyKey(key=key, fingerprint=fingerprint, status=status,
+                                  response=json.dumps(body), created_at=_now()))
+    if random.random() < IDEMPOTENCY_PURGE_P:
+        cutoff = _now() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+        db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+
+
+# ---------- the mark ----------
+def mark(data: dict, actor=None, idempotency_key: str = None):
+    """
+    Mark one student. Returns (body, status): 201 for a new mark, or the
+    stored response when a keyed retry finds its mark already committed.
+    Raises MarkError for a rejected mark.
+    """
+    m = parse(data)
+    key = scoped_key(actor, idempotency_key)
+    fingerprint = f"{m['session_id']}:{m['student_id']}"
+
+    rows = resolve(m["session_id"], m["student_id"])
+    if not rows:
+        raise MarkError("Session not found", 404)
+    target = rows[0]
+    if target.user_id is None:
+        raise MarkError("Student not found", 404)
+    _authorize(actor, target)
+    now = _now()
+    _check_window(target, now, now)        # same rules as mark_many, at server time
+    _check_geofence(target, m)
+
+    with metrics.timed("mark.insert"):
+        new = insert_once({"session_id": target.session_id, "student_id": target.user_id,
+                           "speech_ok": m["speech_ok"], "face_ok": m["face_ok"], "geo_ok": True})
+    if new is None:
+        db.session.rollback()
+        # a retry of a mark that committed while the client timed out
+        hit = replay(key, fingerprint) if key else None
+        if hit:
+            return hit
+        metrics.incr("mark.duplicate")
+        raise MarkError("Already marked", 409)
+
+    body = {"ok": True, "id": new[0], "message": "Attendance marked"}
+    # side effects (export journal, rollups, webhooks) go out via the outbox
+    outbox.enqueue(outbox.MARKED, event(new[0], new[1], target))
+    if key:
+        remember(key, fingerprint, body, 201)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # the same key committed by a concurrent retry
+        db.session.rollback()
+        hit = replay(key, fingerprint) if key else None
+        if hit:
+            return hit
+        raise MarkError("Already marked or invalid", 409)
+    outbox.notify()
+    metrics.incr("mark.ok")
+    return body, 201
+
+
+# ---------- bulk ----------
+def _rejected(e: MarkError) -> dict:
+    return {"status": "rejected", "error": str(e)}
+
+
+def mark_many(items, actor=None, idempotency_key: str = None):
+    """
+    Mark a batch of items ({session_id, student_id, speech_ok, face_ok, lat,
+    lng, marked_at}) in one transaction. Returns (body, 200). body["results"]
+    has one entry per item, in order: "marked" (with the id), "duplicate"
+    (already marked, or repeated in the batch) or "rejected" (with the error).
+    Raises MarkError only when the batch itself is unusable.
+    """
+    if not isinstance(items, list) or not items:
+        raise MarkError("items must be a non-empty list")
+    if len(items) > BULK_MAX_ITEMS:
+        raise MarkError(f"at most {BULK_MAX_ITEMS} items per request", 413)
+    key = scoped_key(actor, idempotency_key)
+    fingerprint = "bulk:" + hashlib.sha256(json.dumps(items, sort_keys=True, default=str).encode()).hexdigest()
+    if key:
+        hit = replay(key, fingerprint)
+        if hit:
+            return hit
+
+    results = [None] * len(items)
+    parsed = {}
+    for i, data in enumerate(items):
+        try:
+            m = parse(data)
+            m["at"] = client_time(data.get("marked_at"))
+        except MarkError as e:
+            results[i] = _rejected(e)
+            continue
+        parsed[i] = m
+
+    sessions, students = {}, {}
+    if parsed:
+        session_ids = {m["session_id"] for m in parsed.values()}
+        codes = {m["student_id"] for m in parsed.values()}
+        sessions = {r.id: r for r in db.session.execute(
+            select(Session.id, Session.class_name, Session.teacher_id, Session.lat, Session.lng,
+                   Session.radius_m, Session.start_ts, Session.end_ts).where(Session.id.in_(session_ids)))}
+        students = {r.student_id: r for r in db.session.execute(
+            select(User.id, User.name, User.student_id).where(User.student_id.in_(codes), User.role == "student"))}
+
+    now, pending = _now(), {}
+    for i, m in parsed.items():
+        s, u = sessions.get(m["session_id"]), students.get(m["student_id"])
+        try:
+            if s is None:
+                raise MarkError("Session not found", 404)
+            if u is None:
+                raise MarkError("Student not found", 404)
+            target = Target(s.id, s.class_name, s.teacher_id, s.lat, s.lng, s.radius_m, u.id, u.name, u.student_id)
+            _authorize(actor, target)
+            _check_window(s, m["at"], now)
+            _check_sync_deadline(actor, s, now)
+            _check_geofence(target, m)
+        except MarkError as e:
+            results[i] = _rejected(e)
+            continue
+        if (s.id, u.id) in pending:
+            results[i] = {"status": "duplicate"}
+            continue
+        pending[(s.id, u.id)] = (i, target, {"session_id": s.id, "student_id": u.id, "marked_at": m["at"],
+                                             "speech_ok": m["speech_ok"], "face_ok": m["face_ok"], "geo_ok": True})
+
+    with metrics.timed("mark.bulk_insert"):
+        inserted = insert_many([v for _, _, v in pending.values()])
+    events = []
+    for pair, (i, target, _) in pending.items():
+        if pair in inserted:
+            attendance_id, marked_at = inserted[pair]
+            results[i] = {"status": "marked", "id": attendance_id}
+            events.append(event(attendance_id, marked_at, target))
+        else:
+            results[i] = {"status": "duplicate"}
+    # one INSERT for the batch's events; the drainer delivers them together
+    outbox.enqueue_many(outbox.MARKED, events)
+
+    counts = {k: sum(r["status"] == k for r in results) for k in ("marked", "duplicate", "rejected")}
+    body = {"ok": True, **counts, "results": results}
+    if key:
+        remember(key, fingerprint, body, 200)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # the same key committed by a concurrent retry
+        db.session.rollback()
+        hit = replay(key, fingerprint) if key else None
+        if hit:
+            return hit
+        raise MarkError("Batch conflicted with a concurrent request; retry it", 409)
+    if events:
+        outbox.notify()
+    for k, n in counts.items():
+        metrics.incr(f"mark.bulk.{k}", n)
+    return body, 200
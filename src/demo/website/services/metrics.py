@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# In-process counters and latency samples, exposed at /api/metrics.
+# Each gunicorn worker keeps its own numbers.
+
+_LOCK = threading.Lock()
+_COUNTERS = {}
+_GAUGES = {}
+_TIMINGS = {}
+_WINDOW = 1024   # latency samples kept per metric
+
+
+def incr(name: str, n: int = 1):
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + n
+
+
+def gauge(name: str, value: float):
+    with _LOCK:
+        _GAUGES[name] = value
+
+
+def observe(name: str, seconds: float):
+    with _LOCK:
+        _TIMINGS.setdefault(name, deque(maxlen=_WINDOW)).append(seconds)
+        _COUNTERS[name + ".count"] = _COUNTERS.get(name + ".count", 0) + 1
+
+
+@contextmanager
+def timed(name: str):
+    """Count a call and record its wall time under `name`."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0)
+
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))
+    return sorted_vals[k]
+
+
+def snapshot() -> dict:
+    """JSON-serializable view of every metric (latencies in ms)."""
+    with _LOCK:
+        counters = dict(_COUNTERS)
+        gauges = dict(_GAUGES)
+        timings = {k: sorted(v) for k, v in _TIMINGS.items()}
+
+    latency = {}
+    for name, vals in timings.items():
+        latency[name] = {
+            "n": len(vals),
+            "p50_ms": round(_percentile(vals, 0.50) * 1000, 3),
+            "p95_ms": round(_percentile(vals, 0.95) * 1000, 3),
+            "max_ms": round(vals[-1] * 1000, 3),
+        }
+    return {"counters": counters, "gauges": gauges, "latency": latency}
@@ -0,0 +1,189 @@
+"""
+Model lifecycle: load once, warm up, report.
+
+Each heavy model registers a loader and a warm-up under a short name
+(speech_recog registers "speaker"; register_voice "mfcc"; face_recog "face").
+`get(name)` still loads lazily, so nothing breaks when no preload ran.
+
+MODEL_PRELOAD picks when loading happens:
+    fork    load in the gunicorn master (preload_app) so workers share the
+            weights copy-on-write; each worker only sets its torch threads
+            and runs the warm-up after the fork (inference before fork can
+            deadlock the children's OpenMP pool)
+    worker  load and warm up in every worker right after it starts
+    lazy    first request pays (dev server default)
+
+PRELOAD_MODELS limits which models are preloaded (default: all known).
+TORCH_NUM_THREADS / TORCH_INTEROP_THREADS size torch's pools per worker.
+"""
+import importlib
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "lazy")
+PRELOAD_MODELS = [m for m in os.getenv("PRELOAD_MODELS", "face,mfcc,speaker").split(",") if m]
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))        # 0 = torch default
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "0"))
+
+# name -> module (relative to this package) that registers it on import
+MODULES = {
+    "face": ".authentication.face_verification.face_recog",
+    "mfcc": ".authentication.speech_verification.register_voice",
+    "speaker": ".authentication.speech_verification.speech_recog",
+}
+
+_LOCK = threading.RLock()   # guards the dicts below; never held while a model loads
+_LOAD_LOCKS = {}     # name -> lock serializing the load / warm-up of that model
+_SPECS = {}          # name -> (loader or None, warmup or None)
+_MODELS = {}         # name -> loaded object
+_STATUS = {}         # name -> status dict
+_STARTED = time.time()
+
+
+def register(name: str, loader=None, warmup=None):
+    """`loader()` returns the model (None: nothing to load); `warmup(model)` runs one inference."""
+    with _LOCK:
+        _SPECS[name] = (loader, warmup)
+        _STATUS.setdefault(name, {"loaded": False, "warm": False})
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _param_bytes(model) -> int:
+    if model is None or not hasattr(model, "parameters"):
+        return 0
+    tensors = list(model.parameters()) + list(getattr(model, "buffers", lambda: [])())
+    return int(sum(t.numel() * t.element_size() for t in tensors))
+
+
+def configure_torch():
+    """Apply the per-worker thread settings (imports torch only if it is installed)."""
+    try:
+        import torch
+    except ImportError:      # web-only installs
+        return
+    if TORCH_NUM_THREADS:
+        torch.set_num_threads(TORCH_NUM_THREADS)
+    if TORCH_INTEROP_THREADS:
+        try:
+            torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+        except RuntimeError:
+            pass    # only settable before the first parallel op
+
+
+def _ensure_registered(name: str):
+    if name not in _SPECS and name in MODULES:
+        importlib.import_module(MODULES[name], __package__)
+    if name not in _SPECS:
+        raise KeyError(f"unknown model {name!r}")
+
+
+def _load_lock(name: str):
+    with _LOCK:
+        return _LOAD_LOCKS.setdefault(name, threading.RLock())
+
+
+def load(name: str):
+    """Load a model if it is not loaded yet; returns it."""
+    _ensure_registered(name)
+    with _LOCK:
+        if _STATUS[name]["loaded"]:
+            return _MODELS.get(name)
+    # a load takes seconds: only callers of this model wait, status() does not
+    with _load_lock(name):
+        with _LOCK:
+            if _STATUS[name]["loaded"]:
+                return _MODELS.get(name)
+            loader, _ = _SPECS[name]
+        rss0, t0 = rss_bytes(), time.perf_counter()
+        model = loader() if loader else None
+        if hasattr(model, "eval"):
+            model.eval()
+        with _LOCK:
+            _MODELS[name] = model
+            _STATUS[name].update(loaded=True, load_ms=round((time.perf_counter() - t0) * 1000.0, 1),
+                                 param_bytes=_param_bytes(model), rss_delta_bytes=rss_bytes() - rss0,
+                                 loaded_in_pid=os.getpid())
+        return model
+
+
+def warm(name: str):
+    """Run the warm-up inference once in this process."""
+    model = load(name)
+    with _load_lock(name):
+        with _LOCK:
+            st = _STATUS[name]
+            if st["warm"] and st.get("warm_pid") == os.getpid():
+                return
+            _, warmup = _SPECS[name]
+        t0 = time.perf_counter()
+        if warmup:
+            warmup(model)
+        with _LOCK:
+            st.update(warm=True, warm_pid=os.getpid(), warmup_ms=round((time.perf_counter() - t0) * 1000.0, 1))
+
+
+def get(name: str):
+    """The loaded model (loading it on first use if no preload ran)."""
+    with _LOCK:
+        if name in _STATUS and _STATUS[name]["loaded"]:
+            return _MODELS.get(name)
+    return load(name)
+
+
+def preload(names=None, warm_up: bool = True):
+    for name in names or PRELOAD_MODELS:
+        try:
+            load(name)
+            if warm_up:
+                warm(name)
+        except Exception as e:           # a missing optional model must not kill the worker
+            _STATUS.setdefault(name, {"loaded": False, "warm": False})["error"] = str(e)
+
+
+# ---------- gunicorn hooks (see gunicorn.conf.py) ----------
+def master_ready():
+    """In the gunicorn master after preload_app: load weights, no inference."""
+    if MODEL_PRELOAD == "fork":
+        preload(warm_up=False)
+
+
+def worker_start():
+    """In each worker after fork: thread settings, then load / warm as configured."""
+    configure_torch()
+    if MODEL_PRELOAD in ("fork", "worker"):
+        preload(warm_up=True)
+
+
+# ---------- reporting ----------
+def status() -> dict:
+    with _LOCK:
+        models = {name: dict(st) for name, st in _STATUS.items()}
+    wanted = PRELOAD_MODELS if MODEL_PRELOAD != "lazy" else []
+    ready = all(m in models and models[m]["warm"] and models[m].get("warm_pid") == os.getpid()
+                for m in wanted)
+    return {
+        "ready": ready,
+        "preload": MODEL_PRELOAD,
+        "pid": os.getpid(),
+        "uptime_sec": round(time.time() - _STARTED, 1),
+        "rss_bytes": rss_bytes(),
+        "torch_threads": sys.modules["torch"].get_num_threads() if "torch" in sys.modules else None,
+        "models": models,
+    }
+
+
+def noise(seconds: float = 1.0, fs: int = 16000) -> np.ndarray:
+    """Deterministic low-level noise for warm-up inferences."""
+    return (np.random.default_rng(0).standard_normal(int(seconds * fs)) * 0.01).astype(np.float32)
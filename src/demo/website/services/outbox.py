@@ -0,0 +1,271 @@
+"""
+Transactional outbox for the side effects of an attendance mark.
+
+The request adds an Outbox row in the same transaction as the Attendance
+row (`enqueue` before commit, `notify` after) and returns; nothing else
+runs in the request. A drainer thread in each worker claims due rows in
+batches with a short lease, so workers never deliver the same row at the
+same time. It then hands each batch to every enabled sink:
+
+    journal   attendance_excel journal (the workbook export)
+    rollup    per-session mark count in attendance_rollups (recomputed, so
+              redelivery is harmless)
+    webhook   POST {"events": [...]} to OUTBOX_WEBHOOK_URL; a file:// URL
+              appends the batch as JSON lines instead (local stand-in)
+
+Delivery is at-least-once. A sink that raises is retried with
+exponential backoff, and the sinks that already took an event are
+remembered and skipped. After OUTBOX_MAX_ATTEMPTS the row becomes "dead".
+Sinks see event ids, so they can drop duplicates.
+
+OUTBOX_SINKS picks the sinks (default: journal,rollup, plus webhook when a
+URL is set). OUTBOX_DRAIN=0 turns the drainer off in a worker. Metrics:
+outbox.lag_sec (age of the oldest pending row), outbox.pending,
+outbox.delivery latency (commit to sent), outbox.sent / .retry / .dead
+and outbox.<sink>.errors.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+import requests
+from sqlalchemy import func, insert, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from . import attendance_excel, metrics
+from ..extensions import db
+from ..models import Attendance, AttendanceRollup, Outbox
+
+OUTBOX_BATCH = int(os.getenv("OUTBOX_BATCH", "200"))
+OUTBOX_POLL_SEC = float(os.getenv("OUTBOX_POLL_SEC", "1.0"))
+OUTBOX_LEASE_SEC = float(os.getenv("OUTBOX_LEASE_SEC", "30"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE_SEC = float(os.getenv("OUTBOX_RETRY_BASE_SEC", "2"))
+OUTBOX_RETRY_MAX_SEC = float(os.getenv("OUTBOX_RETRY_MAX_SEC", "300"))
+OUTBOX_WEBHOOK_URL = os.getenv("OUTBOX_WEBHOOK_URL", "")
+OUTBOX_WEBHOOK_TIMEOUT = float(os.getenv("OUTBOX_WEBHOOK_TIMEOUT", "5"))
+
+MARKED = "attendance.marked"
+
+
+def _now() -> datetime:
+    """Naive UTC, like the other timestamps the app stores."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# ---------- producing ----------
+def enqueue(topic: str, payload: dict):
+    """Add an event to the current transaction; it is only delivered if the caller commits."""
+    now = _now()
+    db.session.add(Outbox(topic=topic, payload=json.dumps(payload, default=str), state="pending",
+                          done_sinks="", attempts=0, created_at=now, next_attempt_at=now))
+
+
+def enqueue_many(topic: str, payloads: list):
+    """Add one event per payload with a single executemany INSERT (bulk marks)."""
+    if not payloads:
+        return
+    now = _now()
+    db.session.execute(insert(Outbox), [
+        {"topic": topic, "payload": json.dumps(p, default=str), "state": "pending", "done_sinks": "",
+         "attempts": 0, "created_at": now, "next_attempt_at": now} for p in payloads])
+
+
+def notify():
+    """Wake this worker's drainer (call after the commit)."""
+    _wake.set()
+
+
+# ---------- sinks ----------
+class Sink:
+    name = "base"
+    topics = (MARKED,)
+
+    def deliver(self, events: list):
+        """Take a batch of {"id", "topic", "payload", "created_at"}; raise to have it retried."""
+        raise NotImplementedError
+
+
+class JournalSink(Sink):
+    name = "journal"
+
+    def deliver(self, events):
+        # the whole batch is one journal write
+        attendance_excel.save_many([{
+            "session_id": p["session_id"], "class_name": p["class_name"], "student_name": p["student_name"],
+            "student_id": p["student_id"], "marked_at": datetime.fromisoformat(p["marked_at"]),
+        } for p in (e["payload"] for e in events)])
+
+
+class RollupSink(Sink):
+    name = "rollup"
+
+    def deliver(self, events):
+        sessions = {e["payload"]["session_id"] for e in events}
+        rows = db.session.execute(
+            select(Attendance.session_id, func.count(), func.max(Attendance.marked_at))
+            .where(Attendance.session_id.in_(sessions)).group_by(Attendance.session_id)).all()
+        now = _now()
+        for sid, marks, last in rows:
+            db.session.merge(AttendanceRollup(session_id=sid, marks=marks, last_marked_at=last, updated_at=now))
+        db.session.flush()
+
+
+class WebhookSink(Sink):
+    name = "webhook"
+
+    def __init__(self, url: str = OUTBOX_WEBHOOK_URL, timeout: float = OUTBOX_WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def deliver(self, events):
+        if self.url.startswith("file://"):
+            with open(self.url[len("file://"):], "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(e, default=str) + "\n" for e in events))
+            return
+        r = requests.post(self.url, json={"events": events}, timeout=self.timeout)
+        r.raise_for_status()
+
+
+SINKS = {"journal": JournalSink, "rollup": RollupSink, "webhook": WebhookSink}
+
+_sinks = None
+
+
+def get_sinks() -> list:
+    """Process-wide sinks chosen by OUTBOX_SINKS."""
+    global _sinks
+    if _sinks is None:
+        default = "journal,rollup" + (",webhook" if OUTBOX_WEBHOOK_URL else "")
+        names = [n.strip() for n in os.getenv("OUTBOX_SINKS", default).split(",") if n.strip()]
+        unknown = set(names) - set(SINKS)
+        if unknown:
+            raise ValueError(f"Unknown OUTBOX_SINKS {sorted(unknown)} (choose from {sorted(SINKS)})")
+        _sinks = [SINKS[n]() for n in names]
+    return _sinks
+
+
+def set_sinks(sinks: list):
+    """Swap the process-wide sinks (benchmarks, tests)."""
+    global _sinks
+    _sinks = list(sinks)
+
+
+# ---------- draining ----------
+def _claim(batch: int):
+    """Lease up to `batch` due rows to this call; returns them in id order."""
+    now, token = _now(), uuid.uuid4().hex
+    free = or_(Outbox.claimed_until.is_(None), Outbox.claimed_until < now)
+    due = (select(Outbox.id).where(Outbox.state == "pending", Outbox.next_attempt_at <= now, free)
+           .order_by(Outbox.id).limit(batch).scalar_subquery())
+    # `free` is repeated on the UPDATE so a row claimed concurrently fails the re-check
+    db.session.execute(update(Outbox).where(Outbox.id.in_(due), free)
+                       .values(claimed_by=token, claimed_until=now + timedelta(seconds=OUTBOX_LEASE_SEC))
+                       .execution_options(synchronize_session=False))
+    db.session.commit()
+    return db.session.scalars(select(Outbox).where(Outbox.claimed_by == token).order_by(Outbox.id)).all()
+
+
+def drain_once(batch: int = OUTBOX_BATCH) -> int:
+    """Deliver one batch. Returns the number of rows claimed."""
+    rows = _claim(batch)
+    if not rows:
+        _report_lag()
+        return 0
+
+    done = {r.id: set(filter(None, r.done_sinks.split(","))) for r in rows}
+    errors = {}
+    for sink in get_sinks():
+        todo = [r for r in rows if r.topic in sink.topics and sink.name not in done[r.id]]
+        if not todo:
+            continue
+        events = [{"id": r.id, "topic": r.topic, "payload": json.loads(r.payload),
+                   "created_at": r.created_at.isoformat()} for r in todo]
+        try:
+            with metrics.timed(f"outbox.{sink.name}"):
+                sink.deliver(events)
+        except Exception as e:
+            metrics.incr(f"outbox.{sink.name}.errors")
+            if isinstance(e, SQLAlchemyError):
+                db.session.rollback()          # claimed rows reload on next access
+            for r in todo:
+                errors[r.id] = f"{sink.name}: {e}"
+            continue
+        for r in todo:
+            done[r.id].add(sink.name)
+
+    now = _now()
+    for r in rows:
+        r.done_sinks = ",".join(sorted(done[r.id]))
+        r.claimed_by = r.claimed_until = None
+        if r.id not in errors:
+            r.state, r.sent_at, r.last_error = "sent", now, None
+            metrics.observe("outbox.delivery", (now - r.created_at).total_seconds())
+            metrics.incr("outbox.sent")
+            continue
+        r.attempts += 1
+        r.last_error = errors[r.id][:1000]
+        if r.attempts >= OUTBOX_MAX_ATTEMPTS:
+            r.state = "dead"
+            metrics.incr("outbox.dead")
+        else:
+            delay = min(OUTBOX_RETRY_MAX_SEC, OUTBOX_RETRY_BASE_SEC * 2 ** (r.attempts - 1))
+            r.next_attempt_at = now + timedelta(seconds=delay)
+            metrics.incr("outbox.retry")
+    db.session.commit()
+    _report_lag()
+    return len(rows)
+
+
+def _report_lag():
+    oldest, pending = db.session.execute(
+        select(func.min(Outbox.created_at), func.count()).where(Outbox.state == "pending")).one()
+    metrics.gauge("outbox.pending", pending)
+    metrics.gauge("outbox.lag_sec", round((_now() - oldest).total_seconds(), 3) if oldest else 0.0)
+
+
+def stats() -> dict:
+    by_state = dict(db.session.execute(select(Outbox.state, func.count()).group_by(Outbox.state)).all())
+    oldest = db.session.scalar(select(func.min(Outbox.created_at)).where(Outbox.state == "pending"))
+    return {"by_state": by_state, "lag_sec": round((_now() - oldest).total_seconds(), 3) if oldest else 0.0}
+
+
+# ---------- background drainer (one per worker process) ----------
+_wake = threading.Event()
+_drainer = {"pid": None}
+_drainer_lock = threading.Lock()
+
+
+def _loop(app):
+    with app.app_context():
+        while True:
+            _wake.wait(OUTBOX_POLL_SEC)
+            _wake.clear()
+            try:
+                while drain_once() == OUTBOX_BATCH:      # backlog: keep going
+                    pass
+            except Exception:
+                db.session.rollback()
+                metrics.incr("outbox.drain_errors")
+                app.logger.exception("outbox drain failed")
+                time.sleep(OUTBOX_POLL_SEC)
+            finally:
+                db.session.remove()
+
+
+def ensure_drainer(app):
+    """Start this process's drainer once (after a fork the parent's thread is gone)."""
+    if _drainer["pid"] == os.getpid():
+        return
+    with _drainer_lock:
+        if _drainer["pid"] != os.getpid():
+            threading.Thread(target=_loop, args=(app,), name="outbox-drainer", daemon=True).start()
+            _drainer["pid"] = os.getpid()
+
+
+def init_app(app):
+    """Start the drainer lazily on the first request of each worker (OUTBOX_DRAIN=0: never)."""
+    if os.getenv("OUTBOX_DRAIN", "1") == "0":
+        return
+    app.before_request(lambda: ensure_drainer(app))
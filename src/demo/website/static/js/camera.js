@@ -0,0 +1,49 @@
+// ===== browser camera capture =====
+// Grabs a short burst of frames with getUserMedia and posts them as
+// multipart `frames`, so the server never opens a camera itself.
+const FRAME_DEFAULTS = {
+  count: 8,            // frames per burst
+  intervalMs: 150,     // gap between frames
+  maxSide: 640,        // long side in px (server also enforces its own cap)
+  quality: 0.8,        // JPEG/WebP quality
+  type: "image/jpeg",
+};
+
+async function captureFrames(opts = {}) {
+  const o = { ...FRAME_DEFAULTS, ...opts };
+  const stream = await navigator.mediaDevices.getUserMedia({ video: { facingMode: "user" }, audio: false });
+  const video = document.createElement("video");
+  video.playsInline = true;
+  video.muted = true;
+  video.srcObject = stream;
+
+  try {
+    await video.play();
+    // let auto-exposure settle for a moment
+    await new Promise(r => setTimeout(r, 300));
+
+    const scale = Math.min(1, o.maxSide / Math.max(video.videoWidth, video.videoHeight));
+    const canvas = document.createElement("canvas");
+    canvas.width  = Math.round(video.videoWidth * scale);
+    canvas.height = Math.round(video.videoHeight * scale);
+    const ctx = canvas.getContext("2d");
+
+    const blobs = [];
+    for (let i = 0; i < o.count; i++) {
+      ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+      blobs.push(await new Promise(r => canvas.toBlob(r, o.type, o.quality)));
+      if (i < o.count - 1) await new Promise(r => setTimeout(r, o.intervalMs));
+    }
+    return blobs;
+  } finally {
+    stream.getTracks().forEach(t => t.stop());
+  }
+}
+
+async function postFrames(url, blobs, limits = {}) {
+  const form = new FormData();
+  blobs.forEach((b, i) => form.append("frames", b, `frame_${i}.jpg`));
+  Object.entries(limits).forEach(([k, v]) => form.append(k, v));
+  const r = await fetch(url, { method: "POST", credentials: "same-origin", body: form });
+  return awaitJob(r);
+}
@@ -0,0 +1,25 @@
+// ===== background job results =====
+// Face / speech routes answer 202 with a job id and a status URL. Poll it
+// (short long-polls, so no request holds a server thread for long) until
+// the job finishes, then hand back the job's own result as if the route
+// had answered synchronously. Any other response is returned as-is.
+const JOB_DEFAULTS = {
+  waitSec: 2,          // server-side long-poll per request
+  timeoutSec: 90,      // give up after this long
+};
+
+async function awaitJob(response, opts = {}) {
+  const o = { ...JOB_DEFAULTS, ...opts };
+  const data = await response.json();
+  if (response.status !== 202 || !data.status_url) return data;
+
+  const until = Date.now() + o.timeoutSec * 1000;
+  while (Date.now() < until) {
+    const r = await fetch(`${data.status_url}?wait=${o.waitSec}`, { credentials: "same-origin" });
+    const job = await r.json();
+    if (!r.ok) return { ok: false, message: job.error || "Job not found" };
+    if (job.state === "done") return job.result || { ok: false, message: "No result" };
+    if (job.state === "failed") return { ok: false, message: job.error || "Processing failed" };
+  }
+  return { ok: false, message: "Timed out waiting for the result" };
+}
@@ -0,0 +1,107 @@
+// ===== browser microphone capture =====
+// Records with MediaRecorder, resamples to 16 kHz mono and posts it as a
+// 16-bit PCM WAV in multipart `audio`, so the server decodes it once in
+// memory and never opens a microphone itself. An energy VAD (same rule as
+// the server's audio.VoiceActivity) stops recording shortly after the
+// speaker finishes; `seconds` is only the upper bound.
+const AUDIO_DEFAULTS = {
+  seconds: 6,          // maximum recording length
+  sampleRate: 16000,   // what the server models expect
+  vad: true,
+  minSeconds: 1.0,     // never stop earlier than this
+  hangover: 0.8,       // silence after speech that ends the recording
+  energy: 1e-4,        // mean-square floor for a speech frame
+  noiseRatio: 4,       // ... and this many times the quietest frame so far
+};
+
+// resolves once speech has started and then stayed quiet for o.hangover,
+// or after o.seconds at the latest
+function waitForEndOfSpeech(stream, o) {
+  const ctx = new AudioContext();
+  const analyser = ctx.createAnalyser();
+  analyser.fftSize = 1024;
+  ctx.createMediaStreamSource(stream).connect(analyser);
+  const buf = new Float32Array(analyser.fftSize);
+  const t0 = performance.now();
+  let floor = Infinity, started = false, quietSince = null;
+
+  return new Promise(resolve => {
+    const timer = setInterval(() => {
+      const now = (performance.now() - t0) / 1000;
+      analyser.getFloatTimeDomainData(buf);
+      const e = buf.reduce((acc, x) => acc + x * x, 0) / buf.length;
+      floor = Math.min(floor, e);
+      if (e > Math.max(o.energy, o.noiseRatio * floor)) {
+        started = true;
+        quietSince = null;
+      } else if (quietSince === null) {
+        quietSince = now;
+      }
+      const ended = started && quietSince !== null && now - quietSince >= o.hangover && now >= o.minSeconds;
+      if (ended || now >= o.seconds) {
+        clearInterval(timer);
+        ctx.close();
+        resolve();
+      }
+    }, 30);
+  });
+}
+
+async function recordAudio(opts = {}) {
+  const o = { ...AUDIO_DEFAULTS, ...opts };
+  const stream = await navigator.mediaDevices.getUserMedia({ audio: true, video: false });
+  let encoded;
+  try {
+    const rec = new MediaRecorder(stream);
+    const chunks = [];
+    rec.ondataavailable = e => chunks.push(e.data);
+    const stopped = new Promise(r => (rec.onstop = r));
+    rec.start();
+    if (o.vad) {
+      await waitForEndOfSpeech(stream, o);
+    } else {
+      await new Promise(r => setTimeout(r, o.seconds * 1000));
+    }
+    rec.stop();
+    await stopped;
+    encoded = new Blob(chunks, { type: rec.mimeType });
+  } finally {
+    stream.getTracks().forEach(t => t.stop());
+  }
+
+  // decode whatever the browser recorded (webm/ogg) and resample to mono 16 kHz
+  const ctx = new AudioContext();
+  const decoded = await ctx.decodeAudioData(await encoded.arrayBuffer());
+  ctx.close();
+  const offline = new OfflineAudioContext(1, Math.ceil(decoded.duration * o.sampleRate), o.sampleRate);
+  const src = offline.createBufferSource();
+  src.buffer = decoded;
+  src.connect(offline.destination);
+  src.start();
+  const rendered = await offline.startRendering();
+  return encodeWav(rendered.getChannelData(0), o.sampleRate);
+}
+
+function encodeWav(samples, sampleRate) {
+  const buf = new ArrayBuffer(44 + samples.length * 2);
+  const v = new DataView(buf);
+  const str = (off, s) => [...s].forEach((c, i) => v.setUint8(off + i, c.charCodeAt(0)));
+  str(0, "RIFF"); v.setUint32(4, 36 + samples.length * 2, true); str(8, "WAVE");
+  str(12, "fmt "); v.setUint32(16, 16, true); v.setUint16(20, 1, true); v.setUint16(22, 1, true);
+  v.setUint32(24, sampleRate, true); v.setUint32(28, sampleRate * 2, true);
+  v.setUint16(32, 2, true); v.setUint16(34, 16, true);
+  str(36, "data"); v.setUint32(40, samples.length * 2, true);
+  for (let i = 0; i < samples.length; i++) {
+    const s = Math.max(-1, Math.min(1, samples[i]));
+    v.setInt16(44 + i * 2, s < 0 ? s * 0x8000 : s * 0x7fff, true);
+  }
+  return new Blob([buf], { type: "audio/wav" });
+}
+
+async function postAudio(url, wav, fields = {}) {
+  const form = new FormData();
+  form.append("audio", wav, "speech.wav");
+  Object.entries(fields).forEach(([k, v]) => form.append(k, v));
+  const r = await fetch(url, { method: "POST", credentials: "same-origin", body: form });
+  return awaitJob(r);
+}
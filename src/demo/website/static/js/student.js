@@ -18,6 +18,7 @@ const API = {
   listSessions: "/api/sessions",
   myAttendance: (sid) => `/api/attendance?student_id=${sid}`,
   mark: "/api/attendance",
+  markBulk: "/api/attendance/bulk",
   faceVerify: "/face_verif",
   speechPhrase: "/speech_verif_phrase",
   speechVerify: "/speech_verif",
@@ -120,18 +121,98 @@ async function apiMyAttendance(studentId){
   if(!r.ok) throw new Error("Failed to load attendance");
   return r.json();
 }
-async function apiMarkAttendance(payload){
-  const r = await fetch(API.mark, {
-    method:"POST",
-    headers: { "Content-Type":"application/json" },
-    credentials:"same-origin",
-    body: JSON.stringify(payload)
-  });
+function newIdempotencyKey(){
+  if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+  return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+}
+async function apiMarkAttendance(payload, retries = 2){
+  // same key on every retry: the server replays the first answer instead of "Already marked"
+  const key = newIdempotencyKey();
+  let r;
+  for (let attempt = 0; ; attempt++) {
+    try {
+      r = await fetch(API.mark, {
+        method:"POST",
+        headers: { "Content-Type":"application/json", "Idempotency-Key": key },
+        credentials:"same-origin",
+        body: JSON.stringify(payload)
+      });
+      if (r.status < 500 || attempt >= retries) break;
+    } catch (err) {
+      if (attempt >= retries) {
+        const e = new Error("Network error, please try again.");
+        e.offline = true;
+        throw e;
+      }
+    }
+    await new Promise(res => setTimeout(res, 500 * (attempt + 1)));
+  }
   const json = await r.json().catch(() => ({}));
   if (!r.ok) throw new Error(json.error || "Mark failed");
   return json;
 }
 
+// ===== offline queue =====
+// Marks that could not reach the server are kept in localStorage and synced
+// later in one bulk request. The batch in flight keeps its Idempotency-Key
+// until the server answers, so a sync cut off halfway is safe to resend.
+const QUEUE_KEY = "att_mark_queue";
+const INFLIGHT_KEY = "att_mark_inflight";
+function loadJSON(k, dflt){
+  try { return JSON.parse(localStorage.getItem(k)) ?? dflt; } catch { return dflt; }
+}
+function queueMark(payload){
+  const q = loadJSON(QUEUE_KEY, []);
+  q.push(payload);
+  localStorage.setItem(QUEUE_KEY, JSON.stringify(q));
+}
+let syncing = false;
+async function syncQueuedMarks(){
+  if (syncing || !navigator.onLine) return;
+  syncing = true;
+  try {
+    for (;;) {
+      let batch = loadJSON(INFLIGHT_KEY, null);
+      if (!batch) {
+        const items = loadJSON(QUEUE_KEY, []);
+        if (!items.length) break;
+        batch = { key: newIdempotencyKey(), items };
+        localStorage.setItem(INFLIGHT_KEY, JSON.stringify(batch));
+        localStorage.removeItem(QUEUE_KEY);
+      }
+      const r = await fetch(API.markBulk, {
+        method:"POST",
+        headers: { "Content-Type":"application/json", "Idempotency-Key": batch.key },
+        credentials:"same-origin",
+        redirect:"manual",                   // an expired session redirects to the login page
+        body: JSON.stringify({ items: batch.items })
+      });
+      if (r.type === "opaqueredirect" || r.status === 401) {
+        if (confirm("Your session has expired. Log in again to sync your offline attendance marks?")) {
+          location.href = "/student/login";
+        }
+        break;                               // the batch stays queued
+      }
+      const isJSON = (r.headers.get("Content-Type") || "").includes("application/json");
+      const json = isJSON ? await r.json().catch(() => null) : null;
+      // only a real answer from the API settles the batch: per-item results,
+      // or a 4xx error for the batch; anything else is retried on the next sync
+      const settled = json && (Array.isArray(json.results) || (r.status >= 400 && r.status < 500));
+      if (!settled) break;
+      localStorage.removeItem(INFLIGHT_KEY);
+      const rejected = (json.results || []).filter(x => x.status === "rejected");
+      if (!r.ok || rejected.length) {
+        alert(`Some offline marks were not accepted: ${json.error || rejected.map(x => x.error).join(", ")}`);
+      }
+    }
+  } catch (err) {
+    console.warn("offline sync failed", err);
+  } finally {
+    syncing = false;
+  }
+  await render().catch(console.error);
+}
+
 // ===== sessions cache =====
 let SESSION_CACHE = [];
 
@@ -240,7 +321,8 @@ async function handleMark(sessionId){
     face_ok:   faceVerified,
     geo_ok:    true,
     lat: myLat,
-    lng: myLng
+    lng: myLng,
+    marked_at: Date.now()
   };
 
   try {
@@ -248,7 +330,10 @@ async function handleMark(sessionId){
     await render();
   } catch (err) {
     const msg = String(err.message || "");
-    if (msg === "proxy_detected") {
+    if (err.offline) {
+      queueMark(payload);
+      alert("You're offline. The mark is saved and will sync when the connection is back.");
+    } else if (msg === "proxy_detected") {
       alert("Proxy/VPN detected. Disable it to mark attendance.");
     } else if (msg.startsWith("outside_radius:")) {
       const n = msg.split(":")[1] || "";
@@ -269,8 +354,13 @@ document.addEventListener("DOMContentLoaded", () => {
   );
 
   btnFace.addEventListener("click", async () => {
-    const res = await fetch(API.faceVerify);
-    const data = await res.json();
+    let data;
+    try {
+      const frames = await captureFrames({ count: 6, maxSide: 640 });
+      data = await postFrames(API.faceVerify, frames, { max_frames: 6, max_side: 640 });
+    } catch (err) {
+      data = { ok: false, message: "Camera error: " + err.message };
+    }
     if (data.ok) {
       alert("✅ Face verified successfully");
       faceVerified = true;
@@ -287,10 +377,8 @@ document.addEventListener("DOMContentLoaded", () => {
     const phrase = phraseData.phrase;
     speechPhraseEl.textContent = `📢 Please read aloud: "${phrase}"`;
 
-    const res = await fetch(`${API.speechVerify}?id=${STUDENT_ID}&phrase=${encodeURIComponent(phrase)}`, {
-      method: "POST"
-    });
-    const data = await res.json();
+    const wav = await recordAudio({ seconds: 8 });
+    const data = await postAudio(`${API.speechVerify}?id=${STUDENT_ID}`, wav, { phrase });
     if (data.ok) {
       alert("✅ Speech verified successfully");
       speechVerified = true;
@@ -311,5 +399,8 @@ document.addEventListener("DOMContentLoaded", () => {
     if (id) handleMark(id);
   });
 
+  window.addEventListener("online", syncQueuedMarks);
+  syncQueuedMarks();
+
   setInterval(() => render().catch(console.error), 15000);
 });
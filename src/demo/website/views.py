@@ -1,13 +1,9 @@
 import os
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_login import login_user, logout_user, login_required, current_user
+from flask_login import login_user, logout_user, login_required
 from . import db
 from .models import User
-from .services.authentication.face_verification import face_recg_blink, face_recog
-from .services.authentication.speech_verification import register_voice
-from .services import attendance_excel
-from .models import Attendance, Session
 
 web_bp = Blueprint("web", __name__)
 
@@ -134,109 +130,6 @@ def teacher_login_post():
     return redirect(url_for("web.teacher_dashboard"))
 
 
-# ------------------ Verification APIs ------------------ #
-@web_bp.get("/face_register_blink")
-def face_register_blink():
-    student_id = request.args.get("id")
-    result = face_recg_blink.register_face_with_blink(student_id)
-    return jsonify(result)
-
-@web_bp.get("/speech_phrase")
-def speech_phrase():
-    """Generate phrase for speech *enrollment*"""
-    phrase = register_voice.get_random_phrase()
-    return jsonify({"phrase": phrase})
-
-@web_bp.post("/speech_register")
-def speech_register():
-    """Enroll student speech"""
-    student_id = request.args.get("id")
-    phrase = request.args.get("phrase")
-
-    if not phrase:
-        return jsonify({"ok": False, "message": "Missing phrase"})
-
-    result = register_voice.register_student(student_id, phrase)
-    return jsonify(result or {"ok": False, "message": "Speech registration failed"})
-
-@web_bp.get("/face_verif")
-def face_verif():
-    """Verify student's face"""
-    result = face_recog.verify_face(threshold=0.5)
-    return jsonify(result)
-
-@web_bp.get("/speech_verif_phrase")
-def speech_verif_phrase():
-    """Get phrase for speech *verification*"""
-    phrase = register_voice.get_random_phrase()
-    return jsonify({"phrase": phrase})
-
-@web_bp.post("/speech_verif")
-def speech_verif():
-    """Verify student's speech with a fresh recording"""
-    student_id = request.args.get("id") or (current_user.student_id if current_user.is_authenticated else None)
-    phrase = request.args.get("phrase")
-
-    if not student_id:
-        return jsonify({"ok": False, "message": "No student ID"})
-    if not phrase:
-        return jsonify({"ok": False, "message": "Missing phrase"})
-
-    result = register_voice.verify_student(student_id, phrase)
-
-    # --- FIX: ensure Python native bool ---
-    if result and "ok" in result:
-        result["ok"] = bool(result["ok"])   # convert np.bool_ → bool
-
-    return jsonify(result or {"ok": False, "message": "Speech verification failed"})
-
-
-
-#----------------Attendance ------------------#
-@web_bp.post("/api/attendance")
-@login_required
-def mark_attendance():
-    """
-    Student marks attendance:
-    - Saves in DB
-    - Updates Excel file
-    """
-    data = request.get_json()
-    session_id = data.get("session_id")
-    student_id = data.get("student_id")
-
-    # --- Safety checks ---
-    if not session_id or not student_id:
-        return jsonify({"ok": False, "message": "Missing session_id or student_id"}), 400
-
-    session = Session.query.get(session_id)
-    if not session:
-        return jsonify({"ok": False, "message": "Session not found"}), 404
-
-    student = User.query.filter_by(student_id=student_id, role="student").first()
-    if not student:
-        return jsonify({"ok": False, "message": "Student not found"}), 404
-
-    # --- Check if already marked ---
-    existing = Attendance.query.filter_by(session_id=session_id, student_id=student.id).first()
-    if existing:
-        return jsonify({"ok": False, "message": "Already marked"}), 400
-
-    # --- Save in DB ---
-    new_attendance = Attendance(session_id=session_id, student_id=student.id)
-    db.session.add(new_attendance)
-    db.session.commit()
-
-    # --- Update Excel ---
-    attendance_excel.save_attendance_to_excel(
-        session_id=session.id,
-        class_name=session.class_name,
-        student_name=student.name,
-        student_id=student.student_id
-    )
-
-    return jsonify({"ok": True, "message": "Attendance marked successfully"})
-
 # ------------------ Logout ------------------ #
 @web_bp.get("/logout")
 @login_required